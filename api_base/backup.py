@@ -0,0 +1,491 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path as PathlibPath
+from typing import Iterator
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+logger = logging.getLogger("backup")
+
+# WAL file format (https://www.sqlite.org/fileformat.html#the_write_ahead_log)
+WAL_HEADER = struct.Struct(">IIIIIIII")   # magic, version, page size, checkpoint seq, salt-1, salt-2, checksum-1, checksum-2
+FRAME_HEADER = struct.Struct(">IIIIII")   # page number, db size after commit (0 if not a commit), salt-1, salt-2, checksum-1, checksum-2
+WAL_MAGIC_LE = 0x377F0682
+WAL_MAGIC_BE = 0x377F0683
+
+
+def wal_checksum(data: bytes, s0: int, s1: int, big_endian: bool) -> tuple[int, int]:
+    """SQLite's cumulative WAL checksum over `data` (a multiple of 8 bytes)"""
+    ints = struct.unpack(f"{'>' if big_endian else '<'}{len(data) // 4}I", data)
+    for i in range(0, len(ints), 2):
+        s0 = (s0 + ints[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + ints[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+@dataclass
+class WalPosition:
+    """How far the current WAL has been shipped, and the running checksum at that point"""
+    salt: tuple[int, int]
+    checkpoint_seq: int
+    page_size: int
+    big_endian: bool
+    offset: int
+    checksum: tuple[int, int]
+
+
+def read_wal_header(wal_path: str) -> WalPosition | None:
+    """Position at the first frame of the current WAL, or None if there is no valid WAL"""
+    try:
+        with open(wal_path, "rb") as f:
+            raw = f.read(WAL_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(raw) < WAL_HEADER.size:
+        return None
+    magic, _, page_size, seq, salt1, salt2, c1, c2 = WAL_HEADER.unpack(raw)
+    if magic not in (WAL_MAGIC_LE, WAL_MAGIC_BE):
+        return None
+    big_endian = magic == WAL_MAGIC_BE
+    if wal_checksum(raw[:24], 0, 0, big_endian) != (c1, c2):
+        return None
+    return WalPosition((salt1, salt2), seq, page_size, big_endian, WAL_HEADER.size, (c1, c2))
+
+
+def read_committed_frames(wal_path: str, position: WalPosition) -> tuple[bytes, WalPosition, int]:
+    """
+    Frames appended to the WAL since `position`, up to the last valid commit frame.
+    Frames of a transaction still being written, or torn by a concurrent write, fail the
+    salt/checksum test and are left for the next call.
+    Returns:
+        (raw frames, new position, number of commits)
+    """
+    frame_size = FRAME_HEADER.size + position.page_size
+    with open(wal_path, "rb") as f:
+        f.seek(position.offset)
+        data = f.read()
+    checksum = position.checksum
+    committed_end, committed_checksum, commits = 0, checksum, 0
+    for start in range(0, len(data) - frame_size + 1, frame_size):
+        frame = data[start:start + frame_size]
+        _, db_size, salt1, salt2, c1, c2 = FRAME_HEADER.unpack_from(frame)
+        if (salt1, salt2) != position.salt:
+            break
+        checksum = wal_checksum(frame[:8], *checksum, position.big_endian)
+        checksum = wal_checksum(frame[FRAME_HEADER.size:], *checksum, position.big_endian)
+        if checksum != (c1, c2):
+            break
+        if db_size:
+            committed_end, committed_checksum = start + frame_size, checksum
+            commits += 1
+    new_position = WalPosition(position.salt, position.checkpoint_seq, position.page_size, position.big_endian,
+                               position.offset + committed_end, committed_checksum)
+    return data[:committed_end], new_position, commits
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class Generation:
+    """
+    A base snapshot plus the WAL segments shipped after it.
+    Layout: <root>/generations/<id>/{meta.json, snapshot.sqlite3.gz, segments.jsonl, wal/<seq>.wal.gz}
+    """
+
+    def __init__(self, path: PathlibPath):
+        self.path = path
+        self.id = path.name
+
+    @classmethod
+    def create(cls, root: PathlibPath) -> "Generation":
+        gen_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%fZ}-{uuid.uuid4().hex[:6]}"
+        path = root / "generations" / gen_id
+        (path / "wal").mkdir(parents=True)
+        return cls(path)
+
+    @property
+    def meta(self) -> dict:
+        return json.loads((self.path / "meta.json").read_text())
+
+    def write_meta(self, **meta) -> None:
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta, indent=2))
+        os.replace(tmp, self.path / "meta.json")
+
+    def segments(self) -> list[dict]:
+        index = self.path / "segments.jsonl"
+        if not index.exists():
+            return []
+        return [json.loads(line) for line in index.read_text().splitlines() if line.strip()]
+
+    def add_segment(self, seq: int, frames: bytes, position: WalPosition, commits: int) -> dict:
+        """Write one gzip'd WAL segment, then append it to the index (the index is the commit point)"""
+        name = f"{seq:08d}.wal.gz"
+        tmp = self.path / "wal" / (name + ".tmp")
+        with gzip.open(tmp, "wb", compresslevel=1) as f:
+            f.write(frames)
+        os.replace(tmp, self.path / "wal" / name)
+        entry = {"seq": seq, "file": name, "shipped_at": _now(), "page_size": position.page_size, "frames": len(frames) // (FRAME_HEADER.size + position.page_size),
+                 "commits": commits, "salt": list(position.salt), "end_offset": position.offset, "sha256": hashlib.sha256(frames).hexdigest()}
+        with open(self.path / "segments.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return entry
+
+    def iter_frames(self, segment: dict) -> Iterator[tuple[int, int, bytes]]:
+        """(page number, db size after commit, page data) of every frame in a segment, checksum verified"""
+        with gzip.open(self.path / "wal" / segment["file"], "rb") as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != segment["sha256"]:
+            raise RuntimeError(f"Segment {self.id}/{segment['file']} is corrupt (sha256 mismatch)")
+        frame_size = FRAME_HEADER.size + segment["page_size"]
+        for start in range(0, len(data), frame_size):
+            pgno, db_size = struct.unpack_from(">II", data, start)
+            yield pgno, db_size, data[start + FRAME_HEADER.size:start + frame_size]
+
+
+class BackupManager:
+    """
+    Continuous backup of one SQLite database in WAL mode: periodic base snapshots taken with the
+    online backup API, and every committed WAL frame shipped as compressed segments in between.
+
+    Nothing here ever writes to the database, so permission submissions are never blocked.
+    Between syncs the manager holds a read transaction (alternating between two connections, the new one
+    begun before the old one ends), so no one else can restart the WAL over frames that have not been
+    copied yet.  After each shipment it lets go of both readers for one RESTART checkpoint with a zero
+    busy timeout, so the WAL starts over instead of growing for as long as the process runs; if frames
+    committed after the shipment were caught by that checkpoint, the next sync starts a new generation.
+    """
+
+    def __init__(self, db_path: str, backup_dir: str, interval: float = 1.0, snapshot_interval: float = 6 * 3600, keep_generations: int = 4):
+        """
+        Args:
+            db_path (str): Database to back up (must be in WAL mode)
+            backup_dir (str): Local or mounted directory that receives generations
+            interval (float): Seconds between WAL shipments; the point-in-time restore granularity
+            snapshot_interval (float): Seconds between base snapshots (each starts a new generation)
+            keep_generations (int): Generations kept; older ones are deleted
+        """
+        self.db_path = db_path
+        self.wal_path = db_path + "-wal"
+        self.root = PathlibPath(backup_dir)
+        self.interval = interval
+        self.snapshot_interval = snapshot_interval
+        self.keep_generations = keep_generations
+        # Opened on first use (start(), or a one-off snapshot), so workers that lose the shipper lock hold none
+        self._readers: list[sqlite3.Connection] = []
+        self._checkpointer: sqlite3.Connection | None = None
+        self._active = None
+        self._generation: Generation | None = None
+        self._generation_started = 0.0
+        self._position: WalPosition | None = None
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+        self.last_sync: str | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False, timeout=30)
+        # Only the application decides when to checkpoint
+        conn.execute("PRAGMA wal_autocheckpoint = 0")
+        return conn
+
+    def _open(self) -> None:
+        if not self._readers:
+            self._readers = [self._connect(), self._connect()]
+            # Zero busy timeout: a checkpoint that would have to wait for readers gives up instead of stalling writers
+            self._checkpointer = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False, timeout=0)
+
+    def _begin_read(self) -> sqlite3.Connection:
+        """Start a read transaction on the spare connection; the previous one stays open until released"""
+        self._open()
+        conn = self._readers[1] if self._active is self._readers[0] else self._readers[0]
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        return conn
+
+    def _release(self, previous: sqlite3.Connection | None, current: sqlite3.Connection) -> None:
+        if previous is not None and previous is not current:
+            previous.execute("COMMIT")
+        self._active = current
+
+    def new_generation(self) -> Generation:
+        """Take a base snapshot and ship the whole current WAL after it"""
+        previous = self._active
+        reader = self._begin_read()
+        generation = Generation.create(self.root)
+        tmp = generation.path / "snapshot.sqlite3"
+        target = sqlite3.connect(str(tmp))
+        try:
+            # One step, inside our read transaction: a consistent snapshot that never blocks writers
+            reader.backup(target)
+        finally:
+            target.close()
+        with open(tmp, "rb") as src, gzip.open(generation.path / "snapshot.sqlite3.gz", "wb", compresslevel=1) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        tmp.unlink()
+        generation.write_meta(created_at=_now(), db_path=os.path.abspath(self.db_path))
+
+        # Replaying frames the snapshot already contains is harmless, so start at the first frame
+        self._generation, self._generation_started, self._seq = generation, time.monotonic(), 0
+        self._position = read_wal_header(self.wal_path)
+        self._ship()
+        self._release(previous, reader)
+        self._prune()
+        logger.info("backup: started generation %s", generation.id)
+        return generation
+
+    def _ship(self) -> None:
+        if self._position is None:
+            return
+        frames, position, commits = read_committed_frames(self.wal_path, self._position)
+        if frames:
+            self._generation.add_segment(self._seq, frames, position, commits)
+            self._seq += 1
+        self._position = position
+
+    def sync(self) -> None:
+        """Ship every WAL frame committed since the last call"""
+        if self._generation is None or time.monotonic() - self._generation_started > self.snapshot_interval:
+            self.new_generation()
+            return
+        previous = self._active
+        reader = self._begin_read()
+        header = read_wal_header(self.wal_path)
+        if header is not None and (self._position is None or header.salt != self._position.salt):
+            if self._position is not None and header.checkpoint_seq != self._position.checkpoint_seq + 1:
+                # More than one WAL restart since the last sync: frames may be missing, start over
+                self._release(previous, reader)
+                self.new_generation()
+                return
+            # The WAL was restarted after a full checkpoint of frames we had already shipped
+            self._position = header
+        self._ship()
+        self._release(previous, reader)
+        self._restart_wal()
+        self.last_sync = _now()
+
+    def _restart_wal(self) -> None:
+        """
+        Checkpoint every shipped frame and let the next writer start the WAL over, then pin a new reader.
+        Runs with the readers released, so frames committed since _ship() may be checkpointed (and later
+        overwritten) unshipped: the frame count the checkpoint reports tells, and the generation restarts.
+        """
+        frame_size = FRAME_HEADER.size + self._position.page_size if self._position is not None else 0
+        shipped = (self._position.offset - WAL_HEADER.size) // frame_size if self._position is not None else 0
+        for conn in self._readers:
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+        self._active = None
+        try:
+            busy, log_frames, _ = self._checkpointer.execute("PRAGMA wal_checkpoint(RESTART)").fetchone()
+        except sqlite3.OperationalError:
+            # Another connection is checkpointing; the WAL is left as it is
+            busy, log_frames = 1, -1
+        self._active = self._begin_read()
+        header = read_wal_header(self.wal_path)
+        restarted_unshipped = not busy and log_frames != shipped
+        # Nobody should have restarted the WAL while it was unpinned if our own checkpoint could not
+        restarted_elsewhere = busy and header is not None and self._position is not None and header.salt != self._position.salt
+        if restarted_unshipped or restarted_elsewhere:
+            logger.warning("backup: WAL restarted over unshipped frames; starting a new generation on the next sync")
+            self._generation = None
+
+    def _prune(self) -> None:
+        generations = sorted((self.root / "generations").iterdir())
+        for old in generations[:-self.keep_generations]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def _acquire_shipper_lock(self) -> bool:
+        """Only one process (e.g. one of several workers) ships a given backup directory"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not HAS_FCNTL:
+            return True
+        self._lock_file = open(self.root / ".shipper.lock", "a+")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def start(self) -> bool:
+        """Ship in a background thread; returns False if another process already ships this directory"""
+        if not self._acquire_shipper_lock():
+            return False
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="backup-shipper", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("backup: sync failed; starting a new generation on the next run")
+                self._generation = None
+            self._stop.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("backup: final sync failed")
+        for conn in self._readers:
+            conn.close()
+        if self._checkpointer is not None:
+            self._checkpointer.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+
+def list_generations(backup_dir: str) -> list[Generation]:
+    root = PathlibPath(backup_dir) / "generations"
+    if not root.is_dir():
+        return []
+    return [Generation(p) for p in sorted(root.iterdir()) if (p / "meta.json").exists()]
+
+
+def restore(backup_dir: str, output: str, target_time: str | None = None) -> dict:
+    """
+    Rebuild the database as it was at `target_time` (latest if None) and verify it.
+    Args:
+        backup_dir (str): Directory written by BackupManager
+        output (str): File to create; must not exist
+        target_time (str | None): ISO timestamp (UTC if no offset); resolution is the shipping interval
+    """
+    if os.path.exists(output):
+        raise FileExistsError(f"{output} already exists; restore never overwrites a database")
+    target = _parse_time(target_time) if target_time else None
+    candidates = [g for g in list_generations(backup_dir) if target is None or _parse_time(g.meta["created_at"]) <= target]
+    if not candidates:
+        raise LookupError(f"No backup generation at or before {target_time}")
+    generation = candidates[-1]
+
+    tmp = output + ".restoring"
+    with gzip.open(generation.path / "snapshot.sqlite3.gz", "rb") as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    applied_segments = applied_commits = 0
+    restored_to = generation.meta["created_at"]
+    with open(tmp, "r+b") as db:
+        pending: list[tuple[int, bytes]] = []
+        for segment in generation.segments():
+            # The first segment is part of the base snapshot; later ones are applied up to the target
+            if segment["seq"] > 0 and target is not None and _parse_time(segment["shipped_at"]) > target:
+                break
+            page_size = segment["page_size"]
+            for pgno, db_size, page in generation.iter_frames(segment):
+                pending.append((pgno, page))
+                if db_size:
+                    for number, data in pending:
+                        db.seek((number - 1) * page_size)
+                        db.write(data)
+                    db.truncate(db_size * page_size)
+                    pending.clear()
+                    applied_commits += 1
+            applied_segments += 1
+            restored_to = segment["shipped_at"]
+
+    conn = sqlite3.connect(tmp)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise RuntimeError(f"Restored database failed integrity_check: {result}")
+    os.replace(tmp, output)
+    return {"generation": generation.id, "segments": applied_segments, "commits": applied_commits, "restored_to": restored_to, "output": output}
+
+
+def verify(backup_dir: str) -> dict:
+    """Restore the latest state into a temporary file and run integrity_check on it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        return restore(backup_dir, os.path.join(tmp, "verify.sqlite3"))
+
+
+def backup_settings_from_env() -> dict | None:
+    """BACKUP_DIR enables continuous backup; BACKUP_INTERVAL, BACKUP_SNAPSHOT_HOURS and BACKUP_KEEP tune it"""
+    backup_dir = os.getenv("BACKUP_DIR")
+    if not backup_dir:
+        return None
+    return {
+        "backup_dir": backup_dir,
+        "interval": float(os.getenv("BACKUP_INTERVAL", "1")),
+        "snapshot_interval": float(os.getenv("BACKUP_SNAPSHOT_HOURS", "6")) * 3600,
+        "keep_generations": int(os.getenv("BACKUP_KEEP", "4")),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuous SQLite backup and point-in-time restore")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Ship snapshots and WAL segments until interrupted")
+    run.add_argument("--db", default=os.getenv("DB_PATH", "/data/data.sqlite3"))
+    run.add_argument("--dir", default=os.getenv("BACKUP_DIR"), required=not os.getenv("BACKUP_DIR"))
+    run.add_argument("--interval", type=float, default=1.0, help="Seconds between WAL shipments (default: 1)")
+    run.add_argument("--snapshot-hours", type=float, default=6.0, help="Hours between base snapshots (default: 6)")
+    snap = sub.add_parser("snapshot", help="Take one base snapshot (starts a new generation) and exit")
+    snap.add_argument("--db", default=os.getenv("DB_PATH", "/data/data.sqlite3"))
+    snap.add_argument("--dir", default=os.getenv("BACKUP_DIR"), required=not os.getenv("BACKUP_DIR"))
+    rest = sub.add_parser("restore", help="Restore to a new file, optionally at a point in time")
+    rest.add_argument("--dir", default=os.getenv("BACKUP_DIR"), required=not os.getenv("BACKUP_DIR"))
+    rest.add_argument("--output", required=True, help="Database file to create")
+    rest.add_argument("--time", help="ISO timestamp, e.g. 2026-10-19T18:30:00Z (default: latest)")
+    for name, help_text in (("verify", "Restore the latest state to a temporary file and check it"), ("list", "List generations")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--dir", default=os.getenv("BACKUP_DIR"), required=not os.getenv("BACKUP_DIR"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "run":
+        manager = BackupManager(args.db, args.dir, interval=args.interval, snapshot_interval=args.snapshot_hours * 3600)
+        if not manager.start():
+            raise SystemExit(f"Another process is already shipping to {args.dir}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            manager.stop()
+    elif args.command == "snapshot":
+        manager = BackupManager(args.db, args.dir)
+        print(manager.new_generation().id)
+        manager.stop()
+    elif args.command in ("restore", "verify"):
+        result = restore(args.dir, args.output, args.time) if args.command == "restore" else verify(args.dir)
+        print(json.dumps(result, indent=2))
+    else:
+        for generation in list_generations(args.dir):
+            segments = generation.segments()
+            last = segments[-1]["shipped_at"] if segments else generation.meta["created_at"]
+            print(f"{generation.id}\t{generation.meta['created_at']}\t{len(segments)} segments\tlatest {last}")
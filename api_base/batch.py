@@ -0,0 +1,186 @@
+import inspect
+import logging
+import sqlite3
+from typing import Annotated, Any, Callable, Iterable, get_origin
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.params import Depends
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter, ValidationError
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticUndefined
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Match
+
+from fast_json import loads
+
+logger = logging.getLogger("batch")
+
+
+class BatchRouter:
+    """
+    Runs whitelisted GET endpoints for POST /batch as direct function calls instead of HTTP round trips.
+
+    Every sub-request of a batch shares the batch's connection and its already verified token, and all of them
+    run inside one read transaction, so a page sees a single consistent snapshot of the database.  Endpoints get
+    the same arguments FastAPI would give them: path and query parameters coerced to their annotations, id
+    parameters resolved through their dependency (aliases from `ids.py migrate`), the request, the connection,
+    and the token payload for their role dependency, whose roles are enforced for the sub-request exactly as
+    they are for the route itself.  Results go through the route's response model.
+    """
+
+    def __init__(self, app, routes: Iterable[str], db_dependency: Callable):
+        """
+        Args:
+            app: The FastAPI application whose routes are batched
+            routes (Iterable[str]): Route templates a batch may call.  Only list routes that neither write nor
+                commit, and whose only dependencies are the connection and a role check (see roles_of)
+            db_dependency (Callable): The connection dependency endpoints declare (DB.get_db)
+        """
+        self.app = app
+        self.allowed = frozenset(routes)
+        self.db_dependency = db_dependency
+        self._routes: list[APIRoute] | None = None
+        self._roles: dict[str, Any] = {}
+        self._adapters: dict[Any, TypeAdapter] = {}
+
+    def roles_of(self, route: APIRoute) -> Any:
+        """
+        Roles the route's own role dependency allows (None when it has none: any signed-in user may call it).
+        The role check is recognised by the `allowed_roles` attribute require_role puts on its checker; any other
+        parameter dependency is a configuration error, since a batch has nothing to give it.
+        """
+        roles = None
+        for name, param in inspect.signature(route.endpoint).parameters.items():
+            if not isinstance(param.default, Depends):
+                continue
+            dependency = param.default.dependency
+            if dependency == self.db_dependency:
+                continue
+            if not hasattr(dependency, "allowed_roles"):
+                raise RuntimeError(f"Batch route {route.path} has a dependency a batch cannot provide: {name}")
+            roles = dependency.allowed_roles
+        return roles
+
+    def _whitelisted(self) -> list[APIRoute]:
+        if self._routes is None:
+            routes = [r for r in self.app.routes if isinstance(r, APIRoute) and "GET" in r.methods and r.path in self.allowed]
+            missing = self.allowed - {r.path for r in routes}
+            if missing:
+                raise RuntimeError(f"Batch routes are not GET routes of the app: {sorted(missing)}")
+            self._roles = {r.path: self.roles_of(r) for r in routes}
+            self._routes = routes
+        return self._routes
+
+    def _adapter(self, key: Any, annotation: Any) -> TypeAdapter:
+        adapter = self._adapters.get(key)
+        if adapter is None:
+            adapter = self._adapters[key] = TypeAdapter(annotation)
+        return adapter
+
+    def match(self, path: str) -> tuple[APIRoute, dict[str, Any]] | None:
+        for route in self._whitelisted():
+            match, child_scope = route.matches({"type": "http", "path": path, "method": "GET"})
+            if match is Match.FULL:
+                return route, child_scope["path_params"]
+        return None
+
+    def _arguments(self, route: APIRoute, request: Request, db: sqlite3.Connection, user: dict, path_params: dict, query: dict) -> dict[str, Any]:
+        kwargs = {}
+        for name, param in inspect.signature(route.endpoint).parameters.items():
+            annotation, default = param.annotation, param.default
+            if annotation is Request:
+                kwargs[name] = request
+                continue
+            if isinstance(default, Depends):
+                if default.dependency == self.db_dependency:
+                    kwargs[name] = db
+                elif hasattr(default.dependency, "allowed_roles"):
+                    # The endpoint's role check, which _run_one() has already applied to the batch's token
+                    kwargs[name] = user
+                else:
+                    raise RuntimeError(f"Batch route {route.path} has a dependency a batch cannot provide: {name}")
+                continue
+            raw = path_params.get(name, query.get(name))
+            if get_origin(annotation) is Annotated:
+                dependency = next((m for m in annotation.__metadata__ if isinstance(m, Depends)), None)
+                if dependency is not None:
+                    if raw is None:
+                        raise HTTPException(status_code=422, detail=f"Missing parameter: {name}")
+                    kwargs[name] = dependency.dependency(raw, db=db)
+                    continue
+            field = default if isinstance(default, FieldInfo) else None
+            if field is not None:
+                default = field.default
+            if raw is None:
+                if default in (inspect.Parameter.empty, PydanticUndefined, Ellipsis):
+                    raise HTTPException(status_code=422, detail=f"Missing parameter: {name}")
+                kwargs[name] = default
+            elif annotation is inspect.Parameter.empty:
+                kwargs[name] = raw
+            else:
+                # Query(...) constraints such as min_length or le apply as they do for the route itself
+                checked = Annotated[annotation, field] if field is not None else annotation
+                try:
+                    kwargs[name] = self._adapter((route.path, name), checked).validate_python(raw)
+                except ValidationError as exc:
+                    where = "path" if name in path_params else "query"
+                    errors = jsonable_encoder(exc.errors(include_url=False, include_context=False))
+                    raise HTTPException(status_code=422, detail=[{**e, "loc": [where, name, *e["loc"]]} for e in errors])
+        return kwargs
+
+    async def _run_one(self, request: Request, db: sqlite3.Connection, user: dict, path: str) -> tuple[int, Any]:
+        url = urlsplit(path)
+        matched = self.match(unquote(url.path))
+        if matched is None:
+            return 404, {"detail": "Route is not available in a batch"}
+        route, path_params = matched
+        roles = self._roles[route.path]
+        if roles is not None and user.get("role") != "all" and user.get("role") not in roles:
+            return 403, {"detail": "Insufficient permissions"}
+        query = {name: values[-1] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        try:
+            kwargs = self._arguments(route, request, db, user, path_params, query)
+        except HTTPException as exc:
+            return exc.status_code, {"detail": exc.detail}
+        try:
+            if inspect.iscoroutinefunction(route.endpoint):
+                result = await route.endpoint(**kwargs)
+            else:
+                result = await run_in_threadpool(route.endpoint, **kwargs)
+        except HTTPException as exc:
+            return exc.status_code, {"detail": exc.detail}
+        except Exception:
+            # One failing read does not fail the others
+            logger.exception("batch: %s failed", route.path)
+            return 500, {"detail": "Internal Server Error"}
+
+        if isinstance(result, Response):
+            return result.status_code, loads(result.body) if result.body else None
+        if route.response_model is None:
+            return 200, jsonable_encoder(result)
+        adapter = self._adapter(route.response_model, route.response_model)
+        try:
+            return 200, adapter.dump_python(adapter.validate_python(result, from_attributes=True), mode="json")
+        except ValidationError:
+            # FastAPI answers 500 when an endpoint's return value does not fit its response model
+            return 500, {"detail": "Internal Server Error"}
+
+    async def run(self, request: Request, db: sqlite3.Connection, user: dict, sub_requests: list) -> list[dict[str, Any]]:
+        """Results in request order: {"id", "status", "body"} per sub-request"""
+        results = []
+        # A deferred transaction: its snapshot is taken by the first read and holds until the rollback
+        began = not db.in_transaction
+        if began:
+            db.execute("BEGIN")
+        try:
+            for position, sub in enumerate(sub_requests):
+                status, body = await self._run_one(request, db, user, sub.path)
+                results.append({"id": sub.id if sub.id is not None else str(position), "status": status, "body": body})
+        finally:
+            if began:
+                db.rollback()
+        return results
@@ -0,0 +1,193 @@
+import argparse
+import base64
+import binascii
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path as PathlibPath
+from typing import Iterator
+
+from schema import Signature
+
+CHUNK_SIZE = 64 * 1024
+
+# Magic numbers of the raster formats a signature pad can produce.  SVG is deliberately absent: it can carry
+# script, and the signature endpoint serves stored bytes back on the API's own origin
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class BlobStoreInterface(ABC):
+    """Abstract content-addressed store.  A blob's reference is 'sha256:<hex digest>' of its bytes."""
+
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        """Store bytes and return their reference.  Storing the same bytes twice is a no-op."""
+        pass
+
+    @abstractmethod
+    def exists(self, ref: str) -> bool:
+        """Check whether a blob is present"""
+        pass
+
+    @abstractmethod
+    def iter_chunks(self, ref: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream a blob's bytes"""
+        pass
+
+    @abstractmethod
+    def size(self, ref: str) -> int:
+        """Size of a blob in bytes"""
+        pass
+
+    @abstractmethod
+    def delete(self, ref: str) -> None:
+        """Remove a blob if present"""
+        pass
+
+    @staticmethod
+    def ref_for(data: bytes) -> str:
+        return "sha256:" + hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def digest_of(ref: str) -> str:
+        algorithm, _, digest = ref.partition(":")
+        if algorithm != "sha256" or len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob reference '{ref}'")
+        return digest
+
+
+class LocalBlobStore(BlobStoreInterface):
+    """Blob store backed by a local (or mounted) directory, fanned out as <root>/ab/cd/<digest>"""
+
+    def __init__(self, root: str):
+        self.root = PathlibPath(root)
+
+    def _path(self, ref: str) -> PathlibPath:
+        digest = self.digest_of(ref)
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def put(self, data: bytes) -> str:
+        ref = self.ref_for(data)
+        path = self._path(ref)
+        if path.exists():
+            return ref
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return ref
+
+    def exists(self, ref: str) -> bool:
+        return self._path(ref).is_file()
+
+    def iter_chunks(self, ref: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self._path(ref), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def size(self, ref: str) -> int:
+        return self._path(ref).stat().st_size
+
+    def delete(self, ref: str) -> None:
+        self._path(ref).unlink(missing_ok=True)
+
+
+def sniff_media_type(head: bytes) -> str | None:
+    """An image's media type from its first 12+ bytes; None for anything but PNG, JPEG, GIF or WebP"""
+    for magic, media_type in IMAGE_SIGNATURES:
+        if head.startswith(magic):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def decode_base64_image(value: str, require_image: bool = True) -> bytes:
+    """
+    Decode a base64 image, accepting both bare base64 and 'data:image/png;base64,...' URIs.
+    Raises ValueError for invalid base64 and, with `require_image`, for bytes that are not a PNG, JPEG, GIF or
+    WebP image (rows stored before that check are read back and migrated with require_image=False).
+    """
+    if value.startswith("data:"):
+        value = value.split(",", 1)[1]
+    try:
+        image = base64.b64decode(value, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"signature_image_base64 is not valid base64: {e}") from e
+    if require_image and sniff_media_type(image[:16]) is None:
+        raise ValueError("signature_image_base64 must be a PNG, JPEG, GIF or WebP image")
+    return image
+
+
+def store_signature(store: BlobStoreInterface, signature: Signature) -> Signature:
+    """
+    Move a signature's inline image into the blob store.
+    Returns:
+        A Signature that carries only the blob reference; this is what gets written to youth_medical
+    """
+    if signature.signature_image_base64 is None:
+        return signature
+    ref = store.put(decode_base64_image(signature.signature_image_base64))
+    return Signature(signed_by=signature.signed_by, signature_ref=ref)
+
+
+def migrate_inline_signatures(conn, store: BlobStoreInterface, batch_size: int = 100) -> int:
+    """
+    Rewrite youth_medical rows that still hold an inline base64 signature so they keep only a reference.
+    Returns:
+        Number of rows migrated
+    """
+    migrated = 0
+    while True:
+        rows = conn.execute(
+            "SELECT youth_id, signature FROM youth_medical "
+            "WHERE json_extract(signature, '$.signature_image_base64') IS NOT NULL LIMIT ?",
+            (batch_size,),
+        ).fetchall()
+        if not rows:
+            return migrated
+        updates = []
+        for youth_id, signature_json in rows:
+            signature = Signature(**json.loads(signature_json))
+            ref = store.put(decode_base64_image(signature.signature_image_base64, require_image=False))
+            updates.append((Signature(signed_by=signature.signed_by, signature_ref=ref).model_dump_json(exclude_none=True), youth_id))
+        conn.executemany("UPDATE youth_medical SET signature = ? WHERE youth_id = ?", updates)
+        conn.commit()
+        migrated += len(updates)
+
+
+@lru_cache(maxsize=1)
+def get_blob_store() -> BlobStoreInterface:
+    """Process-wide blob store; BLOB_STORE_PATH defaults to a 'blobs' directory beside the database"""
+    default_root = PathlibPath(os.getenv("DB_PATH", "/data/data.sqlite3")).parent / "blobs"
+    return LocalBlobStore(os.getenv("BLOB_STORE_PATH", str(default_root)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Signature blob store maintenance")
+    parser.add_argument("command", choices=["migrate"], help="migrate: move inline base64 signatures into the blob store")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "/data/data.sqlite3"), help="Path to the SQLite database")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    try:
+        count = migrate_inline_signatures(connection, get_blob_store())
+        print(f"Moved {count} signature images into {get_blob_store().root}")
+    finally:
+        connection.close()
@@ -0,0 +1,178 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+logger = logging.getLogger("checkpoint")
+
+
+class WalCheckpointer:
+    """
+    Checkpoints the WAL from a background thread so no request pays for it.
+
+    Request connections run with wal_autocheckpoint=0 while this is enabled.  Every `interval` seconds a
+    PASSIVE checkpoint copies whatever frames no reader still needs into the database file without waiting
+    on anyone.  Once the WAL grows past `truncate_bytes`, a TRUNCATE checkpoint is tried with a zero busy
+    timeout: it resets the WAL to zero bytes when no reader is using it and otherwise gives up immediately
+    (e.g. while backup.py holds its read transaction), so it never stalls writers.
+    Every `optimize_interval` seconds it also refreshes the query planner statistics.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        interval: float = 5.0,
+        truncate_bytes: int = 64 * 1024 * 1024,
+        optimize_interval: float = 3600,
+        analysis_limit: int = 1000,
+    ):
+        self.db_path = db_path
+        self.wal_path = f"{db_path}-wal"
+        self.interval = interval
+        self.truncate_bytes = truncate_bytes
+        self.optimize_interval = optimize_interval
+        self.analysis_limit = analysis_limit
+        # (mode, result) -> count, plus totals for the metrics endpoint
+        self.checkpoints: dict[tuple[str, str], int] = {}
+        self.frames_checkpointed = 0
+        self.seconds = 0.0
+        self.last_optimize: float | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+        self._conn: sqlite3.Connection | None = None
+
+    def wal_bytes(self) -> int:
+        try:
+            return os.stat(self.wal_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=0, check_same_thread=False)
+            self._conn.execute("PRAGMA busy_timeout = 0")
+        return self._conn
+
+    def checkpoint(self) -> dict[str, Any]:
+        """One PASSIVE checkpoint, followed by a TRUNCATE attempt when the WAL is over its size limit"""
+        mode = "TRUNCATE" if self.wal_bytes() > self.truncate_bytes else "PASSIVE"
+        start = time.perf_counter()
+        try:
+            busy, log_frames, checkpointed = self._connection().execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        except sqlite3.OperationalError:
+            # Another connection is checkpointing or writing the WAL header; try again next interval
+            busy, log_frames, checkpointed = 1, -1, -1
+        self.seconds += time.perf_counter() - start
+        result = "busy" if busy else "ok"
+        self.checkpoints[(mode, result)] = self.checkpoints.get((mode, result), 0) + 1
+        self.frames_checkpointed += max(checkpointed, 0)
+        return {"mode": mode, "busy": bool(busy), "wal_frames": log_frames, "checkpointed": checkpointed}
+
+    def optimize(self) -> None:
+        """
+        Refresh sqlite_stat1 with a bounded ANALYZE.  `PRAGMA optimize` on this idle connection would skip
+        every table (before SQLite 3.46 it only considers tables the connection itself queried).
+        """
+        conn = self._connection()
+        conn.execute("PRAGMA busy_timeout = 5000")
+        try:
+            conn.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.execute("PRAGMA busy_timeout = 0")
+        self.last_optimize = time.time()
+
+    def _acquire_lock(self) -> bool:
+        """Only one process (e.g. one of several workers) checkpoints a given database"""
+        if not HAS_FCNTL:
+            return True
+        self._lock_file = open(f"{self.db_path}.checkpoint.lock", "a+")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def start(self) -> bool:
+        """Checkpoint in a background thread; returns False if another process already does"""
+        if not self._acquire_lock():
+            return False
+        self._thread = threading.Thread(target=self._run, name="wal-checkpointer", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        next_optimize = time.monotonic() + self.optimize_interval
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+                if self.optimize_interval and time.monotonic() >= next_optimize:
+                    self.optimize()
+                    next_optimize = time.monotonic() + self.optimize_interval
+            except Exception:
+                logger.exception("checkpoint: background run failed")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+            # Leave a small WAL behind for the next start
+            try:
+                self.checkpoint()
+            except Exception:
+                logger.exception("checkpoint: final checkpoint failed")
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def metric_lines(self) -> list[str]:
+        """Prometheus lines for /metrics; the WAL size is the file on disk, so every worker reports it"""
+        lines = [
+            "# HELP sqlite_wal_bytes Size of the database's -wal file.",
+            "# TYPE sqlite_wal_bytes gauge",
+            f"sqlite_wal_bytes {self.wal_bytes()}",
+            "# HELP sqlite_wal_checkpoints_total Background checkpoints run by this worker, by mode and result.",
+            "# TYPE sqlite_wal_checkpoints_total counter",
+        ]
+        for (mode, result), count in sorted(self.checkpoints.items()):
+            lines.append(f'sqlite_wal_checkpoints_total{{mode="{mode}",result="{result}"}} {count}')
+        lines += [
+            "# HELP sqlite_wal_checkpointed_frames_total WAL frames copied into the database file by this worker.",
+            "# TYPE sqlite_wal_checkpointed_frames_total counter",
+            f"sqlite_wal_checkpointed_frames_total {self.frames_checkpointed}",
+            "# HELP sqlite_wal_checkpoint_seconds_total Time spent in background checkpoints.",
+            "# TYPE sqlite_wal_checkpoint_seconds_total counter",
+            f"sqlite_wal_checkpoint_seconds_total {self.seconds:.6f}",
+        ]
+        return lines
+
+
+def checkpoint_settings_from_env() -> dict[str, Any] | None:
+    """
+    DB_CHECKPOINT_INTERVAL seconds between background checkpoints (default 5; 0 leaves checkpoints to
+    wal_autocheckpoint); DB_CHECKPOINT_TRUNCATE_MB (default 64) is the WAL size that triggers TRUNCATE.
+    Returns None when the background checkpointer is off.
+    """
+    interval = float(os.getenv("DB_CHECKPOINT_INTERVAL", "5"))
+    if interval <= 0:
+        return None
+    return {
+        "interval": interval,
+        "truncate_bytes": int(float(os.getenv("DB_CHECKPOINT_TRUNCATE_MB", "64")) * 1024 * 1024),
+    }
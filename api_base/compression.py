@@ -0,0 +1,294 @@
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+# Text-like bodies worth compressing; images other than SVG, archives and event streams are sent as they are
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/pdf",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+NEVER_COMPRESS = ("text/event-stream",)
+# Bodies larger than this are compressed in the threadpool instead of on the event loop
+THREADPOOL_BYTES = 256 * 1024
+
+
+def _compressible(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    if content_type in NEVER_COMPRESS:
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith("+json")
+
+
+def negotiate(accept_encoding: str, brotli_available: bool = HAS_BROTLI) -> str | None:
+    """Best of br/gzip the client accepts (q > 0), br first on a tie; None for identity"""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = (["br"] if brotli_available else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressedBodyCache:
+    """
+    LRU of compressed bodies keyed by encoding and a digest of the uncompressed body, bounded by total size.
+
+    Identical responses - the same activity list or health report until the data behind it changes - are
+    compressed once and then served from memory; hashing a body costs a small fraction of compressing it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry = max_bytes // 8
+        self._entries: OrderedDict[tuple[str, bytes], bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(encoding: str, body: bytes) -> tuple[str, bytes]:
+        return encoding, hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key: tuple[str, bytes]) -> bytes | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple[str, bytes], value: bytes) -> None:
+        if len(value) > self.max_entry:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def metric_lines(self) -> list[str]:
+        return [
+            "# HELP compression_cache_hits_total Responses served from the compressed body cache.",
+            "# TYPE compression_cache_hits_total counter",
+            f"compression_cache_hits_total {self.hits}",
+            "# HELP compression_cache_misses_total Responses compressed because the cache had no copy.",
+            "# TYPE compression_cache_misses_total counter",
+            f"compression_cache_misses_total {self.misses}",
+            "# HELP compression_cache_bytes Compressed bytes held by the cache.",
+            "# TYPE compression_cache_bytes gauge",
+            f"compression_cache_bytes {self._size}",
+        ]
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text-like responses with brotli (when installed) or gzip, per Accept-Encoding.
+
+    Responses smaller than `min_size`, of other content types, already encoded, or to HEAD requests pass through
+    untouched.  Complete bodies go through a CompressedBodyCache so each distinct body is compressed once;
+    streamed bodies are compressed chunk by chunk and flushed as they go.
+    """
+
+    def __init__(
+        self,
+        app,
+        min_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache: CompressedBodyCache | None = None,
+    ):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = negotiate(accept) if accept else None
+        # Without an encoding the response still gets `Vary: Accept-Encoding` so shared caches keep them apart
+        await self.app(scope, receive, _Responder(self, encoding, send).send)
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def compress_cached(self, encoding: str, body: bytes) -> bytes:
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(encoding, body)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        if len(body) > THREADPOOL_BYTES:
+            compressed = await run_in_threadpool(self.compress, encoding, body)
+        else:
+            compressed = self.compress(encoding, body)
+        if key is not None:
+            self.cache.put(key, compressed)
+        return compressed
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._br = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self._br is not None:
+            return self._br.process(data) + self._br.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._br is not None:
+            return self._br.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class _Responder:
+    """Per-request send() wrapper: decides from the response headers, then buffers, streams or passes through"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str | None, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start: dict | None = None
+        self.mode = "pass"
+        self.chunks: list[bytes] = []
+        self.stream: _StreamCompressor | None = None
+
+    def _headers(self, drop: tuple[bytes, ...] = ()) -> list:
+        return [(k, v) for k, v in self.start.get("headers", []) if k.lower() not in drop]
+
+    async def send(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            headers = {k.lower(): v for k, v in message.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            length = headers.get(b"content-length")
+            self.start = message
+            if b"content-encoding" in headers or not content_type or not _compressible(content_type):
+                self.mode = "pass"
+            elif self.encoding is None or (length is not None and int(length) < self.middleware.min_size):
+                self.mode = "small"
+            else:
+                self.mode = "buffer"
+            if self.mode != "pass":
+                # The body differs by Accept-Encoding whenever it could have been compressed
+                message = {**message, "headers": self._headers((b"vary",)) + [(b"vary", self._vary(headers))]}
+                self.start = message
+            if self.mode in ("pass", "small"):
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.mode in ("pass", "small"):
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.mode == "buffer":
+            self.chunks.append(body)
+            if more:
+                # A streamed response: compress as it goes rather than holding it all
+                self.mode = "stream"
+                self.stream = _StreamCompressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+                await self._send({**self.start, "headers": self._encoded_headers()})
+                await self._send({"type": "http.response.body", "body": self.stream.chunk(b"".join(self.chunks)), "more_body": True})
+                self.chunks = []
+                return
+            whole = b"".join(self.chunks)
+            if len(whole) < self.middleware.min_size:
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": whole})
+                return
+            compressed = await self.middleware.compress_cached(self.encoding, whole)
+            headers = self._encoded_headers() + [(b"content-length", str(len(compressed)).encode())]
+            await self._send({**self.start, "headers": headers})
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        # mode == "stream"
+        data = self.stream.chunk(body) if body else b""
+        if not more:
+            data += self.stream.finish()
+        if data or not more:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more})
+
+    def _encoded_headers(self) -> list:
+        headers = []
+        for k, v in self._headers((b"content-length",)):
+            if k.lower() == b"etag" and not v.startswith(b"W/"):
+                # The compressed bytes are a different representation: only a weak validator still holds
+                v = b"W/" + v
+            headers.append((k, v))
+        return headers + [(b"content-encoding", self.encoding.encode())]
+
+    @staticmethod
+    def _vary(headers: dict) -> bytes:
+        vary = headers.get(b"vary", b"")
+        if b"accept-encoding" in vary.lower():
+            return vary
+        return vary + b", Accept-Encoding" if vary else b"Accept-Encoding"
+
+
+def compression_settings_from_env() -> dict[str, Any] | None:
+    """
+    COMPRESSION_MIN_BYTES (default 1024), COMPRESSION_GZIP_LEVEL (default 6), COMPRESSION_BROTLI_QUALITY (default 5)
+    and COMPRESSION_CACHE_MB (compressed bodies kept per worker, default 32; 0 disables the cache);
+    COMPRESSION=0 turns response compression off.
+    """
+    if os.getenv("COMPRESSION", "1").lower() in ("0", "false", "no"):
+        return None
+    cache_mb = float(os.getenv("COMPRESSION_CACHE_MB", "32"))
+    return {
+        "min_size": int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+        "gzip_level": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+        "brotli_quality": int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5")),
+        "cache": CompressedBodyCache(int(cache_mb * 1024 * 1024)) if cache_mb > 0 else None,
+    }
@@ -1,17 +1,19 @@
 from typing import List, Dict
-from twilio.rest import Client
 import os
-from dotenv import load_dotenv
+from lazy_import import LazyModule
 
-load_dotenv()
+# The Twilio SDK is only imported when a message is actually sent
+twilio_rest = LazyModule("twilio.rest")
 
 
 class ContactEngine:
-    base_site_url = os.getenv("BaseActivitySiteURL")
-    account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-    auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-    from_number = os.getenv('TWILIO_PHONE_NUMBER')
-    sms_sid = os.getenv("TWILLIO_MESSAGE_SID")
+    def __init__(self):
+        # Read at construction (after main.py has loaded .env), not at import
+        self.base_site_url = os.getenv("BaseActivitySiteURL")
+        self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
+        self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
+        self.from_number = os.getenv('TWILIO_PHONE_NUMBER')
+        self.sms_sid = os.getenv("TWILLIO_MESSAGE_SID")
 
     def send_text(self, phone_number: List[str], message: str) -> Dict[str, bool]:
         # Implementation to send a text message
@@ -22,7 +24,7 @@ class ContactEngine:
         pass
 
     def send_sms(self, message:str, recipient:str)->None:
-        client = Client(self.account_sid, self.auth_token)
+        client = twilio_rest.Client(self.account_sid, self.auth_token)
         message = client.messages.create(
             messaging_service_sid=self.sms_sid,
             body=message,
@@ -34,7 +36,7 @@ class ContactEngine:
 
 
     def send_whatsapp_message(self, recipient: str):
-        client = Client(self.account_sid, self.auth_token)
+        client = twilio_rest.Client(self.account_sid, self.auth_token)
 
         body = 'Click on this to approve: http://example.com'
 
@@ -48,7 +50,7 @@ class ContactEngine:
 
 
     def send_mms(self, recipient: str, media_url: str):
-        client = Client(self.account_sid, self.auth_token)
+        client = twilio_rest.Client(self.account_sid, self.auth_token)
 
         message_body = 'Click on this to approve: http://example.com'
 
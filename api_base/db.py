@@ -10,10 +10,21 @@
 import sqlite3
 from pathlib import Path as PathlibPath
 from db_setup import DBSetup
+from permission_codes import PermissionCodeAllocator
 from abc import ABC, abstractmethod
 from typing import Generator, Any
+from contextvars import ContextVar
+from contextlib import contextmanager
+from time import perf_counter, monotonic, sleep
+from dataclasses import dataclass, fields, replace
 import os
 
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
 try:
     import psycopg2
     from psycopg2 import sql
@@ -28,6 +39,166 @@ except ImportError:
     HAS_MYSQL = False
 
 
+class QueryStats:
+    """Number of queries and time spent in SQLite during one request, plus an optional QueryProfile (profiler.py)"""
+    __slots__ = ("queries", "seconds", "profile")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.profile = None
+
+
+# Set per request by the metrics middleware; queries outside a request are not counted
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that adds its execute and fetch time to the current request's QueryStats and,
+    when the request is being profiled, records each statement and the rows it returned.
+    """
+    _profile_record = None
+
+    def execute(self, sql, parameters=()):
+        stats = current_query_stats.get()
+        if stats is None:
+            return super().execute(sql, parameters)
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = perf_counter() - start
+            stats.queries += 1
+            stats.seconds += elapsed
+            if stats.profile is not None:
+                self._profile_record = stats.profile.record(self, sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = current_query_stats.get()
+        if stats is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = perf_counter() - start
+            stats.queries += 1
+            stats.seconds += elapsed
+            if stats.profile is not None:
+                self._profile_record = stats.profile.record(self, sql, (), elapsed)
+
+    def fetchall(self):
+        stats = current_query_stats.get()
+        if stats is None:
+            return super().fetchall()
+        start = perf_counter()
+        try:
+            rows = super().fetchall()
+        finally:
+            stats.seconds += perf_counter() - start
+        if self._profile_record is not None:
+            self._profile_record.rows += len(rows)
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None and self._profile_record is not None:
+            self._profile_record.rows += 1
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors (including connection.execute shortcuts) are TimedCursors"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+@dataclass(frozen=True)
+class PragmaProfile:
+    """
+    Per-connection SQLite tuning applied by DatabaseEngine.connect.
+    Args:
+        cache_size_kib (int): Page cache per connection in KiB (connections are per request, so this is mostly
+            the working set of a single request)
+        mmap_size (int): Bytes of the file read through memory mapping, shared by every connection via the OS page cache (0 = off)
+        temp_store (str): Where sorts and temporary indexes live: DEFAULT, FILE or MEMORY
+        busy_timeout_ms (int): How long a connection waits on another writer before "database is locked"
+        wal_autocheckpoint (int): WAL pages after which the committing request runs a checkpoint (0 = never;
+            set automatically when the background checkpointer in checkpoint.py runs)
+        synchronous (str): OFF, NORMAL or FULL (NORMAL is durable across application crashes in WAL mode)
+        optimize_interval (float): Seconds between background ANALYZE runs (0 = off)
+    """
+    cache_size_kib: int
+    mmap_size: int
+    temp_store: str
+    busy_timeout_ms: int
+    wal_autocheckpoint: int
+    synchronous: str = "NORMAL"
+    optimize_interval: float = 3600
+
+    def validate(self) -> "PragmaProfile":
+        if self.cache_size_kib <= 0:
+            raise ValueError("cache_size_kib must be positive")
+        if self.mmap_size < 0 or self.busy_timeout_ms < 0 or self.wal_autocheckpoint < 0 or self.optimize_interval < 0:
+            raise ValueError("mmap_size, busy_timeout_ms, wal_autocheckpoint and optimize_interval cannot be negative")
+        if self.temp_store.upper() not in ("DEFAULT", "FILE", "MEMORY"):
+            raise ValueError(f"temp_store must be DEFAULT, FILE or MEMORY, not '{self.temp_store}'")
+        if self.synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"synchronous must be OFF, NORMAL, FULL or EXTRA, not '{self.synchronous}'")
+        return self
+
+    def script(self) -> str:
+        """The PRAGMAs as one script, so opening a connection costs a single call"""
+        return (
+            f"PRAGMA cache_size = -{int(self.cache_size_kib)};"
+            f"PRAGMA mmap_size = {int(self.mmap_size)};"
+            f"PRAGMA temp_store = {self.temp_store.upper()};"
+            f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)};"
+            f"PRAGMA wal_autocheckpoint = {int(self.wal_autocheckpoint)};"
+            f"PRAGMA synchronous = {self.synchronous.upper()};"
+        )
+
+
+# Selected with DB_PROFILE; see benchmarks/bench_pragmas.py for the numbers behind "default"
+PRAGMA_PROFILES = {
+    # SQLite's own defaults: 2 MiB cache, no mmap, auto-checkpoint every 1000 pages
+    "minimal": PragmaProfile(cache_size_kib=2000, mmap_size=0, temp_store="DEFAULT", busy_timeout_ms=5000, wal_autocheckpoint=1000, optimize_interval=0),
+    "default": PragmaProfile(cache_size_kib=8192, mmap_size=256 * 1024 * 1024, temp_store="MEMORY", busy_timeout_ms=5000, wal_autocheckpoint=1000),
+    # Large stake databases on a host with memory to spare
+    "large": PragmaProfile(cache_size_kib=65536, mmap_size=1024 * 1024 * 1024, temp_store="MEMORY", busy_timeout_ms=10000, wal_autocheckpoint=4000),
+}
+
+
+def pragma_profile_from_env() -> PragmaProfile:
+    """
+    DB_PROFILE picks a named profile (default: "default"); DB_PRAGMAS overrides single fields,
+    e.g. "cache_size_kib=32768,mmap_size=0".  DB_BUSY_TIMEOUT_MS still overrides busy_timeout_ms.
+    """
+    name = os.getenv("DB_PROFILE", "default")
+    if name not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{name}'; choose one of {', '.join(PRAGMA_PROFILES)}")
+    profile = PRAGMA_PROFILES[name]
+    types = {field.name: field.type for field in fields(PragmaProfile)}
+    overrides = {}
+    for item in filter(None, (part.strip() for part in os.getenv("DB_PRAGMAS", "").split(","))):
+        key, _, value = item.partition("=")
+        key = key.strip()
+        if key not in types:
+            raise ValueError(f"Unknown DB_PRAGMAS setting '{key}'; expected one of {', '.join(types)}")
+        overrides[key] = types[key](value.strip())
+    if os.getenv("DB_BUSY_TIMEOUT_MS"):
+        overrides["busy_timeout_ms"] = int(os.environ["DB_BUSY_TIMEOUT_MS"])
+    return replace(profile, **overrides).validate()
+
+
 class DatabaseEngineInterface(ABC):
     """Abstract interface for database backends"""
     
@@ -60,9 +231,53 @@ class DatabaseEngineInterface(ABC):
 class DatabaseEngine(DatabaseEngineInterface):
     def __init__(self, DB_PATH: str):
         self.DB_PATH = DB_PATH
-    
+        # Cache, mmap, busy timeout and checkpoint settings for every connection (DB_PROFILE / DB_PRAGMAS)
+        self.profile = pragma_profile_from_env()
+        # How long a worker waits for another worker to finish schema setup
+        self.startup_lock_timeout = float(os.getenv("DB_STARTUP_LOCK_TIMEOUT", "120"))
+
+    @contextmanager
+    def startup_lock(self, db_path: PathlibPath) -> Generator:
+        """
+        Exclusive lock on '<db>.startup.lock' shared by every worker process.
+        The first worker to start holds it while it creates tables and seeds data; the others
+        block here until it is done, so no worker serves requests before the schema is ready.
+        On platforms without fcntl there is no lock and busy_timeout alone serializes writers.
+        """
+        if not HAS_FCNTL:
+            yield
+            return
+        lock_path = db_path.with_name(db_path.name + ".startup.lock")
+        with open(lock_path, "a+") as lock_file:
+            deadline = monotonic() + self.startup_lock_timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if monotonic() > deadline:
+                        raise RuntimeError(
+                            f"Timed out after {self.startup_lock_timeout:.0f}s waiting for another worker to set up '{db_path}'"
+                        )
+                    sleep(0.05)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     def startup(self, app):
-        db_path = PathlibPath(self.DB_PATH)
+        app.state._db = self.prepare_database(PathlibPath(self.DB_PATH))
+        return app
+
+    def prepare_database(self, db_path: PathlibPath, seed_admins: bool = True) -> sqlite3.Connection:
+        """
+        Validate the database location, then create tables and seed data once per schema version.
+        Args:
+            db_path (PathlibPath): SQLite file to prepare
+            seed_admins (bool): Whether to load the default admin users
+        Returns:
+            An open connection to the prepared database
+        """
         # 1. DB_PATH must include a filename
         if not db_path.suffix:
             raise RuntimeError(
@@ -84,33 +299,56 @@ class DatabaseEngine(DatabaseEngineInterface):
                 f"DB_PATH parent '{db_path.parent}' exists but is not a directory."
             )
 
-        # 4. Try opening SQLite to catch permission/locking issues early
-        try:
-            # conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-            conn = self.connect(str(db_path))
-            conn.execute("PRAGMA journal_mode=WAL;")
-        except Exception as e:
-            raise RuntimeError(
-                f"SQLite failed to open database at '{db_path}': {e}"
-            ) from e
+        with self.startup_lock(db_path):
+            # 4. Try opening SQLite to catch permission/locking issues early
+            try:
+                conn = self.connect(str(db_path))
+                # Only takes effect on a new, empty file: lets retention.py hand freed pages back incrementally
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+                # WAL is persistent in the database file, so it is only switched on here
+                conn.execute("PRAGMA journal_mode = WAL;")
+            except Exception as e:
+                raise RuntimeError(
+                    f"SQLite failed to open database at '{db_path}': {e}"
+                ) from e
 
-        conn.row_factory = sqlite3.Row
+            # Cache, mmap and synchronous come from the PragmaProfile applied in connect()
+            conn.execute("PRAGMA foreign_keys = ON;")
 
-        # Helpful pragmas for reliability/performance on SQLite
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.execute("PRAGMA journal_mode = WAL;")
-        conn.execute("PRAGMA synchronous = NORMAL;")
+            # 5. Only the first worker after a schema change runs setup and seeding
+            db_setup = DBSetup(conn)
+            if not db_setup.is_current():
+                db_setup.create_tables()
+                if seed_admins:
+                    db_setup.load_admins()
+                db_setup.mark_current()
+        return conn
 
-        db_setup=DBSetup(conn)
-        db_setup.create_tables()
-        db_setup.load_admins()
-        app.state._db = conn
-        return app
+    def token_claims(self, request: Any) -> dict[str, Any]:
+        """Extra JWT claims describing where the caller's data lives (none for a single database)"""
+        return {}
+
+    def register_permission_code(self, request: Any, code: str) -> None:
+        """Record which database owns a new permission code (nothing to record for a single database)"""
+        pass
+
+    def code_allocator(self, request: Any, conn: sqlite3.Connection) -> PermissionCodeAllocator:
+        """Allocator for new permission codes, writing through the request's connection"""
+        return PermissionCodeAllocator(conn)
+
+    def fan_out(self, fn: Any, stake_id: str | None = None, max_workers: int = 1) -> dict[str, Any]:
+        """Run a read-only report against every database; a single database reports as unit 'default'"""
+        conn = self.connect(self.DB_PATH)
+        try:
+            return {"default": fn(conn)}
+        finally:
+            self.close(conn)
 
     def connect(self, db_path: str) -> sqlite3.Connection:
         """Establish a connection to SQLite database"""
-        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn = sqlite3.connect(db_path, check_same_thread=False, factory=TimedConnection, timeout=self.profile.busy_timeout_ms / 1000)
         conn.row_factory = sqlite3.Row
+        conn.executescript(self.profile.script())
         return conn
     
     def close(self, connection: sqlite3.Connection) -> None:
@@ -136,10 +374,8 @@ class DatabaseEngine(DatabaseEngineInterface):
 
         conn = self.connect(str(db_path))
 
-        # Pragmas (safe to do per connection)
+        # Tuning pragmas are applied in connect(); journal_mode=WAL is set once in startup
         conn.execute("PRAGMA foreign_keys = ON;")
-        conn.execute("PRAGMA journal_mode = WAL;")
-        conn.execute("PRAGMA synchronous = NORMAL;")
 
         try:
             yield conn
@@ -1,8 +1,62 @@
+from group_index import create_tables as create_cache_version_tables
+from live_events import create_tables as create_live_event_tables
+from permission_codes import backfill_client_codes, create_tables as create_permission_code_tables
+
+
 class DBSetup:
+    # Stored in PRAGMA user_version once create_tables/load_admins have run.
+    # Bump it whenever create_tables or the seed data changes so running databases are migrated.
+    SCHEMA_VERSION = 8
+
     def __init__(self, db_connection):
         self.conn = db_connection
 
+    def schema_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def is_current(self) -> bool:
+        """True when this database has already been set up for the current SCHEMA_VERSION"""
+        return self.schema_version() >= self.SCHEMA_VERSION
+
+    def mark_current(self) -> None:
+        self.conn.execute(f"PRAGMA user_version = {int(self.SCHEMA_VERSION)}")
+        self.conn.commit()
+
+    def _columns(self, table: str) -> list[str]:
+        """Return the column names of an existing table (empty if the table is missing)"""
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+    def _drop_if_malformed(self, table: str, column: str, declared_type: str) -> None:
+        """
+        Drop a table created by an older, malformed DDL so it is recreated below.
+        The table is malformed when `column` is missing or has the wrong declared type.
+        Only empty tables are dropped: the malformed DDLs could never accept an insert.
+        """
+        columns = {row[1]: row[2] for row in self.conn.execute(f"PRAGMA table_info({table})").fetchall()}
+        if not columns or columns.get(column) == declared_type:
+            return
+        if self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0:
+            self.conn.execute(f"DROP TABLE {table}")
+
+    def _add_column_if_missing(self, table: str, column: str, ddl: str) -> bool:
+        """Add a column to an existing table; returns True if the column had to be added"""
+        if column in self._columns(table):
+            return False
+        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        return True
+
+    def _index_exists(self, name: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        return row is not None
+
+    def _table_exists(self, name: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
     def create_tables(self):
+        self._drop_if_malformed("youth_medical", "updated_at", "TEXT")
+        self._drop_if_malformed("personal_goals", "visibility_level", "TEXT")
+
         # Core tables
         self.conn.execute(
             """
@@ -46,6 +100,10 @@ class DBSetup:
             """
         )
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_admin_users_username ON admin_users(username);")
+        # Who a youth or parent account is: the youth_medical row of a youth, the household (see
+        # permission_codes.household_key) of a parent.  Goal visibility and search resolve them per request.
+        self._add_column_if_missing("admin_users", "youth_id", "TEXT")
+        self._add_column_if_missing("admin_users", "household_id", "TEXT")
 
         self.conn.execute(
             """
@@ -56,7 +114,8 @@ class DBSetup:
             """
         )
 
-        # Stores the medical release submission payloads (JSON blobs)
+        # Stores the medical release submission payloads (JSON blobs).
+        # medical and emergency_contact are encrypted at rest (see field_crypto.py).
         self.conn.execute(
             """
             CREATE TABLE IF NOT EXISTS youth_medical (
@@ -70,13 +129,22 @@ class DBSetup:
                 signed_at TEXT NOT NULL,
                 created_at TEXT NOT NULL DEFAULT (datetime('now')),
                 updated_at TEXT
-                youth_id TEXT UNIQUE NOT NULL
             );
             """
         )
 
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_youth_medical_permission_code ON youth_medical(permission_code);")
 
+        # Version counter that tells every worker's group membership index when youth change (see group_index.py)
+        create_cache_version_tables(self.conn)
+
+        # Parent permission codes: one row per code with its household, expiry and rotation (see permission_codes.py).
+        # Codes parents typed in before the server issued them are registered so the allocator skips them.
+        codes_are_new = not self._table_exists("permission_codes")
+        create_permission_code_tables(self.conn)
+        if codes_are_new:
+            backfill_client_codes(self.conn)
+
         # Activities table (matches your create_activity insert pattern)
         self.conn.execute(
             """
@@ -122,7 +190,18 @@ class DBSetup:
             );
             """
         )
-        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_permission_given_activity_id ON permission_given(activity_id);")
+        # One grant per (activity, youth): drop duplicates left by retried requests (keeping the first grant), then
+        # enforce it.  The unique index also serves lookups by activity_id, so the single-column index goes.
+        if not self._index_exists("uq_permission_given_activity_youth"):
+            self.conn.execute(
+                """
+                DELETE FROM permission_given
+                WHERE activity_id IS NOT NULL AND youth_id IS NOT NULL
+                  AND id NOT IN (SELECT MIN(id) FROM permission_given GROUP BY activity_id, youth_id)
+                """
+            )
+            self.conn.execute("CREATE UNIQUE INDEX uq_permission_given_activity_youth ON permission_given(activity_id, youth_id);")
+        self.conn.execute("DROP INDEX IF EXISTS idx_permission_given_activity_id;")
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_permission_given_youth_id ON permission_given(youth_id);")
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_permission_given_permission_code ON permission_given(permission_code);")
 
@@ -141,14 +220,29 @@ class DBSetup:
                 progress_notes TEXT,
                 completed INTEGER DEFAULT 0,
                 created_at TEXT DEFAULT (datetime('now')),
-                updated_at TEXT
-                visibility_level TEXT NOT NULL DEFAULT 'private'
+                updated_at TEXT,
+                visibility_level TEXT NOT NULL DEFAULT 'private',
+                org_group TEXT
             );
             """
         )
+        if self._add_column_if_missing("personal_goals", "org_group", "TEXT"):
+            # Goals written before org_group existed take the group from the youth's record
+            self.conn.execute(
+                """
+                UPDATE personal_goals SET org_group = (
+                    SELECT json_extract(m.youth, '$.org_group') FROM youth_medical m WHERE m.youth_id = personal_goals.youth_id
+                )
+                WHERE org_group IS NULL;
+                """
+            )
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_personal_goals_youth_id ON personal_goals(youth_id);")
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_personal_goals_goal_area ON personal_goals(goal_area);")
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_personal_goals_status ON personal_goals(status);")
+        # Goal dashboard: every visibility rule filters on a prefix of this index (see goal_view.py)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_personal_goals_visibility ON personal_goals(visibility_level, org_group, youth_id, goal_area);"
+        )
 
         # Keep updated_at current on updates (SQLite trigger)
         self.conn.execute(
@@ -174,6 +268,22 @@ class DBSetup:
             """
         )
 
+        # Ids replaced by `python ids.py migrate` (name-based youth ids, uuid4 activity ids) still resolve through here
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS id_aliases (
+                entity TEXT NOT NULL,
+                alias TEXT NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (entity, alias)
+            ) WITHOUT ROWID;
+            """
+        )
+
+        # Grants, approvals and roster changes as they commit, for the live event streams; the triggers that
+        # write it are installed by the event hub (see live_events.py)
+        create_live_event_tables(self.conn)
+
         # ADD AUDIT LOG TABLE
         self.conn.execute(
             """
@@ -196,8 +306,63 @@ class DBSetup:
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_actor ON audit_log(actor_username);")
         self.conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_action ON audit_log(action);")
 
+        self.create_search_index()
+
         self.conn.commit()
 
+    def create_search_index(self):
+        """
+        FTS5 indexes over activities and personal goals.
+        Both are external-content tables: the text lives only in the source table and
+        the triggers below keep the index in step with every insert, update and delete.
+        """
+        fts_tables = {
+            "activities_fts": ("activities", ["activity_name", "description", "location", "thoughts"]),
+            "personal_goals_fts": ("personal_goals", ["goal_name", "goal_description", "progress_notes"]),
+        }
+        for fts_table, (source, columns) in fts_tables.items():
+            is_new = not self._table_exists(fts_table)
+            cols = ", ".join(columns)
+            new_cols = ", ".join(f"new.{c}" for c in columns)
+            old_cols = ", ".join(f"old.{c}" for c in columns)
+            self.conn.execute(
+                f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                    {cols},
+                    content='{source}', content_rowid='id',
+                    tokenize='porter unicode61'
+                );
+                """
+            )
+            self.conn.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_ai AFTER INSERT ON {source}
+                BEGIN
+                    INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END;
+                """
+            )
+            self.conn.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_ad AFTER DELETE ON {source}
+                BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                END;
+                """
+            )
+            self.conn.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_au AFTER UPDATE OF {cols} ON {source}
+                BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                    INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END;
+                """
+            )
+            if is_new:
+                # Index rows that were written before the search index existed
+                self.conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild');")
+
 
     def load_admins(self)->None:
         cursor = self.conn.cursor()
@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+from typing import Any, Iterable
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content to JSON bytes with orjson when installed, falling back to the stdlib encoder"""
+    if HAS_ORJSON:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads(value: str | bytes) -> Any:
+    return orjson.loads(value) if HAS_ORJSON else json.loads(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson.
+    Endpoints that return one directly also skip FastAPI's per-item response model validation,
+    so only return trusted data (rows read from our own tables) this way, decoded by decode_rows with every
+    JSON, bool and datetime column of the declared response model listed so the payload still matches it.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def normalise_datetime(value: str) -> str:
+    """Stored ISO 8601 text in the form pydantic serialises a datetime field ('2026-05-01' -> '2026-05-01T00:00:00')"""
+    text = datetime.fromisoformat(value).isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def decode_rows(
+    rows: Iterable,
+    json_columns: Iterable[str] = (),
+    bool_columns: Iterable[str] = (),
+    datetime_columns: Iterable[str] = (),
+) -> list[dict[str, Any]]:
+    """
+    Convert sqlite3.Row results to plain dicts in one pass, decoding JSON text columns, 0/1 integer flags and
+    datetime text on the way.  Values that are already decoded (or not valid JSON / ISO 8601) are kept as-is.
+    Args:
+        rows (Iterable): Rows returned by cursor.fetchall()
+        json_columns (Iterable[str]): Columns stored as JSON text
+        bool_columns (Iterable[str]): Columns stored as 0/1 integers
+        datetime_columns (Iterable[str]): Columns a response model declares as datetime, stored as ISO 8601 text
+    """
+    json_columns = tuple(json_columns)
+    bool_columns = tuple(bool_columns)
+    datetime_columns = tuple(datetime_columns)
+    # Lists repeat the same dates (a whole ward's activities on a few evenings); parse each text once
+    datetimes: dict[str, str] = {}
+    decoded = []
+    for row in rows:
+        item = dict(row)
+        for column in json_columns:
+            value = item.get(column)
+            if isinstance(value, (str, bytes)):
+                try:
+                    item[column] = loads(value)
+                except ValueError:
+                    pass
+        for column in bool_columns:
+            value = item.get(column)
+            if value is not None:
+                item[column] = bool(value)
+        for column in datetime_columns:
+            value = item.get(column)
+            if isinstance(value, str):
+                normalised = datetimes.get(value)
+                if normalised is None:
+                    try:
+                        normalised = datetimes[value] = normalise_datetime(value)
+                    except ValueError:
+                        continue
+                item[column] = normalised
+        decoded.append(item)
+    return decoded
@@ -0,0 +1,174 @@
+"""
+Field-level encryption for sensitive youth_medical columns.
+
+Values are encrypted with AES-GCM and stored as text:
+
+    enc:<key_id>:<base64(nonce || ciphertext || tag)>
+
+Keys are configured through environment variables:
+
+    FIELD_ENCRYPTION_KEYS        comma separated "key_id:secret" pairs, e.g. "v2:...,v1:..."
+    FIELD_ENCRYPTION_ACTIVE_KEY  key id used for new writes (defaults to the first key listed)
+
+FIELD_ENCRYPTION_KEYS is required unless ENV=test, where a fixed, well-known key "test" is used instead.
+The keys are never derived from SECRET_KEY: the JWT secret and the data key must be rotatable independently.
+Each secret is stretched to a 256-bit key with HKDF exactly once per process.
+
+Rotate keys by adding a new key id in front of the list, restarting, then running:
+
+    python field_crypto.py rotate --db /data/data.sqlite3
+"""
+import argparse
+import base64
+import os
+import sqlite3
+from functools import lru_cache
+from typing import Iterable
+
+try:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+PREFIX = "enc"
+NONCE_BYTES = 12
+HKDF_SALT = b"youth-permission-tracker/field-encryption"
+# Only for ENV=test; anything encrypted with it is readable by anyone with this source
+TEST_SECRET = "test-only-field-encryption-key"
+
+# youth_medical columns that are encrypted at rest
+ENCRYPTED_COLUMNS = ("medical", "emergency_contact")
+
+
+class FieldCipher:
+    """AES-GCM encryption of single column values with versioned key ids"""
+
+    def __init__(self, secrets: dict[str, str], active_key_id: str):
+        if not HAS_CRYPTOGRAPHY:
+            raise ImportError("cryptography is required for field encryption. Install it with: pip install cryptography")
+        if active_key_id not in secrets:
+            raise ValueError(f"Active field encryption key '{active_key_id}' is not configured")
+        self.active_key_id = active_key_id
+        # Derive every key once; AESGCM objects are reusable and thread safe
+        self._ciphers = {key_id: AESGCM(self.derive_key(secret, key_id)) for key_id, secret in secrets.items()}
+
+    @staticmethod
+    def derive_key(secret: str, key_id: str) -> bytes:
+        """Stretch a configured secret into a 256-bit AES key"""
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=HKDF_SALT, info=key_id.encode())
+        return hkdf.derive(secret.encode())
+
+    @classmethod
+    def from_env(cls) -> "FieldCipher":
+        """Build a cipher from FIELD_ENCRYPTION_KEYS / FIELD_ENCRYPTION_ACTIVE_KEY (see module docstring)"""
+        configured = os.getenv("FIELD_ENCRYPTION_KEYS")
+        if configured:
+            secrets = {}
+            for pair in configured.split(","):
+                key_id, _, secret = pair.strip().partition(":")
+                if not key_id or not secret:
+                    raise ValueError("FIELD_ENCRYPTION_KEYS entries must look like 'key_id:secret'")
+                secrets[key_id] = secret
+            active = os.getenv("FIELD_ENCRYPTION_ACTIVE_KEY", next(iter(secrets)))
+        elif os.getenv("ENV", "test").lower() == "test":
+            secrets = {"test": TEST_SECRET}
+            active = "test"
+        else:
+            raise RuntimeError("FIELD_ENCRYPTION_KEYS must be set outside ENV=test (see field_crypto.py)")
+        return cls(secrets, active)
+
+    @staticmethod
+    def is_encrypted(value: str | None) -> bool:
+        return bool(value) and value.startswith(PREFIX + ":")
+
+    @staticmethod
+    def key_id_of(value: str) -> str | None:
+        """Return the key id a stored value was encrypted with (None for legacy plaintext)"""
+        if not FieldCipher.is_encrypted(value):
+            return None
+        return value.split(":", 2)[1]
+
+    def encrypt(self, plaintext: str, column: str) -> str:
+        """
+        Encrypt a value with the active key.
+        Args:
+            plaintext (str): Value to encrypt (the JSON text normally stored in the column)
+            column (str): Column name, bound as associated data so ciphertext cannot be moved between columns
+        """
+        nonce = os.urandom(NONCE_BYTES)
+        sealed = self._ciphers[self.active_key_id].encrypt(nonce, plaintext.encode(), column.encode())
+        return f"{PREFIX}:{self.active_key_id}:{base64.b64encode(nonce + sealed).decode()}"
+
+    def decrypt(self, value: str, column: str) -> str:
+        """Decrypt a stored value.  Legacy plaintext values are returned unchanged."""
+        if not self.is_encrypted(value):
+            return value
+        _, key_id, payload = value.split(":", 2)
+        cipher = self._ciphers.get(key_id)
+        if cipher is None:
+            raise ValueError(f"No field encryption key configured for key id '{key_id}'")
+        raw = base64.b64decode(payload)
+        return cipher.decrypt(raw[:NONCE_BYTES], raw[NONCE_BYTES:], column.encode()).decode()
+
+    def decrypt_many(self, values: Iterable[str], column: str) -> list[str]:
+        """Decrypt a batch of values from the same column (e.g. every participant of an activity)"""
+        decrypt = self.decrypt
+        return [decrypt(value, column) for value in values]
+
+    def needs_rotation(self, value: str | None) -> bool:
+        """True for plaintext values and values sealed with a key other than the active one"""
+        return bool(value) and self.key_id_of(value) != self.active_key_id
+
+    def rotate_table(self, conn, batch_size: int = 200) -> int:
+        """
+        Re-encrypt every youth_medical value that is plaintext or uses an old key.
+        Work is committed in small batches so writers are never blocked for long.
+        Returns:
+            Number of rows rewritten
+        """
+        rewritten = 0
+        last_id = ""
+        columns = ", ".join(ENCRYPTED_COLUMNS)
+        while True:
+            rows = conn.execute(
+                f"SELECT youth_id, {columns} FROM youth_medical WHERE youth_id > ? ORDER BY youth_id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                return rewritten
+            updates = []
+            for row in rows:
+                values = dict(zip(ENCRYPTED_COLUMNS, row[1:]))
+                if any(self.needs_rotation(v) for v in values.values()):
+                    sealed = [self.encrypt(self.decrypt(values[c], c), c) if values[c] else values[c] for c in ENCRYPTED_COLUMNS]
+                    updates.append((*sealed, row[0]))
+            if updates:
+                assignments = ", ".join(f"{c} = ?" for c in ENCRYPTED_COLUMNS)
+                conn.executemany(f"UPDATE youth_medical SET {assignments} WHERE youth_id = ?", updates)
+                conn.commit()
+                rewritten += len(updates)
+            last_id = rows[-1][0]
+
+
+@lru_cache(maxsize=1)
+def get_cipher() -> FieldCipher:
+    """Process-wide cipher; keys are derived on first use and cached afterwards"""
+    return FieldCipher.from_env()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Field encryption maintenance")
+    parser.add_argument("command", choices=["rotate"], help="rotate: re-encrypt plaintext or old-key values with the active key")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "/data/data.sqlite3"), help="Path to the SQLite database")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    try:
+        count = get_cipher().rotate_table(connection, batch_size=args.batch_size)
+        print(f"Re-encrypted {count} youth_medical rows with key '{get_cipher().active_key_id}'")
+    finally:
+        connection.close()
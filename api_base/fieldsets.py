@@ -0,0 +1,56 @@
+from typing import Iterable
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+
+class FieldSet:
+    """
+    The `fields=` names one read endpoint accepts, each mapped to the column that holds it.
+
+    parse() turns the query parameter into a validated tuple of names, select() into the SQL projection, so only
+    the requested columns are read and decoded (a youth's signature and encrypted medical JSON stay on disk
+    when the caller wants a name), and model() into a copy of the response model with just those fields.
+    """
+
+    def __init__(self, model: type[BaseModel], columns: Iterable[str], always: Iterable[str] = ()):
+        """
+        Args:
+            model (type[BaseModel]): Full response model; trimmed copies keep its field types and defaults
+            columns (Iterable[str]): Selectable fields, named like their columns, in response order
+            always (Iterable[str]): Fields returned whatever is asked for (the row's id)
+        """
+        self.full_model = model
+        self.columns = tuple(columns)
+        self.always = tuple(always)
+        self._allowed = frozenset(self.columns)
+        self._models: dict[tuple[str, ...], type[BaseModel]] = {}
+
+    def parse(self, fields: str | None) -> tuple[str, ...]:
+        """Requested fields in column order, plus `always`; every field when `fields` is empty"""
+        if not fields:
+            return self.columns
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - self._allowed
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(self.columns)}",
+            )
+        requested.update(self.always)
+        return tuple(column for column in self.columns if column in requested)
+
+    def select(self, fields: tuple[str, ...]) -> str:
+        return ", ".join(fields)
+
+    def model(self, fields: tuple[str, ...]) -> type[BaseModel]:
+        """The response model restricted to `fields` (cached per combination)"""
+        model = self._models.get(fields)
+        if model is None:
+            source = self.full_model.model_fields
+            model = create_model(
+                f"{self.full_model.__name__}Fields",
+                **{name: (source[name].annotation, source[name]) for name in fields if name in source},
+            )
+            self._models[fields] = model
+        return model
@@ -0,0 +1,111 @@
+from typing import Any
+from fast_json import decode_rows
+
+# Roles that see goals across every group in the ward
+BISHOPRIC_ROLES = {"all", "admin", "bishop", "ecc_admin"}
+# Roles that see the goals of their own group
+LEADER_ROLES = {"advisor", "president"}
+
+# Visibility levels each audience may see.  A youth sees their own goals at every level,
+# plus 'group' goals of their own group and 'everyone' goals.
+VISIBLE_LEVELS = {
+    "parent": ("parents", "group", "group_leaders", "bishopric", "everyone"),
+    "leader": ("group", "group_leaders", "bishopric", "everyone"),
+    "bishopric": ("group", "group_leaders", "bishopric", "everyone"),
+}
+
+GOAL_COLUMNS = (
+    "g.org_group, g.youth_id, g.goal_area, g.goal_name, g.goal_description, g.target_date, "
+    "g.status, g.progress_notes, g.completed, g.visibility_level"
+)
+
+
+def _in_list(values: tuple) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def visibility_clause(user: dict, alias: str = "g") -> tuple[str, list[Any]]:
+    """
+    Build the WHERE fragment (and its parameters) that limits personal goals to those the caller may see.
+    Every branch filters on a prefix of idx_personal_goals_visibility or on youth_id.
+    Args:
+        user (dict): Decoded JWT payload of the caller
+        alias (str): Alias of the personal_goals table in the surrounding query
+    Returns:
+        Tuple of the SQL fragment and the list of parameters it binds
+    """
+    role = user.get("role")
+    group = user.get("org_group")
+
+    if role in BISHOPRIC_ROLES or group in ("admin", "ecc_admin"):
+        levels = VISIBLE_LEVELS["bishopric"]
+        return f"{alias}.visibility_level IN ({_in_list(levels)})", list(levels)
+
+    if role in LEADER_ROLES:
+        levels = VISIBLE_LEVELS["leader"]
+        return f"({alias}.visibility_level IN ({_in_list(levels)}) AND {alias}.org_group = ?)", [*levels, group]
+
+    if role == "youth":
+        # The account's own youth_medical row; an account that is not linked to one has no own goals
+        return (
+            f"({alias}.youth_id = (SELECT youth_id FROM admin_users WHERE username = ? AND role = 'youth') "
+            f"OR {alias}.visibility_level = 'everyone' "
+            f"OR ({alias}.visibility_level = 'group' AND {alias}.org_group = ?))",
+            [user.get("sub"), group],
+        )
+
+    if role == "parent":
+        # Every youth registered under one of the household's codes, so rotated codes keep working
+        levels = VISIBLE_LEVELS["parent"]
+        return (
+            f"({alias}.visibility_level IN ({_in_list(levels)}) AND {alias}.youth_id IN ("
+            "SELECT m.youth_id FROM admin_users u "
+            "JOIN permission_codes c ON c.household_id = u.household_id "
+            "JOIN youth_medical m ON m.permission_code = c.code "
+            "WHERE u.username = ? AND u.role = 'parent'))",
+            [*levels, user.get("sub")],
+        )
+
+    # Unknown roles see nothing
+    return "0", []
+
+
+class GoalViewQuery:
+    """Goal dashboard query: every visibility rule is applied in SQL, never after the fetch"""
+
+    def __init__(self, db_connection):
+        self.conn = db_connection
+
+    def fetch(self, user: dict, org_group: str | None = None, goal_area: str | None = None) -> list:
+        """
+        Return the goals visible to the caller, ordered group -> youth -> goal area.
+        Args:
+            user (dict): Decoded JWT payload of the caller
+            org_group (str | None): Optional narrowing to one group
+            goal_area (str | None): Optional narrowing to one goal area
+        """
+        where, params = visibility_clause(user)
+        if org_group:
+            where += " AND g.org_group = ?"
+            params.append(org_group)
+        if goal_area:
+            where += " AND g.goal_area = ?"
+            params.append(goal_area)
+        cursor = self.conn.execute(
+            f"SELECT {GOAL_COLUMNS} FROM personal_goals g WHERE {where} "
+            "ORDER BY g.org_group, g.youth_id, g.goal_area, g.target_date",
+            params,
+        )
+        return cursor.fetchall()
+
+    def grouped(self, user: dict, org_group: str | None = None, goal_area: str | None = None) -> dict[str, dict[str, dict[str, list[dict]]]]:
+        """
+        Nest the visible goals as {org_group: {youth_id: {goal_area: [goal, ...]}}} in a single pass.
+        Rows arrive already sorted, so every level is filled in order.
+        """
+        view: dict[str, dict[str, dict[str, list[dict]]]] = {}
+        rows = self.fetch(user, org_group=org_group, goal_area=goal_area)
+        for goal in decode_rows(rows, json_columns=("progress_notes",), bool_columns=("completed",), datetime_columns=("target_date",)):
+            group_key = goal["org_group"] or "unassigned"
+            view.setdefault(group_key, {}).setdefault(goal["youth_id"], {}).setdefault(goal["goal_area"], []).append(goal)
+        return view
@@ -0,0 +1,101 @@
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterable
+
+# cache_versions row bumped by the youth_medical triggers below whenever group membership can change
+YOUTH_GROUPS_VERSION = "youth_groups"
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """
+    cache_versions holds one counter per in-process cache.  Triggers bump the youth_groups counter on every
+    insert and delete and on updates that change a youth's id or org_group, so each worker can tell its copy is
+    stale with a single primary-key read, whichever worker (or CLI) made the change.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO cache_versions (name, version) VALUES (?, 0);", (YOUTH_GROUPS_VERSION,))
+    bump = f"UPDATE cache_versions SET version = version + 1 WHERE name = '{YOUTH_GROUPS_VERSION}';"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_youth_groups_version_ai AFTER INSERT ON youth_medical BEGIN {bump} END;")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_youth_groups_version_ad AFTER DELETE ON youth_medical BEGIN {bump} END;")
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_youth_groups_version_au AFTER UPDATE OF youth_id, youth ON youth_medical
+        WHEN OLD.youth_id IS NOT NEW.youth_id
+          OR json_extract(OLD.youth, '$.org_group') IS NOT json_extract(NEW.youth, '$.org_group')
+        BEGIN {bump} END;
+        """
+    )
+
+
+@dataclass
+class _Snapshot:
+    version: int | None = None
+    groups: dict[str, tuple[str, ...]] = field(default_factory=dict)
+
+
+class GroupMembershipIndex:
+    """
+    In-process org_group -> youth_id index, one snapshot per database (`key`: a shard's unit, or "default").
+
+    A snapshot is loaded on first use with one scan of youth_medical and reused for as long as the database's
+    youth_groups version is unchanged, so resolving the roster of a multi-group activity costs one primary-key
+    read plus dictionary lookups.  invalidate() drops this worker's snapshot right after its own youth writes;
+    the version counter covers writes made by other workers.
+    """
+
+    def __init__(self):
+        self._snapshots: dict[str, _Snapshot] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _version(self, conn: sqlite3.Connection) -> int | None:
+        row = conn.execute("SELECT version FROM cache_versions WHERE name = ?", (YOUTH_GROUPS_VERSION,)).fetchone()
+        return row[0] if row else None
+
+    def _load(self, conn: sqlite3.Connection, version: int | None) -> _Snapshot:
+        groups: dict[str, list[str]] = {}
+        for youth_id, group in conn.execute("SELECT youth_id, json_extract(youth, '$.org_group') FROM youth_medical ORDER BY youth_id"):
+            if group is not None:
+                groups.setdefault(group, []).append(youth_id)
+        self.loads += 1
+        return _Snapshot(version, {group: tuple(ids) for group, ids in groups.items()})
+
+    def snapshot(self, conn: sqlite3.Connection, key: str = "default") -> dict[str, tuple[str, ...]]:
+        version = self._version(conn)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None or version is None or snapshot.version != version:
+            with self._lock:
+                snapshot = self._snapshots.get(key)
+                if snapshot is None or version is None or snapshot.version != version:
+                    snapshot = self._load(conn, version)
+                    # Without a version row (schema not migrated yet) nothing can tell us it is stale
+                    if version is not None:
+                        self._snapshots[key] = snapshot
+        return snapshot.groups
+
+    def participants(self, conn: sqlite3.Connection, groups: Iterable[str], key: str = "default") -> list[str]:
+        """youth_ids of every youth in any of `groups`, each once, in group order"""
+        index = self.snapshot(conn, key)
+        return list(dict.fromkeys(youth_id for group in groups for youth_id in index.get(group, ())))
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Forget the snapshot of one database (or all of them) after a youth write in this worker"""
+        with self._lock:
+            if key is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(key, None)
+
+
+@lru_cache(maxsize=1)
+def get_group_index() -> GroupMembershipIndex:
+    return GroupMembershipIndex()
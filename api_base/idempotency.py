@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path as PathlibPath
+from typing import Any
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# Responses larger than this are not stored; the key is released and a retry runs again
+MAX_STORED_BODY = 64 * 1024
+# A claim still unfinished after this long belongs to a worker that died; a retry may take it over
+ABANDONED_AFTER = 300
+
+# POST endpoints whose retries must not write twice
+IDEMPOTENT_PATHS = frozenset({
+    "/users",
+    "/activity-permissions",
+    "/activity-permissions/batch",
+    "/interest-survey",
+    "/group-concerns",
+})
+
+
+class IdempotencyStore:
+    """
+    Idempotency keys and the responses they produced, in a small SQLite file shared by all workers.
+    A key is claimed (status NULL) before the request runs and completed with the response afterwards;
+    rows older than `ttl` seconds are purged a few at a time as new keys are claimed.
+    """
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, busy_timeout: float = 2.0):
+        self.path = path
+        self.ttl = ttl
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._claims = 0
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                request_hash BLOB NOT NULL,
+                status INTEGER,
+                content_type TEXT,
+                body BLOB,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (scope, key)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys(created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread: lookups are primary-key reads that take microseconds
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            PathlibPath(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous = NORMAL")
+            # Created on first use rather than at import, when the data directory may not exist yet
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    def claim(self, scope: str, key: str, request_hash: bytes) -> tuple[str, Any]:
+        """
+        Returns ("claimed", None) when the caller should run the request, ("replay", (status, content_type, body))
+        for a completed key with the same request, ("in_progress", None) while the first request still runs,
+        or ("mismatch", None) when the key was used for a different request.
+        """
+        conn = self._connect()
+        now = time.time()
+        cur = conn.execute(
+            "INSERT INTO idempotency_keys (scope, key, request_hash, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (scope, key) DO UPDATE SET request_hash = excluded.request_hash, status = NULL, "
+            "content_type = NULL, body = NULL, created_at = excluded.created_at "
+            "WHERE idempotency_keys.created_at < ? OR (idempotency_keys.status IS NULL AND idempotency_keys.created_at < ?)",
+            (scope, key, request_hash, now, now - self.ttl, now - ABANDONED_AFTER),
+        )
+        if cur.rowcount:
+            self._claims += 1
+            if self._claims % 100 == 0:
+                self.purge()
+            return "claimed", None
+        row = conn.execute(
+            "SELECT request_hash, status, content_type, body FROM idempotency_keys WHERE scope = ? AND key = ?", (scope, key)
+        ).fetchone()
+        if row is None:
+            # Released between the insert and the read; let the caller retry the claim
+            return self.claim(scope, key, request_hash)
+        if row[0] != request_hash:
+            return "mismatch", None
+        if row[1] is None:
+            return "in_progress", None
+        return "replay", (row[1], row[2], row[3])
+
+    def complete(self, scope: str, key: str, status: int, content_type: str | None, body: bytes) -> None:
+        self._connect().execute(
+            "UPDATE idempotency_keys SET status = ?, content_type = ?, body = ? WHERE scope = ? AND key = ?",
+            (status, content_type, body, scope, key),
+        )
+
+    def release(self, scope: str, key: str) -> None:
+        """Forget a key whose request failed, so the client's retry runs it again"""
+        self._connect().execute("DELETE FROM idempotency_keys WHERE scope = ? AND key = ?", (scope, key))
+
+    def purge(self, limit: int = 1000) -> int:
+        cur = self._connect().execute(
+            "DELETE FROM idempotency_keys WHERE (scope, key) IN "
+            "(SELECT scope, key FROM idempotency_keys WHERE created_at < ? ORDER BY created_at LIMIT ?)",
+            (time.time() - self.ttl, limit),
+        )
+        return cur.rowcount
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware implementing the Idempotency-Key request header for IDEMPOTENT_PATHS.
+
+    The first request with a key runs normally and its response (status < 500) is stored.  A retry with the same
+    key and the same body gets the stored response back, with `Idempotent-Replayed: true`, without running the
+    endpoint again.  A retry while the first request is still running gets 409; reusing a key for a different
+    body gets 422.  Keys are scoped per path and caller (Authorization header), and expire after the store's TTL.
+    """
+
+    def __init__(self, app, store: IdempotencyStore, paths: frozenset[str] = IDEMPOTENT_PATHS):
+        self.app = app
+        self.store = store
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(HEADER, b"").decode("latin-1").strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, {"detail": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"})
+            return
+
+        # Buffer the body so it can be hashed, then hand it to the endpoint unchanged
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        caller = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()[:16]
+        key_scope = f"{scope['path']} {caller}"
+        request_hash = hashlib.sha256(body).digest()
+
+        outcome, stored = self.store.claim(key_scope, key, request_hash)
+        if outcome == "replay":
+            status, content_type, stored_body = stored
+            await _send_raw(send, status, content_type, stored_body, [(b"idempotent-replayed", b"true")])
+            return
+        if outcome == "in_progress":
+            await _send_json(send, 409, {"detail": "A request with this Idempotency-Key is still being processed"})
+            return
+        if outcome == "mismatch":
+            await _send_json(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status, content_type, response_body, too_large = 500, None, [], False
+
+        async def capture_send(message):
+            nonlocal status, content_type, too_large
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode("latin-1") or None
+            elif message["type"] == "http.response.body" and not too_large:
+                response_body.append(message.get("body", b""))
+                too_large = sum(len(part) for part in response_body) > MAX_STORED_BODY
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except Exception:
+            self.store.release(key_scope, key)
+            raise
+        if status >= 500 or too_large:
+            self.store.release(key_scope, key)
+        else:
+            self.store.complete(key_scope, key, status, content_type, b"".join(response_body))
+
+
+async def _send_raw(send, status: int, content_type: str | None, body: bytes, extra_headers: list | None = None) -> None:
+    headers = [(b"content-length", str(len(body)).encode())] + (extra_headers or [])
+    if content_type:
+        headers.append((b"content-type", content_type.encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status: int, payload: dict) -> None:
+    await _send_raw(send, status, "application/json", json.dumps(payload).encode())
+
+
+def idempotency_settings_from_env(db_path: str) -> dict[str, Any] | None:
+    """
+    IDEMPOTENCY_DB_PATH (default <DB_PATH stem>.idempotency.sqlite3) and IDEMPOTENCY_TTL_HOURS (default 24);
+    IDEMPOTENCY=0 turns Idempotency-Key handling off.
+    """
+    if os.getenv("IDEMPOTENCY", "1").lower() in ("0", "false", "no"):
+        return None
+    path = PathlibPath(db_path)
+    return {
+        "path": os.getenv("IDEMPOTENCY_DB_PATH") or str(path.with_name(f"{path.stem}.idempotency{path.suffix}")),
+        "ttl": float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")) * 3600,
+    }
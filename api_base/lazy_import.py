@@ -0,0 +1,32 @@
+import importlib
+import sys
+from types import ModuleType
+from typing import Any
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+    Used for optional subsystems (QR codes, calendar invites, SMS) that most requests never touch,
+    so workers do not pay for them at startup.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: ModuleType | None = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        """True once the module has been imported (by this proxy or anywhere else)"""
+        return self._module is not None or self._name in sys.modules
+
+    def __repr__(self) -> str:
+        return f"<LazyModule {self._name!r} {'loaded' if self.loaded else 'not loaded'}>"
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger("live_events")
+
+# Events older than this many rows behind the newest are pruned from live_events
+KEEP_EVENTS = 100_000
+
+
+# Triggers feeding live_events; they exist only while event streams are on
+TRIGGERS = (
+    "trg_live_events_permission",
+    "trg_live_events_approval",
+    "trg_live_events_roster",
+    "trg_live_events_youth_added",
+    "trg_live_events_youth_removed",
+    "trg_live_events_youth_moved",
+)
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """
+    live_events is an append-only log written by triggers, inside the transaction that makes the change, so an
+    event exists exactly when its change has committed - whichever worker, CLI or import made it.  The
+    AUTOINCREMENT id is the SSE event id: it never goes backwards, even after old rows are pruned, so a
+    client can resume from Last-Event-ID on any worker.
+
+    Schema setup creates the table without its triggers: EventHub.start() installs them, so a database nobody
+    streams from (LIVE_EVENTS=0, shards) never collects events that nothing would prune.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS live_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts TEXT NOT NULL DEFAULT (datetime('now')),
+            kind TEXT NOT NULL,
+            activity_id TEXT,
+            org_groups TEXT,      -- JSON array of the groups the event concerns
+            data TEXT NOT NULL    -- JSON, ids only: no names or medical details
+        );
+        """
+    )
+    for name in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def install_triggers(conn: sqlite3.Connection) -> None:
+    """Start recording grants, approvals and roster changes into live_events"""
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_live_events_permission AFTER INSERT ON permission_given
+        BEGIN
+            INSERT INTO live_events (kind, activity_id, org_groups, data)
+            SELECT 'permission_granted', NEW.activity_id,
+                   json_array(json_extract(m.youth, '$.org_group')),
+                   json_object('youth_id', NEW.youth_id, 'activity_id', NEW.activity_id)
+            FROM (SELECT NULL) LEFT JOIN youth_medical m ON m.youth_id = NEW.youth_id;
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_live_events_approval AFTER UPDATE OF bishop_approval, stake_approval ON activities
+        WHEN OLD.bishop_approval IS NOT NEW.bishop_approval OR OLD.stake_approval IS NOT NEW.stake_approval
+        BEGIN
+            INSERT INTO live_events (kind, activity_id, org_groups, data)
+            VALUES ('approval', NEW.activity_id, NEW.groups, json_object(
+                'activity_id', NEW.activity_id,
+                'bishop_approval', NEW.bishop_approval, 'bishop_approval_date', NEW.bishop_approval_date,
+                'stake_approval', NEW.stake_approval, 'stake_approval_date', NEW.stake_approval_date));
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_live_events_roster AFTER UPDATE OF participants_youth_ids ON activities
+        WHEN OLD.participants_youth_ids IS NOT NEW.participants_youth_ids
+        BEGIN
+            INSERT INTO live_events (kind, activity_id, org_groups, data)
+            VALUES ('roster_changed', NEW.activity_id, NEW.groups, json_object(
+                'activity_id', NEW.activity_id, 'participants_youth_ids', json(NEW.participants_youth_ids)));
+        END;
+        """
+    )
+    for event, row, when in (
+        ("youth_added", "NEW", "INSERT"),
+        ("youth_removed", "OLD", "DELETE"),
+    ):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_live_events_{event} AFTER {when} ON youth_medical
+            BEGIN
+                INSERT INTO live_events (kind, org_groups, data)
+                VALUES ('{event}', json_array(json_extract({row}.youth, '$.org_group')), json_object('youth_id', {row}.youth_id));
+            END;
+            """
+        )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_live_events_youth_moved AFTER UPDATE OF youth ON youth_medical
+        WHEN json_extract(OLD.youth, '$.org_group') IS NOT json_extract(NEW.youth, '$.org_group')
+        BEGIN
+            INSERT INTO live_events (kind, org_groups, data)
+            VALUES ('youth_moved', json_array(json_extract(OLD.youth, '$.org_group'), json_extract(NEW.youth, '$.org_group')),
+                    json_object('youth_id', NEW.youth_id, 'from', json_extract(OLD.youth, '$.org_group'),
+                                'to', json_extract(NEW.youth, '$.org_group')));
+        END;
+        """
+    )
+
+
+def disable_live_events(db_path: str) -> None:
+    """Drop the triggers and the events they left behind, for a database whose streams are turned off"""
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    try:
+        with conn:
+            for name in TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.execute("DELETE FROM live_events")
+    finally:
+        conn.close()
+
+
+@dataclass(frozen=True)
+class LiveEvent:
+    id: int
+    kind: str
+    activity_id: str | None
+    org_groups: tuple[str, ...]
+    data: str
+
+    def matches(self, activity_id: str | None, group: str | None) -> bool:
+        if activity_id is not None:
+            return self.activity_id == activity_id
+        return group in self.org_groups
+
+    def encode(self) -> bytes:
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {self.data}\n\n".encode()
+
+    @classmethod
+    def from_row(cls, row: Any) -> "LiveEvent":
+        try:
+            groups = tuple(g for g in json.loads(row[3]) if isinstance(g, str)) if row[3] else ()
+        except ValueError:
+            groups = ()
+        return cls(row[0], row[1], row[2], groups, row[4])
+
+
+class Subscription:
+    """One open stream: a bounded queue fed from the hub's thread; overflowing it ends the stream"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, activity_id: str | None, group: str | None, size: int):
+        self.loop = loop
+        self.activity_id = activity_id
+        self.group = group
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def offer(self, event: LiveEvent) -> None:
+        """Runs on the event loop"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind reconnects with Last-Event-ID and catches up from the log instead
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventHub:
+    """
+    In-process publish/subscribe for live_events.
+
+    One thread per worker tails the live_events table (an indexed range read every `poll_interval` seconds, or
+    immediately after notify()) and fans each new event out to the matching subscribers' bounded queues.  The
+    last `buffer_size` events stay in a ring buffer so reconnecting clients resume from Last-Event-ID without a
+    query; older positions are read back from the table.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        poll_interval: float = 0.5,
+        heartbeat: float = 15.0,
+        buffer_size: int = 1000,
+        queue_size: int = 256,
+    ):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self._buffer: deque[LiveEvent] = deque(maxlen=buffer_size)
+        self._subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._conn: sqlite3.Connection | None = None
+        self.last_id = 0
+        self.events_delivered = 0
+        self.overflows = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        return self._conn
+
+    def start(self) -> None:
+        """Install the triggers and begin at the current end of the log; every worker runs its own tail"""
+        conn = self._connection()
+        with conn:
+            install_triggers(conn)
+        row = conn.execute("SELECT MAX(id) FROM live_events").fetchone()
+        self.last_id = row[0] or 0
+        self._thread = threading.Thread(target=self._run, name="live-events", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def notify(self) -> None:
+        """Poll now instead of at the next interval (called after this worker commits a change)"""
+        self._wake.set()
+
+    def _run(self) -> None:
+        polls = 0
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.poll()
+                polls += 1
+                if polls % 1000 == 0:
+                    self.prune()
+            except Exception:
+                logger.exception("live_events: poll failed")
+
+    def poll(self) -> int:
+        rows = self._connection().execute(
+            "SELECT id, kind, activity_id, org_groups, data FROM live_events WHERE id > ? ORDER BY id LIMIT 1000", (self.last_id,)
+        ).fetchall()
+        if not rows:
+            return 0
+        events = [LiveEvent.from_row(row) for row in rows]
+        with self._lock:
+            self._buffer.extend(events)
+            self.last_id = events[-1].id
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            matching = [e for e in events if e.matches(subscription.activity_id, subscription.group)]
+            if matching:
+                subscription.loop.call_soon_threadsafe(self._deliver, subscription, matching)
+        return len(events)
+
+    def _deliver(self, subscription: Subscription, events: list[LiveEvent]) -> None:
+        for event in events:
+            subscription.offer(event)
+        self.events_delivered += len(events)
+        if subscription.overflowed:
+            self.overflows += 1
+
+    def prune(self) -> None:
+        conn = self._connection()
+        conn.execute("DELETE FROM live_events WHERE id < (SELECT MAX(id) FROM live_events) - ?", (KEEP_EVENTS,))
+        conn.commit()
+
+    def _backlog(self, after_id: int, activity_id: str | None, group: str | None) -> list[LiveEvent]:
+        """Events after `after_id` up to what the tail has already published, from the buffer or the table"""
+        with self._lock:
+            buffered = list(self._buffer)
+            upto = self.last_id
+        if buffered and buffered[0].id <= after_id + 1:
+            events = [e for e in buffered if e.id > after_id]
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            try:
+                rows = conn.execute(
+                    "SELECT id, kind, activity_id, org_groups, data FROM live_events WHERE id > ? AND id <= ? ORDER BY id LIMIT 10000",
+                    (after_id, upto),
+                ).fetchall()
+            finally:
+                conn.close()
+            events = [LiveEvent.from_row(row) for row in rows]
+        return [e for e in events if e.id <= upto and e.matches(activity_id, group)]
+
+    async def stream(self, activity_id: str | None = None, group: str | None = None, last_event_id: int | None = None) -> AsyncIterator[bytes]:
+        """
+        SSE body for one activity or one group: missed events after `last_event_id`, then live events, with a
+        comment line every `heartbeat` seconds so proxies keep the connection open and dead clients are noticed.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), activity_id, group, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            start_id = self.last_id
+        try:
+            # Tell EventSource how long to wait before reconnecting, and where the live stream starts
+            yield f"retry: 3000\nid: {last_event_id if last_event_id is not None else start_id}\n\n".encode()
+            sent = last_event_id if last_event_id is not None else start_id
+            if last_event_id is not None:
+                # Older ids may need a table read of up to 10000 rows: keep it off the event loop
+                for event in await run_in_threadpool(self._backlog, last_event_id, activity_id, group):
+                    yield event.encode()
+                    sent = event.id
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield f": heartbeat {int(time.time())}\n\n".encode()
+                    continue
+                if event is None:
+                    yield b"event: overflow\ndata: {}\n\n"
+                    return
+                if event.id > sent:
+                    yield event.encode()
+                    sent = event.id
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscription)
+
+    def metric_lines(self) -> list[str]:
+        return [
+            "# HELP live_event_subscribers Open live event streams in this worker.",
+            "# TYPE live_event_subscribers gauge",
+            f"live_event_subscribers {len(self._subscribers)}",
+            "# HELP live_events_delivered_total Events queued to live event streams by this worker.",
+            "# TYPE live_events_delivered_total counter",
+            f"live_events_delivered_total {self.events_delivered}",
+            "# HELP live_event_overflows_total Streams closed because the client fell too far behind.",
+            "# TYPE live_event_overflows_total counter",
+            f"live_event_overflows_total {self.overflows}",
+        ]
+
+
+def live_events_settings_from_env() -> dict[str, Any] | None:
+    """
+    LIVE_EVENTS_POLL_INTERVAL (default 0.5 s), LIVE_EVENTS_HEARTBEAT (default 15 s) and
+    LIVE_EVENTS_QUEUE (events buffered per stream, default 256); LIVE_EVENTS=0 turns the streams off.
+    """
+    if os.getenv("LIVE_EVENTS", "1").lower() in ("0", "false", "no"):
+        return None
+    return {
+        "poll_interval": float(os.getenv("LIVE_EVENTS_POLL_INTERVAL", "0.5")),
+        "heartbeat": float(os.getenv("LIVE_EVENTS_HEARTBEAT", "15")),
+        "queue_size": int(os.getenv("LIVE_EVENTS_QUEUE", "256")),
+    }
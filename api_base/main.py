@@ -1,30 +1,91 @@
-from typing import Dict, List, Union, Optional, Any
+from typing import Annotated, Dict, List, Literal, Union, Optional, Any
 from fastapi import FastAPI, Path
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Query, Response
 from fastapi import Request
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
+from tempfile import SpooledTemporaryFile
 from fastapi.params import Depends
 from fastapi import HTTPException, status, Depends as fastapiDepends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-import qrcode
 from pathlib import Path as PathlibPath
-from schema import ActivityApprovals, ActivityBase, ActivityHealthReport, ActivityInvitees, AdminUser, ConcernSurvey, FullActivity, InterestSurvey, PermissionGiven, PersonalGoal, ReturnGroupActivityList, UserReturnModel, YouthPermissionSubmission, Activity, ParentGuardian, MedicalInfo, EmergencyContact, Signature
+from schema import BatchRequest, PermissionBatchGrant, PermissionCodeIssue, PermissionBatchResult, ActivityApprovals, ActivityBase, ActivityHealthReport, ActivityInvitees, AdminUser, ConcernSurvey, FullActivity, InterestSurvey, PermissionGiven, PersonalGoal, ReturnGroupActivityList, SearchResult, UserReturnModel, YouthPermissionSubmission, Activity, MedicalInfo, EmergencyContact
 import sqlite3
 import os
 import json
-from icalendar import Calendar, Event, vCalAddress, vText
 from datetime import datetime, timedelta, timezone
 import uuid
+from ids import new_id, resolve_id
+from dataclasses import replace
 from contact_engine import ContactEngine
 from jose import jwt, JWTError
 from db import DatabaseEngine
-
-app = FastAPI()
+from shards import STAKE_ROLES, ShardedDatabaseEngine
+from backup import BackupManager, backup_settings_from_env
+from checkpoint import WalCheckpointer, checkpoint_settings_from_env
+from retention import ArchiveQuery, RetentionEngine, archive_path_from_env, retention_settings_from_env
+from permission_codes import code_state, code_ttl_days_from_env, expiry_from_ttl, household_key, register_client_code
+from roster_import import RosterImporter, format_from_name, read_records
+from search import SearchEngine
+from goal_view import GoalViewQuery
+from group_index import get_group_index
+from fieldsets import FieldSet
+from live_events import EventHub, disable_live_events, live_events_settings_from_env
+from batch import BatchRouter
+from field_crypto import get_cipher
+from blob_store import get_blob_store, sniff_media_type, store_signature, decode_base64_image
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from fast_json import FastJSONResponse, decode_rows
+from traffic_capture import TrafficCaptureMiddleware, capture_path_from_env
+from idempotency import IdempotencyMiddleware, IdempotencyStore, idempotency_settings_from_env
+from lazy_import import LazyModule
+from dotenv import load_dotenv
+from compression import CompressionMiddleware, compression_settings_from_env
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, get_metrics
+from profiler import QueryProfileMiddleware, get_profile_report, profile_settings_from_env
+
+# Environment from .env must be in place before any settings below are read
+load_dotenv()
+
+# Optional subsystems, imported on first use to keep worker startup fast
+qrcode = LazyModule("qrcode")
+icalendar = LazyModule("icalendar")
+
+app = FastAPI(default_response_class=FastJSONResponse)
 contact_engine = ContactEngine()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
-
-# Allow CORS from any origin (use caution in production)
+# EventSource cannot send an Authorization header, so event streams also accept ?token=
+stream_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token", auto_error=False)
+
+# Optional sanitized request traces for load-test replay (see benchmarks/replay.py)
+TRAFFIC_CAPTURE_PATH = capture_path_from_env()
+if TRAFFIC_CAPTURE_PATH:
+    app.add_middleware(TrafficCaptureMiddleware, path=TRAFFIC_CAPTURE_PATH)
+
+# Idempotency-Key support for permission, registration and survey submissions (see idempotency.py)
+IDEMPOTENCY_SETTINGS = idempotency_settings_from_env(os.getenv("DB_PATH", "/data/data.sqlite3"))
+if IDEMPOTENCY_SETTINGS:
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(**IDEMPOTENCY_SETTINGS))
+
+# Opt-in SQL profiling and N+1 detection (QUERY_PROFILE=1); runs inside the metrics middleware
+QUERY_PROFILE_SETTINGS = profile_settings_from_env()
+if QUERY_PROFILE_SETTINGS:
+    app.add_middleware(QueryProfileMiddleware, report=get_profile_report(), **QUERY_PROFILE_SETTINGS)
+
+# gzip/brotli for JSON, calendar and other text responses, each distinct body compressed once (see compression.py)
+COMPRESSION_SETTINGS = compression_settings_from_env()
+if COMPRESSION_SETTINGS:
+    app.add_middleware(CompressionMiddleware, **COMPRESSION_SETTINGS)
+    if COMPRESSION_SETTINGS["cache"] is not None:
+        get_metrics().register_collector(COMPRESSION_SETTINGS["cache"].metric_lines)
+
+# Per-route latency, status and DB usage, scraped from /metrics
+app.add_middleware(MetricsMiddleware)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Allow CORS from any origin (use caution in production).  Added last so it is the outermost middleware and also
+# covers responses the middlewares above produce themselves (idempotent replays, 409/422)
 app.add_middleware( 
 	CORSMiddleware,
 	allow_origins=["*"],
@@ -38,22 +99,84 @@ SECRET_KEY = os.getenv("SECRET_KEY", "super-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-DB = DatabaseEngine(DB_PATH)
+# SHARD_ROOT switches to one database per org unit (see shards.py); otherwise everything lives in DB_PATH
+SHARD_ROOT = os.getenv("SHARD_ROOT")
+if SHARD_ROOT:
+    DB = ShardedDatabaseEngine(
+        SHARD_ROOT,
+        claims_from_token=lambda token: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+        pool_size=int(os.getenv("SHARD_POOL_SIZE", "8")),
+        default_unit=os.getenv("SHARD_DEFAULT_UNIT"),
+    )
+else:
+    DB = DatabaseEngine(DB_PATH)
 
 # def get_db():
 # 	return app.state._db
 
 
+# WAL checkpoints and ANALYZE run in a background thread instead of inside whichever request commits (see checkpoint.py)
+CHECKPOINT_SETTINGS = checkpoint_settings_from_env()
+CHECKPOINTER = None
+if CHECKPOINT_SETTINGS and not SHARD_ROOT:
+    DB.profile = replace(DB.profile, wal_autocheckpoint=0)
+    CHECKPOINTER = WalCheckpointer(DB_PATH, optimize_interval=DB.profile.optimize_interval, **CHECKPOINT_SETTINGS)
+    get_metrics().register_collector(CHECKPOINTER.metric_lines)
+
+
+# Continuous snapshot + WAL shipping backups of DB_PATH (see backup.py); one worker ships, the others skip
+BACKUP_SETTINGS = backup_settings_from_env()
+
+# Old audit, visit, activity and permission rows move to ARCHIVE_DB_PATH during quiet hours (see retention.py)
+RETENTION_SETTINGS = retention_settings_from_env()
+ARCHIVE_DB_PATH = archive_path_from_env(DB_PATH)
+
+# Lifetime of server-issued parent permission codes (see permission_codes.py)
+PERMISSION_CODE_TTL_DAYS = code_ttl_days_from_env()
+
+# Grants, approvals and roster changes pushed over SSE; each worker tails the live_events table (see live_events.py)
+LIVE_EVENTS_SETTINGS = live_events_settings_from_env()
+LIVE_EVENTS = None
+if LIVE_EVENTS_SETTINGS and not SHARD_ROOT:
+    LIVE_EVENTS = EventHub(DB_PATH, **LIVE_EVENTS_SETTINGS)
+    get_metrics().register_collector(LIVE_EVENTS.metric_lines)
+
+
 @app.on_event("startup")
 def startup():
+    # Fail fast on missing field encryption keys instead of on the first medical read or write
+    get_cipher()
     DB.startup(app)
-
+    if CHECKPOINTER is not None:
+        CHECKPOINTER.start()
+    if LIVE_EVENTS is not None:
+        LIVE_EVENTS.start()
+    elif not SHARD_ROOT:
+        # Nothing tails or prunes the log with streams off, so nothing may write to it either
+        disable_live_events(DB_PATH)
+    app.state.backup = None
+    if BACKUP_SETTINGS and not SHARD_ROOT:
+        manager = BackupManager(DB_PATH, **BACKUP_SETTINGS)
+        if manager.start():
+            app.state.backup = manager
+    app.state.retention = None
+    if RETENTION_SETTINGS and not SHARD_ROOT:
+        engine = RetentionEngine(DB_PATH, ARCHIVE_DB_PATH, **RETENTION_SETTINGS)
+        if engine.start():
+            app.state.retention = engine
 
 
 @app.on_event("shutdown")
 def shutdown():
 	# Connection is closed per-request in get_db()
-	pass
+	if app.state.backup is not None:
+		app.state.backup.stop()
+	if app.state.retention is not None:
+		app.state.retention.stop()
+	if CHECKPOINTER is not None:
+		CHECKPOINTER.stop()
+	if LIVE_EVENTS is not None:
+		LIVE_EVENTS.stop()
 
 
 def require_role(allowed_roles: set[str]):
@@ -64,30 +187,65 @@ def require_role(allowed_roles: set[str]):
         allowed_roles (set[str]): List of roles which are allowed
     """
     def role_checker(token: str = Depends(oauth2_scheme)):
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        except JWTError:
+        return check_token_role(token, allowed_roles)
+    # Lets POST /batch apply the same check to the routes it runs (see batch.py)
+    role_checker.allowed_roles = allowed_roles
+    return role_checker
+
+
+def require_role_or_query_token(allowed_roles: set[str]):
+    """Like require_role, but the token may also come from the `token` query parameter (for EventSource clients)
+    Args:
+        allowed_roles (set[str]): List of roles which are allowed
+    """
+    def role_checker(header_token: Optional[str] = Depends(stream_oauth2_scheme), token: Optional[str] = Query(None)):
+        if not (header_token or token):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token",
+                detail="Not authenticated",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        return check_token_role(header_token or token, allowed_roles)
+    return role_checker
 
-        role = payload.get("role")
-        username = payload.get("sub")
 
-        if not role or not username:
-            raise HTTPException(status_code=403, detail="Token missing user/role")
+def check_token_role(token: str, allowed_roles: set[str]) -> dict:
+    """Decodes a JWT and checks its role; raises 401/403 otherwise
+    Returns:
+        Returns the user info from the token
+    Args:
+        token (str): The bearer token
+        allowed_roles (set[str]): List of roles which are allowed
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-        if role != "all":
-            if role not in allowed_roles:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Insufficient permissions",
-                )
+    role = payload.get("role")
+    username = payload.get("sub")
 
-        return payload  # return user info if needed
-    return role_checker
+    if not role or not username:
+        raise HTTPException(status_code=403, detail="Token missing user/role")
+
+    if role != "all":
+        if role not in allowed_roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Insufficient permissions",
+            )
+
+    return payload  # return user info if needed
+
+
+def publish_live_events() -> None:
+    """Wake this worker's live event tail right after a commit instead of at its next poll"""
+    if LIVE_EVENTS is not None:
+        LIVE_EVENTS.notify()
 
 
 def audit_log_event(
@@ -100,7 +258,7 @@ def audit_log_event(
     resource_id: Optional[str] = None,
     success: bool = True,
     details: Optional[dict[str, Any]] = None,
-    db = Depends(DB.get_db)
+    db,
 ) -> None:
     """
     Logs an audit event to the audit_log table.
@@ -175,6 +333,25 @@ async def health(db=Depends(DB.get_db))->dict:
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["health"], description="Prometheus metrics", summary="Per-route latency, status and DB usage")
+def metrics(request: Request):
+    # Scrapers authenticate with a static bearer token when METRICS_TOKEN is set
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(get_metrics().render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/debug/query-profile", tags=["health"], description="Aggregated SQL profile (only when QUERY_PROFILE is enabled)", summary="Query profile summary")
+def query_profile_summary(limit: int = Query(50, ge=1, le=500), reset: bool = False, user=Depends(require_role({"admin"}))):
+    if not QUERY_PROFILE_SETTINGS:
+        raise HTTPException(status_code=404, detail="Query profiling is disabled")
+    report = get_profile_report()
+    summary = report.summary(limit)
+    if reset:
+        report.reset()
+    return summary
+
+
 #####################################
 ##### User Management Endpoints #####
 #####################################
@@ -186,7 +363,7 @@ def login_for_access_token(
 ):
     cursor = db.cursor()
     cursor.execute(
-        'SELECT username, password, role, "group" FROM admin_users WHERE username = ?',
+        'SELECT username, password, role, org_group FROM admin_users WHERE username = ?',
         (form_data.username,),
     )
     user = cursor.fetchone()
@@ -194,6 +371,7 @@ def login_for_access_token(
     if not user or user["password"] != form_data.password:
         audit_log_event(
             request=request,
+            db=db,
             actor_username=form_data.username,
             actor_role=None,
             action="LOGIN",
@@ -206,11 +384,12 @@ def login_for_access_token(
                             headers={"WWW-Authenticate": "Bearer"})
 
     access_token = create_access_token(
-        {"sub": user["username"], "role": user["role"], "org_group": user["org_group"]}
+        {"sub": user["username"], "role": user["role"], "org_group": user["org_group"], **DB.token_claims(request)}
     )
 
     audit_log_event(
         request=request,
+        db=db,
         actor_username=user["username"],
         actor_role=user["role"],
         action="LOGIN",
@@ -256,6 +435,7 @@ def login(request:Request, username: str, password: str, db=Depends(DB.get_db)):
 
         audit_log_event(
             request=request,
+            db=db,
             actor_username=user["username"],
             actor_role=user["role"],
             action="LOGIN",
@@ -271,17 +451,36 @@ def login(request:Request, username: str, password: str, db=Depends(DB.get_db)):
 
 
 def guid():
-    """Generate a unique GUID/UUID string"""
-    return str(uuid.uuid4())
+    """Generate a unique, time-ordered id (see ids.py)"""
+    return new_id()
+
+
+def youth_id_param(youth_id: str, db=Depends(DB.get_db)) -> str:
+    """youth_id from the path or query; ids replaced by `ids.py migrate` resolve to the current one"""
+    return resolve_id(db, "youth", youth_id.lower())
+
+
+def activity_id_param(activity_id: str, db=Depends(DB.get_db)) -> str:
+    """activity_id from the path or query; ids replaced by `ids.py migrate` resolve to the current one"""
+    return resolve_id(db, "activity", activity_id)
+
+
+YouthId = Annotated[str, Depends(youth_id_param)]
+ActivityId = Annotated[str, Depends(activity_id_param)]
+
+
+def group_index_key(request: Request) -> str:
+    """Which database's snapshot the group membership index should use for this request"""
+    return getattr(request.state, "unit", None) or "default"
     
 
 @app.post("/youth", tags=["users"], description="Create a new youth user",summary="Create youth user account.  Happens via parent medical form creation")
-def create_youth_account(username:str, password:str, group:str, db=Depends(DB.get_db))->UserReturnModel:
+def create_youth_account(username:str, password:str, group:str, youth_id: Optional[str] = Query(None, description="The youth's medical record, so they see their own goals"), db=Depends(DB.get_db))->UserReturnModel:
     cursor = db.cursor()
     user_id = guid()
     cursor.execute(
-        "INSERT INTO admin_users (username, password, role, org_group, user_id) VALUES (?, ?, ?, ?, ?)",
-        (username, password, "youth", group, user_id)
+        "INSERT INTO admin_users (username, password, role, org_group, user_id, youth_id) VALUES (?, ?, ?, ?, ?, ?)",
+        (username, password, "youth", group, user_id, resolve_id(db, "youth", youth_id) if youth_id else None)
     )
     db.commit()
     # user_id = cursor.lastrowid
@@ -289,64 +488,197 @@ def create_youth_account(username:str, password:str, group:str, db=Depends(DB.ge
 
 
 @app.post("/users", tags=["users"], description="Create a new user", summary="Create new user with medical info")
-async def create_user(user_data: YouthPermissionSubmission, db=Depends(DB.get_db)):
+async def create_user(request: Request, user_data: YouthPermissionSubmission, db=Depends(DB.get_db)):
     cursor = db.cursor()
+    cipher = get_cipher()
+    try:
+        signature = store_signature(get_blob_store(), user_data.signature)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     sql = """
     INSERT INTO youth_medical 
             (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at) 
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """
-    cursor.execute(
-		sql,
-        (
-            f"{user_data.youth.first_name.lower()}_{user_data.youth.last_name.lower()}",
-            user_data.permission_code,
-            user_data.youth.model_dump_json(),
-            user_data.parent_guardian.model_dump_json(),
-            user_data.medical.model_dump_json(),
-            user_data.emergency_contact.model_dump_json(),
-            user_data.signature.model_dump_json(),
-            user_data.signed_at,
-        ),
-    )   
-    db.commit()
-    return {"message": "User created successfully."}
+    youth_id = new_id()
+    household = household_key(user_data.parent_guardian)
+    # The code lookup and the insert share one write transaction, so siblings submitted together get one code
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if user_data.permission_code is None:
+            permission_code = DB.code_allocator(request, db).for_household(household, expiry_from_ttl(PERMISSION_CODE_TTL_DAYS))
+        else:
+            require_usable_code(db, user_data.permission_code)
+            permission_code = user_data.permission_code
+            if not register_client_code(db, permission_code, household):
+                raise HTTPException(status_code=409, detail="Permission code belongs to another household.")
+            if not DB.code_allocator(request, db).claim_client_code(permission_code):
+                raise HTTPException(status_code=409, detail="Permission code belongs to another unit.")
+        cursor.execute(
+            sql,
+            (
+                youth_id,
+                permission_code,
+                user_data.youth.model_dump_json(),
+                user_data.parent_guardian.model_dump_json(),
+                cipher.encrypt(user_data.medical.model_dump_json(), "medical"),
+                cipher.encrypt(user_data.emergency_contact.model_dump_json(), "emergency_contact"),
+                signature.model_dump_json(exclude_none=True),
+                user_data.signed_at,
+            ),
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    DB.register_permission_code(request, permission_code)
+    get_group_index().invalidate(group_index_key(request))
+    return {"message": "User created successfully.", "youth_id": youth_id, "permission_code": permission_code}
+
+
+@app.post("/users/import", tags=["users"], description="Bulk import youth medical/permission submissions (CSV with dotted headers such as youth.first_name, a JSON array or NDJSON)", summary="Bulk roster import")
+async def import_users(
+    request: Request,
+    fmt: Optional[Literal["csv", "json", "ndjson"]] = Query(None, alias="format", description="Roster format (default: from Content-Type)"),
+    dry_run: bool = Query(False, description="Validate and report without writing"),
+    atomic: bool = Query(False, description="Write all rows in one transaction instead of one per chunk"),
+    db=Depends(DB.get_db),
+    user=Depends(require_role({"admin", "ecc_admin"})),
+):
+    # Spool the upload to disk past 8 MB so large rosters are parsed row by row instead of held in memory
+    upload = SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    upload.seek(0)
+    stream = TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    records = read_records(stream, fmt or format_from_name(None, request.headers.get("content-type")))
+    try:
+        importer = RosterImporter(db, get_cipher(), get_blob_store(), allocator=DB.code_allocator(request, db),
+                                  code_expiry=expiry_from_ttl(PERMISSION_CODE_TTL_DAYS))
+        report, codes = await run_in_threadpool(importer.run, records, dry_run, atomic)
+    finally:
+        stream.close()
+    for code in codes:
+        DB.register_permission_code(request, code)
+    if not dry_run:
+        get_group_index().invalidate(group_index_key(request))
+    summary = report.summary()
+    if not dry_run:
+        audit_log_event(
+            request=request,
+            db=db,
+            actor_username=user.get("sub"),
+            actor_role=user.get("role"),
+            action="roster_import",
+            resource_type="youth",
+            details=summary["counts"],
+        )
+    return FastJSONResponse(summary)
+
+
+# Roles that may read a youth's medical release (GET /users/{youth_id} and its signature)
+MEDICAL_ROLES = {"advisor", "admin", "ecc_admin"}
 
+# With `fields=` the endpoints using this return partial items, so their declared models also allow a plain dict
+FIELDS_RESPONSES = {200: {"description": "The full model, or with `fields=` only the requested fields plus the id"}}
 
-@app.get("/users/{youth_id}",tags=["users"],description="Get user by youth ID", summary="Retrieve user information")
-async def get_user(youth_id: str, db=Depends(DB.get_db))->Union[YouthPermissionSubmission,dict]:
+# `fields=` on GET /users/{youth_id}
+USER_FIELDS = FieldSet(
+    YouthPermissionSubmission,
+    ("youth_id", "permission_code", "youth", "parent_guardian", "medical", "emergency_contact", "signature", "signed_at"),
+    always=("youth_id",),
+)
+
+
+@app.get("/users/{youth_id}",tags=["users"],description="Get user by youth ID", summary="Retrieve user information", responses=FIELDS_RESPONSES)
+async def get_user(
+    request: Request,
+    youth_id: YouthId,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (default: all), e.g. youth,signed_at"),
+    user=Depends(require_role(MEDICAL_ROLES)),
+    db=Depends(DB.get_db),
+)->Union[YouthPermissionSubmission,dict]:
+    selected = USER_FIELDS.parse(fields)
     cursor = db.cursor()
     cursor.execute(     
-        "SELECT * FROM youth_medical WHERE youth_id = ?", (youth_id.lower(),)
+        f"SELECT {USER_FIELDS.select(selected)} FROM youth_medical WHERE youth_id = ?", (youth_id.lower(),)
     )
     row = cursor.fetchone()
-    if row:
-        parent_info = ParentGuardian(**json.loads(row["parent_guardian"]))
-        medical_info = MedicalInfo(**json.loads(row["medical"]))
-        emergency_info = EmergencyContact(**json.loads(row["emergency_contact"]))
-        signature_info = Signature(**json.loads(row["signature"]))
-        resp = YouthPermissionSubmission(
-            permission_code=row["permission_code"],
-            youth=json.loads(row["youth"]),
-            parent_guardian=parent_info,
-            medical=medical_info,
-            emergency_contact=emergency_info,
-            signature=signature_info,
-            signed_at=row["signed_at"],
-            youth_id=youth_id
-        )
-        return resp
-    else:
+    if not row:
         return {"message": "User not found."}
+
+    values = dict(row)
+    # Medical and emergency contact data are only decrypted (and the access audited) when asked for
+    cipher = get_cipher()
+    decrypted = [column for column in ("medical", "emergency_contact") if column in values]
+    for column in decrypted:
+        values[column] = cipher.decrypt(values[column], column)
+    for column in ("youth", "parent_guardian", "medical", "emergency_contact", "signature"):
+        if column in values:
+            values[column] = json.loads(values[column])
+    if decrypted:
+        audit_log_event(
+            request=request,
+            db=db,
+            actor_username=user.get("sub"),
+            actor_role=user.get("role"),
+            action="decrypt_medical",
+            resource_type="youth",
+            resource_id=youth_id,
+            success=True,
+            details={"records": 1},
+        )
+    if fields is None:
+        return YouthPermissionSubmission(**values)
+    return FastJSONResponse(USER_FIELDS.model(selected).model_validate(values).model_dump(mode="json"))
 	
 	
+@app.get("/users/{youth_id}/signature", tags=["users"], description="Stream the signature image of a youth's medical release", summary="Retrieve signature image")
+def get_user_signature(request: Request, youth_id: YouthId, user=Depends(require_role(MEDICAL_ROLES)), db=Depends(DB.get_db)):
+    cursor = db.cursor()
+    cursor.execute(
+        "SELECT json_extract(signature, '$.signature_ref'), json_extract(signature, '$.signature_image_base64') FROM youth_medical WHERE youth_id = ?",
+        (youth_id.lower(),)
+    )
+    row = cursor.fetchone()
+    if not row or not (row[0] or row[1]):
+        return Response(content="Signature not found.", status_code=404)
+
+    # Stored bytes are only ever rendered as an image, never as a document on this origin
+    headers = {"X-Content-Type-Options": "nosniff", "Content-Security-Policy": "default-src 'none'"}
+    if row[0] is None:
+        # Row written before signatures moved to the blob store
+        image = decode_base64_image(row[1], require_image=False)
+        return Response(content=image, media_type=sniff_media_type(image[:16]) or "application/octet-stream", headers=headers)
+
+    ref = row[0]
+    store = get_blob_store()
+    if not store.exists(ref):
+        return Response(content="Signature not found.", status_code=404)
+    # The reference is a content hash, so it makes a strong ETag; the response is still revalidated every time,
+    # so a cached copy is never served after the caller's role is taken away
+    etag = f'"{ref.split(":", 1)[1]}"'
+    headers.update({"ETag": etag, "Cache-Control": "private, no-cache"})
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    chunks = store.iter_chunks(ref)
+    head = next(chunks, b"")
+    headers["Content-Length"] = str(store.size(ref))
+
+    def stream():
+        yield head
+        yield from chunks
+    return StreamingResponse(stream(), media_type=sniff_media_type(head) or "application/octet-stream", headers=headers)
+
+
 @app.delete("/users/{youth_id}",tags=["users"],description="Delete user by youth ID", summary="Delete user account")
-async def delete_user(youth_id: str,db=Depends(DB.get_db)):
+async def delete_user(request: Request, youth_id: YouthId,db=Depends(DB.get_db)):
     cursor = db.cursor()
     cursor.execute(
         "DELETE FROM youth_medical WHERE youth_id = ?", (youth_id.lower(),)
     )
     db.commit()
+    get_group_index().invalidate(group_index_key(request))
     if cursor.rowcount > 0:
         return {"message": "User deleted successfully."}
     else:
@@ -354,11 +686,16 @@ async def delete_user(youth_id: str,db=Depends(DB.get_db)):
 
 
 @app.put("/users/{youth_id}", tags=["users"], description="Update user by youth ID", summary="Update user information")
-async def update_user(youth_id: str, user_data: YouthPermissionSubmission, db=Depends(DB.get_db))->Dict[str, str]:
+async def update_user(request: Request, youth_id: YouthId, user_data: YouthPermissionSubmission, db=Depends(DB.get_db))->Dict[str, str]:
     cursor = db.cursor()
+    cipher = get_cipher()
+    try:
+        signature = store_signature(get_blob_store(), user_data.signature)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     sql = """
     UPDATE youth_medical 
-    SET permission_code = ?, youth = ?, parent_guardian = ?, medical = ?, emergency_contact = ?, signature = ?, signed_at = ?, updated_at = datetime('now')
+    SET permission_code = COALESCE(?, permission_code), youth = ?, parent_guardian = ?, medical = ?, emergency_contact = ?, signature = ?, signed_at = ?, updated_at = datetime('now')
     WHERE youth_id = ?
     """
     cursor.execute(
@@ -367,14 +704,15 @@ async def update_user(youth_id: str, user_data: YouthPermissionSubmission, db=De
             user_data.permission_code,
             user_data.youth.model_dump_json(),
             user_data.parent_guardian.model_dump_json(),
-            user_data.medical.model_dump_json(),
-            user_data.emergency_contact.model_dump_json(),
-            user_data.signature.model_dump_json(),
+            cipher.encrypt(user_data.medical.model_dump_json(), "medical"),
+            cipher.encrypt(user_data.emergency_contact.model_dump_json(), "emergency_contact"),
+            signature.model_dump_json(exclude_none=True),
             user_data.signed_at,
             youth_id.lower(),
         ),
     )
     db.commit()
+    get_group_index().invalidate(group_index_key(request))
     if cursor.rowcount > 0:
         return {"message": "User updated successfully."}
     else:
@@ -382,7 +720,7 @@ async def update_user(youth_id: str, user_data: YouthPermissionSubmission, db=De
     
 
 @app.get("/users-health", tags=["users"], description="Get health information of all users of an activity", summary="Retrieve health information for activity participants")
-async def get_users_health(request: Request, activity_id: str, user=Depends(require_role({"advisor", "admin", "ecc_admin"})), db=Depends(DB.get_db))->List[MedicalInfo]:
+async def get_users_health(request: Request, activity_id: ActivityId, user=Depends(require_role({"advisor", "admin", "ecc_admin"})), db=Depends(DB.get_db))->List[MedicalInfo]:
     cursor = db.cursor()
     cursor.execute(
         "SELECT participants_youth_ids FROM activities WHERE activity_id = ?", (activity_id,)
@@ -390,20 +728,18 @@ async def get_users_health(request: Request, activity_id: str, user=Depends(requ
     row = cursor.fetchone()
     if not row:
         return []
-    youth_ids = json.loads(row[0])
-    medical_infos = []
-    for youth_id in youth_ids:
-        cursor.execute(
-            "SELECT medical FROM youth_medical WHERE youth_id = ?", (youth_id,)
-        )
-        med_row = cursor.fetchone()
-        if med_row:
-            medical_info = MedicalInfo(**json.loads(med_row[0]))
-            medical_infos.append(medical_info)
+    youth_ids = json.loads(row[0]) if row[0] else []
+    # One query for every participant, then one batch decrypt
+    cursor.execute(
+        "SELECT medical FROM youth_medical WHERE youth_id IN (SELECT value FROM json_each(?))", (row[0],)
+    )
+    medical_json = get_cipher().decrypt_many((r[0] for r in cursor.fetchall()), "medical")
+    medical_infos = [MedicalInfo(**json.loads(m)) for m in medical_json]
 
     # Audit: log count, not the sensitive data itself
     audit_log_event(
         request=request,
+        db=db,
         actor_username=user.get("sub"),
         actor_role=user.get("role"),
         action="get_users_health",
@@ -419,7 +755,7 @@ async def get_users_health(request: Request, activity_id: str, user=Depends(requ
 
 
 @app.get("/users-emergency-contacts", tags=["users"], description="Get emergency contacts of all users of an activity", summary="Retrieve emergency contacts for activity participants")
-async def get_users_emergency_contacts(activity_id: str,  user=Depends(require_role({"advisor", "admin", "ecc_admin"})), db=Depends(DB.get_db))->List[EmergencyContact]:
+async def get_users_emergency_contacts(request: Request, activity_id: ActivityId,  user=Depends(require_role({"advisor", "admin", "ecc_admin"})), db=Depends(DB.get_db))->List[EmergencyContact]:
     cursor = db.cursor()
     cursor.execute(
         "SELECT participants_youth_ids FROM activities WHERE activity_id = ?", (activity_id,)
@@ -427,16 +763,23 @@ async def get_users_emergency_contacts(activity_id: str,  user=Depends(require_r
     row = cursor.fetchone()
     if not row:
         return []
-    youth_ids = json.loads(row[0])
-    emergency_contacts = []
-    for youth_id in youth_ids:
-        cursor.execute(
-            "SELECT emergency_contact FROM youth_medical WHERE youth_id = ?", (youth_id,)
-        )
-        em_row = cursor.fetchone()
-        if em_row:
-            emergency_info = EmergencyContact(**json.loads(em_row[0]))
-            emergency_contacts.append(emergency_info)
+    cursor.execute(
+        "SELECT emergency_contact FROM youth_medical WHERE youth_id IN (SELECT value FROM json_each(?))", (row[0],)
+    )
+    contacts_json = get_cipher().decrypt_many((r[0] for r in cursor.fetchall()), "emergency_contact")
+    emergency_contacts = [EmergencyContact(**json.loads(c)) for c in contacts_json]
+
+    audit_log_event(
+        request=request,
+        db=db,
+        actor_username=user.get("sub"),
+        actor_role=user.get("role"),
+        action="get_users_emergency_contacts",
+        resource_type="activity",
+        resource_id=activity_id,
+        success=True,
+        details={"contacts_returned": len(emergency_contacts)},
+    )
     return emergency_contacts
 
 
@@ -471,7 +814,7 @@ async def submit_interest_survey(data:InterestSurvey,db=Depends(DB.get_db)):
 
 
 @app.post("/interest-survey-reset", tags=["interest-survey"], description="Reset interest survey for youth", summary="Reset youth interest survey")
-async def reset_interest_survey(youth_id: str,db=Depends(DB.get_db)):
+async def reset_interest_survey(youth_id: YouthId,db=Depends(DB.get_db)):
     cursor = db.cursor()
     cursor.execute(
         "DELETE FROM interest_survey WHERE youth_id = ?", (youth_id,)
@@ -532,7 +875,7 @@ def list_group_participants(group:str, db=Depends(DB.get_db))->list:
 
 
 @app.post("/activities", tags=["activities"], description="Create a new activity", summary="Create new activity")
-async def create_activity(activity_data: Activity, db=Depends(DB.get_db)):
+async def create_activity(request: Request, activity_data: Activity, db=Depends(DB.get_db)):
     # fill in additional information
     coed = False
     if ("deacon"or "teacher"or"priest") and ("young women") in activity_data.groups:
@@ -549,19 +892,17 @@ async def create_activity(activity_data: Activity, db=Depends(DB.get_db)):
 
     activity_data.is_coed = coed
     activity_data.is_overnight = is_overnighter
-    all_users = []
-    for group in activity_data.groups:
-        participants = list_group_participants(group)
-        all_users.extend(participants)
+    # Everyone in the activity's groups, from the in-memory membership index
+    all_users = get_group_index().participants(db, activity_data.groups, group_index_key(request))
     cursor = db.cursor()
 
-    # generate an activity identifier and store the payload as JSON
-    activity_id = str(uuid.uuid4())
+    # generate a time-ordered activity identifier and store the payload as JSON
+    activity_id = new_id()
     
     # Serialize complex fields as JSON
-    budget_json = json.dumps(activity_data.budget) if hasattr(activity_data, 'budget') and activity_data.budget else None
-    groups = activity_data.groups if hasattr(activity_data, 'groups') and activity_data.groups else None
-    drivers = activity_data.drivers if hasattr(activity_data, 'drivers') and activity_data.drivers else None
+    budget_json = activity_data.budget.model_dump_json() if activity_data.budget else None
+    groups = json.dumps(activity_data.groups) if activity_data.groups else None
+    drivers = json.dumps(activity_data.drivers) if activity_data.drivers else None
 
     cursor.execute(
         """INSERT INTO activities 
@@ -576,7 +917,7 @@ async def create_activity(activity_data: Activity, db=Depends(DB.get_db)):
             activity_data.end_time,
             getattr(activity_data, 'location', None),
             budget_json,
-            all_users,
+            json.dumps(all_users),
             groups,
             drivers,
             1 if is_overnighter else 0,
@@ -589,7 +930,7 @@ async def create_activity(activity_data: Activity, db=Depends(DB.get_db)):
 
 
 @app.get("/activities/{activity_id}", tags=["activities"], description="Get activity by ID", summary="Retrieve activity details")
-async def get_activity(activity_id: str, db=Depends(DB.get_db))->Activity:
+async def get_activity(activity_id: ActivityId, db=Depends(DB.get_db))->Activity:
     cursor = db.cursor()
     cursor.execute(
         "SELECT data FROM activities WHERE activity_id = ?", (activity_id,)
@@ -602,7 +943,7 @@ async def get_activity(activity_id: str, db=Depends(DB.get_db))->Activity:
 
 
 @app.delete("/activities/{activity_id}", tags=["activities"], description="Delete activity by ID", summary="Delete activity")
-async def delete_activity(activity_id: str, db=Depends(DB.get_db)):
+async def delete_activity(activity_id: ActivityId, db=Depends(DB.get_db)):
     cursor = db.cursor()
     cursor.execute(
         "DELETE FROM activities WHERE activity_id = ?", (activity_id,)
@@ -612,7 +953,7 @@ async def delete_activity(activity_id: str, db=Depends(DB.get_db)):
 
 
 @app.put("/activities/{activity_id}", tags=["activities"], description="Update activity by ID", summary="Update activity details")
-async def update_activity(activity_id: str, activity_data: Activity, db=Depends(DB.get_db)):
+async def update_activity(request: Request, activity_id: ActivityId, activity_data: Activity, db=Depends(DB.get_db)):
     cursor = db.cursor()
     
     # Check if activity exists
@@ -635,15 +976,12 @@ async def update_activity(activity_id: str, activity_data: Activity, db=Depends(
                 pass
     
     # Serialize complex fields as JSON
-    budget_json = json.dumps(activity_data.budget) if hasattr(activity_data, 'budget') and activity_data.budget else None
-    groups = activity_data.groups if hasattr(activity_data, 'groups') and activity_data.groups else None
-    drivers = activity_data.drivers if hasattr(activity_data, 'drivers') and activity_data.drivers else None
+    budget_json = activity_data.budget.model_dump_json() if activity_data.budget else None
+    groups = json.dumps(activity_data.groups) if activity_data.groups else None
+    drivers = json.dumps(activity_data.drivers) if activity_data.drivers else None
     
     # Get all users for updated groups
-    all_users = []
-    for group in activity_data.groups:
-        participants = list_group_participants(group)
-        all_users.extend(participants)
+    all_users = get_group_index().participants(db, activity_data.groups, group_index_key(request))
     
     # Update the activity
     cursor.execute(
@@ -659,7 +997,7 @@ async def update_activity(activity_id: str, activity_data: Activity, db=Depends(
             activity_data.end_time,
             getattr(activity_data, 'location', None),
             budget_json,
-            all_users,
+            json.dumps(all_users),
             groups,
             drivers,
             1 if is_overnighter else 0,
@@ -669,12 +1007,13 @@ async def update_activity(activity_id: str, activity_data: Activity, db=Depends(
         )
     )
     db.commit()
+    publish_live_events()
     return {"message": "Activity updated successfully."}
 
 
 
 @app.get("/participants/{activity_id}", tags=["activities"], description="Get participants for activity by ID", summary="Retrieve activity participants")
-async def get_activity_participants(activity_id: str, db=Depends(DB.get_db))->List[ActivityInvitees]:
+async def get_activity_participants(activity_id: ActivityId, db=Depends(DB.get_db))->List[ActivityInvitees]:
     cursor = db.cursor()
     cursor.execute(
         "SELECT activities.participants_youth_ids, youth.first_name, youth.last_name FROM activities INNER JOIN youth ON activities.participants_youth_ids = youth.youth_id WHERE activity_id = ?", (activity_id,)
@@ -714,7 +1053,7 @@ async def get_group_membership(group: str, db=Depends(DB.get_db)):
 
 
 @app.get("/activities/permission-info/{activity_id}",tags=["activities"],description="Get permission info for activity by ID", summary="Retrieve activity permission information")
-async def get_activity_permission_info(activity_id: str, db=Depends(DB.get_db))->ActivityBase:
+async def get_activity_permission_info(activity_id: ActivityId, db=Depends(DB.get_db))->ActivityBase:
     cursor = db.cursor()
     cursor.execute(
         "SELECT  activity_name, date_start, date_end, drivers, description, groups, requires_permission, location FROM activities WHERE activity_id = ?", (activity_id,)    
@@ -727,14 +1066,27 @@ async def get_activity_permission_info(activity_id: str, db=Depends(DB.get_db))-
         return {"message": "Activity not found."}
 
 
+def require_usable_code(db, code: str) -> None:
+    """410 for a permission code that has expired or been rotated out; unknown codes are left to the caller's lookup"""
+    state = code_state(db, code)
+    if state == "expired":
+        raise HTTPException(status_code=410, detail="Permission code has expired.")
+    if state == "retired":
+        raise HTTPException(status_code=410, detail="Permission code has been replaced.")
+
+
 @app.post("/activity-permissions", tags=["activity-permissions"], description="Assign permission to activity", summary="Record activity permission")
 async def assign_permission_to_activity(permission_data: PermissionGiven, db=Depends(DB.get_db)):
     cursor = db.cursor()
+    require_usable_code(db, permission_data.permission_code)
+    permission_data.activity_id = resolve_id(db, "activity", permission_data.activity_id)
+    permission_data.youth_id = resolve_id(db, "youth", permission_data.youth_id)
 
-    # Get the youth_id from youth_medical table using permission_code
+    # Get the youth_id from youth_medical table using permission_code; siblings share a code,
+    # so the submitted youth_id wins when it is one of them
     cursor.execute(
-        "SELECT youth_id FROM youth_medical WHERE permission_code = ?",
-        (permission_data.permission_code,)
+        "SELECT youth_id FROM youth_medical WHERE permission_code = ? ORDER BY youth_id = ? DESC",
+        (permission_data.permission_code, permission_data.youth_id)
     )
     row = cursor.fetchone()
     
@@ -749,15 +1101,157 @@ async def assign_permission_to_activity(permission_data: PermissionGiven, db=Dep
     else:
         data_json = json.dumps(permission_data)
     
+    # (activity_id, youth_id) is unique, so a repeated grant is a no-op
     cursor.execute(
-        "INSERT INTO permission_given (youth_id, activity_id, permission_code, data) VALUES (?, ?, ?, ?)",
+        "INSERT OR IGNORE INTO permission_given (youth_id, activity_id, permission_code, data) VALUES (?, ?, ?, ?)",
         (youth_id, permission_data.activity_id, permission_data.permission_code, data_json)
     )
     db.commit()
+    if cursor.rowcount == 0:
+        return {"message": "Permission to attend activity was already recorded.", "youth_id": youth_id}
+    publish_live_events()
     
     return {"message": "Permission to attend activity recorded.", "youth_id": youth_id}
 
 
+def _json_list(value: Any) -> list | None:
+    try:
+        decoded = json.loads(value) if isinstance(value, str) else value
+    except ValueError:
+        return None
+    return decoded if isinstance(decoded, list) else None
+
+
+@app.post("/activity-permissions/batch", tags=["activity-permissions"], description="Grant permission for several youth across several activities with one parent permission code", summary="Record activity permissions in bulk")
+def assign_permissions_batch(request: Request, grant: PermissionBatchGrant, db=Depends(DB.get_db))->PermissionBatchResult:
+    require_usable_code(db, grant.permission_code)
+    # Every sibling registered under the code, with the group used to match activities
+    youth_rows = db.execute(
+        "SELECT youth_id, json_extract(youth, '$.org_group') AS org_group FROM youth_medical WHERE permission_code = ?",
+        (grant.permission_code,),
+    ).fetchall()
+    if not youth_rows:
+        raise HTTPException(status_code=404, detail="Permission code not found.")
+    youth_groups = {row["youth_id"]: row["org_group"] for row in youth_rows}
+    youth_ids = list(dict.fromkeys(resolve_id(db, "youth", y) for y in grant.youth_ids)) if grant.youth_ids is not None else list(youth_groups)
+    activity_ids = list(dict.fromkeys(resolve_id(db, "activity", activity_id) for activity_id in grant.activity_ids))
+
+    activities = {
+        row["activity_id"]: _json_list(row["groups"])
+        for row in db.execute(
+            "SELECT activity_id, groups FROM activities WHERE activity_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(activity_ids),),
+        ).fetchall()
+    }
+    # Take the write lock before checking existing grants so a concurrent grant cannot slip in between
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        already = {
+            (row["youth_id"], row["activity_id"])
+            for row in db.execute(
+                # By (youth, activity) whatever code granted it: a grant recorded under an older code still stands
+                "SELECT youth_id, activity_id FROM permission_given "
+                "WHERE youth_id IN (SELECT value FROM json_each(?)) AND activity_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(youth_ids), json.dumps(activity_ids)),
+            ).fetchall()
+        }
+
+        granted_at = datetime.now(timezone.utc)
+        granted_ip = request.client.host if request.client else ""
+        results, rows = [], []
+        for youth_id in youth_ids:
+            for activity_id in activity_ids:
+                if youth_id not in youth_groups:
+                    outcome = "unknown_youth"
+                elif activity_id not in activities:
+                    outcome = "unknown_activity"
+                elif (youth_id, activity_id) in already:
+                    outcome = "already_granted"
+                elif activities[activity_id] is not None and youth_groups[youth_id] and youth_groups[youth_id] not in activities[activity_id]:
+                    outcome = "not_in_group"
+                else:
+                    outcome = "granted"
+                    data = PermissionGiven(youth_id=youth_id, activity_id=activity_id, granted_at=granted_at,
+                                           permission_code=grant.permission_code, granted_ip=granted_ip)
+                    rows.append((len(results), (youth_id, activity_id, grant.permission_code, data.model_dump_json())))
+                results.append({"youth_id": youth_id, "activity_id": activity_id, "status": outcome})
+
+        # All grants and their single audit record commit together (audit_log_event commits)
+        granted = 0
+        for position, params in rows:
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO permission_given (youth_id, activity_id, permission_code, data) VALUES (?, ?, ?, ?)", params
+            )
+            if cursor.rowcount:
+                granted += 1
+            else:
+                results[position]["status"] = "already_granted"
+        audit_log_event(
+            request=request,
+            db=db,
+            actor_username=None,
+            actor_role="parent",
+            action="grant_permission_batch",
+            resource_type="permission_given",
+            details={"youth_ids": youth_ids, "activity_ids": activity_ids, "granted": granted},
+        )
+    except Exception:
+        db.rollback()
+        raise
+    if granted:
+        publish_live_events()
+    return FastJSONResponse({"granted": granted, "results": results})
+
+
+@app.post("/permission-codes", tags=["activity-permissions"], description="Issue unique parent permission codes in bulk", summary="Issue permission codes")
+def issue_permission_codes(request: Request, spec: PermissionCodeIssue, db=Depends(DB.get_db), user=Depends(require_role({"admin", "ecc_admin"}))):
+    if spec.household_ids is not None and len(spec.household_ids) != spec.count:
+        raise HTTPException(status_code=422, detail="household_ids must have one entry per code")
+    expires_at = expiry_from_ttl(spec.ttl_days or PERMISSION_CODE_TTL_DAYS)
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        codes = DB.code_allocator(request, db).issue(spec.count, spec.household_ids, expires_at)
+        audit_log_event(
+            request=request,
+            db=db,
+            actor_username=user.get("sub"),
+            actor_role=user.get("role"),
+            action="issue_permission_codes",
+            resource_type="permission_codes",
+            details={"count": len(codes), "expires_at": expires_at},
+        )
+    except RuntimeError as e:
+        db.rollback()
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception:
+        db.rollback()
+        raise
+    return FastJSONResponse({"codes": codes, "expires_at": expires_at})
+
+
+@app.post("/permission-codes/{permission_code}/rotate", tags=["activity-permissions"], description="Replace a parent permission code; the household's youth and grants move to the new code", summary="Rotate a permission code")
+def rotate_permission_code(request: Request, permission_code: str, db=Depends(DB.get_db), user=Depends(require_role({"admin", "ecc_admin"}))):
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        new_code = DB.code_allocator(request, db).rotate(permission_code, expiry_from_ttl(PERMISSION_CODE_TTL_DAYS))
+        audit_log_event(
+            request=request,
+            db=db,
+            actor_username=user.get("sub"),
+            actor_role=user.get("role"),
+            action="rotate_permission_code",
+            resource_type="permission_codes",
+            resource_id=permission_code,
+        )
+    except KeyError:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="No active permission code to rotate.")
+    except Exception:
+        db.rollback()
+        raise
+    return {"permission_code": new_code, "replaced": permission_code}
+
+
 @app.get("/activity-groups", tags=["activities"], description="Get all group activities", summary="Retrieve group activities")
 def get_activity_groups(db=Depends(DB.get_db),user=Depends(require_role({"advisor", "admin", "ecc_admin", "president"})))->List[ReturnGroupActivityList]:
     group = user.get("org_group")
@@ -765,12 +1259,11 @@ def get_activity_groups(db=Depends(DB.get_db),user=Depends(require_role({"adviso
     cursor.execute(
         "SELECT activity_id, activity_name, date_start, requires_permission FROM activities WHERE groups LIKE ?", (f"%{group}%",)
     )
-    rows = cursor.fetchall()
-    return [ReturnGroupActivityList(**row) for row in rows]
+    return FastJSONResponse(decode_rows(cursor.fetchall(), bool_columns=("requires_permission",), datetime_columns=("date_start",)))
 
 
 @app.get("/activity-health-reports/{activity_id}", tags=["activities"], description="Get health reports for activity by ID", summary="Retrieve activity health reports")
-def get_activity_health_reports(activity_id: str, db=Depends(DB.get_db), users=Depends(require_role({"advisor", "admin", "ecc_admin", "president"})))->ActivityHealthReport:
+def get_activity_health_reports(request: Request, activity_id: ActivityId, db=Depends(DB.get_db), users=Depends(require_role({"advisor", "admin", "ecc_admin", "president"})))->ActivityHealthReport:
     cursor = db.cursor()
     cursor.execute(
         "SELECT participants_youth_ids FROM activities WHERE activity_id = ?", (activity_id,)
@@ -778,91 +1271,182 @@ def get_activity_health_reports(activity_id: str, db=Depends(DB.get_db), users=D
     row = cursor.fetchone()
     if not row:
         return {"message": "Activity not found."}
-    
-    youth_ids = json.loads(row["participants_youth_ids"])
-    
+
+    # One query for every participant, then one batch decrypt
+    cursor.execute(
+        "SELECT medical FROM youth_medical WHERE youth_id IN (SELECT value FROM json_each(?))", (row["participants_youth_ids"],)
+    )
+    medical_json = get_cipher().decrypt_many((r[0] for r in cursor.fetchall()), "medical")
+
     medications = []
     allergies = []
     dietary_restrictions = []
     medical_conditions = []
     special_notes = []
-    for youth_id in youth_ids:
-        cursor.execute(
-            "SELECT medical, allergies, dietary_restrictions, medical_conditions, medications, special_notes FROM youth_medical WHERE youth_id = ?", (youth_id,)
-        )
-        med_row = cursor.fetchone()
-        if med_row:
-            medical_info = MedicalInfo(**json.loads(med_row[0]))
-            medications.insert(0, medical_info.medications)
-            allergies.insert(0, medical_info.allergies)
-            dietary_restrictions.insert(0, medical_info.dietary_restrictions)
-            medical_conditions.insert(0, medical_info.medical_conditions)
-            special_notes.insert(0, medical_info.special_notes)
-    
-    return ActivityHealthReport(
-        medications=medications,
-        allergies=allergies,
-        dietary_restrictions=dietary_restrictions,
-        medical_conditions=medical_conditions,
-        special_notes=special_notes
-    )
-
+    for medical in medical_json:
+        medical_info = MedicalInfo(**json.loads(medical))
+        if medical_info.medications:
+            medications.append(medical_info.medications)
+        if medical_info.allergies:
+            allergies.append(medical_info.allergies)
+        if medical_info.dietary_restrictions:
+            dietary_restrictions.append(medical_info.dietary_restrictions)
+        if medical_info.conditions:
+            medical_conditions.append(medical_info.conditions)
+        for note in (medical_info.limitations, medical_info.special_accommodations):
+            if note:
+                special_notes.append(note)
 
-@app.get("/activities-all-parents", tags=["activities"], description="Get all activities with parent details", summary="Retrieve activities for parent")
-def get_all_activities_with_parents(parent_code:str = Query(..., description="Parent permission code"), db=Depends(DB.get_db)):
+    audit_log_event(
+        request=request,
+        db=db,
+        actor_username=users.get("sub"),
+        actor_role=users.get("role"),
+        action="get_activity_health_reports",
+        resource_type="activity",
+        resource_id=activity_id,
+        success=True,
+        details={"records": len(medical_json)},
+    )
+    return FastJSONResponse({
+        "activity_id": activity_id,
+        "medications": medications,
+        "allergies": allergies,
+        "dietary_restrictions": dietary_restrictions,
+        "medical_conditions": medical_conditions,
+        "special_notes": special_notes,
+    })
+
+
+ACTIVITY_LIST_COLUMNS = "activity_id, activity_name, date_start, date_end, drivers, description, groups, requires_permission, location"
+# `fields=` on the activity lists; the projection is built from these names only, never from the raw parameter
+ACTIVITY_LIST_FIELDS = FieldSet(ActivityBase, ACTIVITY_LIST_COLUMNS.split(", "), always=("activity_id",))
+FIELDS_QUERY = Query(None, description="Comma-separated fields to return (default: all), e.g. activity_name,date_start. "
+                                        "Fields not asked for are left out of each item, required ones included")
+ACTIVITY_DATETIME_COLUMNS = ("date_start", "date_end")
+
+
+@app.get("/activities-all-parents", tags=["activities"], description="Get all activities with parent details", summary="Retrieve activities for parent", responses=FIELDS_RESPONSES)
+def get_all_activities_with_parents(parent_code:str = Query(..., description="Parent permission code"), fields: Optional[str] = FIELDS_QUERY, db=Depends(DB.get_db))->Dict[str, List[Union[ActivityBase, dict]]]:
+    columns = ACTIVITY_LIST_FIELDS.select(ACTIVITY_LIST_FIELDS.parse(fields))
+    require_usable_code(db, parent_code)
     cursor = db.cursor()
     cursor.execute(
-        "SELECT activity_id, activity_name, date_start, date_end, drivers, description, groups, requires_permission FROM activities WHERE activity_id IN (SELECT activity_id FROM permission_given WHERE permission_code = ?)", (parent_code,)
+        f"SELECT {columns} FROM activities WHERE activity_id IN (SELECT activity_id FROM permission_given WHERE permission_code = ?)", (parent_code,)
     )
-    rows = cursor.fetchall()
-    activities = []
-    for row in rows:
-        activities.append(ActivityBase(**row))
-    return {"activities": activities}
+    activities = decode_rows(cursor.fetchall(), json_columns=("drivers", "groups"), bool_columns=("requires_permission",),
+                             datetime_columns=ACTIVITY_DATETIME_COLUMNS)
+    return FastJSONResponse({"activities": activities})
 
 
-@app.get("/activities-all", tags=["activities"], description="Get all activities", summary="Retrieve all activities")
-def get_all_activities(include_past: bool = Query(False, description="Include past activities"), db=Depends(DB.get_db) )->Dict[str, List[ActivityBase]]:
+@app.get("/activities-all", tags=["activities"], description="Get all activities", summary="Retrieve all activities", responses=FIELDS_RESPONSES)
+def get_all_activities(include_past: bool = Query(False, description="Include past activities"), fields: Optional[str] = FIELDS_QUERY, db=Depends(DB.get_db) )->Dict[str, List[Union[ActivityBase, dict]]]:
+    columns = ACTIVITY_LIST_FIELDS.select(ACTIVITY_LIST_FIELDS.parse(fields))
     cursor = db.cursor()
     if include_past:
-        cursor.execute("SELECT activity_id, activity_name, date_start, date_end, drivers, description, groups FROM activities")
+        cursor.execute(f"SELECT {columns} FROM activities")
     else:
-        cursor.execute("SELECT activity_id, activity_name, date_start, date_end, drivers, description, groups FROM activities WHERE date_end >= date('now')")
-    rows = cursor.fetchall()
-    activities = []
-    for row in rows:
-        activities.append(ActivityBase(**row))
-    return {"activities": activities}
+        cursor.execute(f"SELECT {columns} FROM activities WHERE date_end >= date('now')")
+    activities = decode_rows(cursor.fetchall(), json_columns=("drivers", "groups"), bool_columns=("requires_permission",),
+                             datetime_columns=ACTIVITY_DATETIME_COLUMNS)
+    return FastJSONResponse({"activities": activities})
 
 
 @app.get("/activities-pending-approval", tags=["activities"], description="Get all activities pending approval", summary="Retrieve pending activity approvals")
 def get_activities_pending_approval(db=Depends(DB.get_db))->List[ActivityApprovals]:
     cursor = db.cursor()
-    cursor.execute("SELECT activity_id, activity_name, date_start, date_end, bishop_approval INTEGER, bishop_approval_date, stake_approval, stake_approval_date, groups, requires_permission FROM activities WHERE requires_permission == 1 AND (bishop_approval IS NULL OR stake_approval IS NULL) AND start_time >= date('now')")
+    cursor.execute("SELECT activity_id, activity_name, date_start, date_end, bishop_approval, bishop_approval_date, stake_approval, stake_approval_date, groups, participants_youth_ids, requires_permission FROM activities WHERE requires_permission == 1 AND (bishop_approval IS NULL OR stake_approval IS NULL) AND date_start >= date('now')")
     rows = cursor.fetchall()
+    # Every pending activity's grants in one query (idx uq_permission_given_activity_youth), grouped here
+    granted: dict[str, set[str]] = {}
+    cursor.execute(
+        "SELECT activity_id, youth_id FROM permission_given WHERE activity_id IN (SELECT value FROM json_each(?))",
+        (json.dumps([row["activity_id"] for row in rows]),),
+    )
+    for pg_row in cursor.fetchall():
+        granted.setdefault(pg_row["activity_id"], set()).add(pg_row["youth_id"])
     activities = []
     for row in rows:
-        #TODO fetch youth with permission for each activity to set total youth and total permissions
-        cursor.execute("SELECT * FROM permission_given WHERE activity_id = ?", (row["activity_id"],)) # TODO change so it combines all youth and those with permission
+        participants = json.loads(row["participants_youth_ids"]) if row["participants_youth_ids"] else []
+        with_permission = granted.get(row["activity_id"], set())
         act = ActivityApprovals(
             activity_id=row["activity_id"],
             activity_name=row["activity_name"],
-            date_start=row["date_start"],
+            activity_start=row["date_start"],
             bishop_approval=bool(row["bishop_approval"]) if row["bishop_approval"] is not None else None,
             bishop_approval_date=row["bishop_approval_date"],
             stake_approval=bool(row["stake_approval"]) if row["stake_approval"] is not None else None,
             stake_approval_date=row["stake_approval_date"],
-            groups=row["groups"],
-            total_youth=1,
-            total_youth_permission=1,
-            youth_approvals=[PermissionGiven(**pg_row) for pg_row in cursor.fetchall()]  # TODO show dict of all youth and if have permission
+            groups=json.loads(row["groups"]) if row["groups"] else [],
+            total_youth=len(participants),
+            total_youth_permission=len(with_permission),
+            youth_approvals=[{"youth_id": youth_id, "has_permission": youth_id in with_permission} for youth_id in participants]
         )
         activities.append(act)
     return activities
+
+
+LIVE_EVENT_ROLES = {"advisor", "president", "bishop", "admin", "ecc_admin"}
+
+
+def live_event_stream(request: Request, activity_id: str | None, group: str | None, last_event_id: Optional[int]) -> StreamingResponse:
+    if LIVE_EVENTS is None:
+        raise HTTPException(status_code=503, detail="Live events are not available on this server.")
+    # A reconnecting EventSource sends the id of the last event it saw in the Last-Event-ID header
+    header = request.headers.get("last-event-id")
+    if header and header.isdigit():
+        last_event_id = int(header)
+    return StreamingResponse(
+        LIVE_EVENTS.stream(activity_id=activity_id, group=group, last_event_id=last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/events/activities/{activity_id}", tags=["activities", "live"], description="Server-Sent Events stream of permission grants, approvals and roster changes for one activity", summary="Live activity permission status")
+def stream_activity_events(
+    request: Request,
+    activity_id: ActivityId,
+    last_event_id: Optional[int] = Query(None, ge=0, description="Resume after this event id (the Last-Event-ID header takes precedence)"),
+    user=Depends(require_role_or_query_token(LIVE_EVENT_ROLES)),
+):
+    return live_event_stream(request, activity_id, None, last_event_id)
+
+
+@app.get("/events/groups/{group}", tags=["activities", "live"], description="Server-Sent Events stream of permission grants, approvals, roster and membership changes for one group", summary="Live group permission status")
+def stream_group_events(
+    request: Request,
+    group: str,
+    last_event_id: Optional[int] = Query(None, ge=0, description="Resume after this event id (the Last-Event-ID header takes precedence)"),
+    user=Depends(require_role_or_query_token(LIVE_EVENT_ROLES)),
+):
+    return live_event_stream(request, None, group, last_event_id)
+
+
+# Read routes POST /batch may run; each keeps the roles of its own require_role.  Routes that write,
+# commit or audit do not belong here: a batch runs inside one read transaction that is rolled back.
+BATCH_ROUTES = (
+    "/activities-all",
+    "/activities-pending-approval",
+    "/activity-groups",
+    "/interest-survey/{group}",
+    "/group-concerns/{group}",
+    "/search",
+)
+BATCH = BatchRouter(app, BATCH_ROUTES, DB.get_db)
+
+
+@app.post("/batch", tags=["batch"], description="Run several whitelisted read requests in one round trip, on one connection and one consistent snapshot", summary="Batch read requests")
+async def batch_reads(
+    request: Request,
+    batch: BatchRequest,
+    db=Depends(DB.get_db),
+    user=Depends(require_role({"advisor", "president", "bishop", "admin", "ecc_admin"})),
+):
+    return FastJSONResponse({"responses": await BATCH.run(request, db, user, batch.requests)})
         
     
 
-
 ####################################
 ## Ecclesiastical Activity Endpoints
 ####################################
@@ -945,6 +1529,7 @@ def approve_activity_permission_ecclesiastical(
         cursor.execute("UPDATE activities SET stake_approval = 1, stake_approval_date = datetime('now') WHERE activity_id = ?", (activity_id,))
     db.commit()
     if cursor.rowcount > 0:
+        publish_live_events()
         return {"message": "Activity approved successfully."}
     else:
         return {"message": "Activity not found."}   
@@ -1039,7 +1624,7 @@ def generate_qr(acivity_id: str = Query(..., description="The ID of the activity
 
 
 @app.get("/activity-calendar",tags=["tools","activities"], description="Generate calendar invite for activity event", summary="Generate calendar invite for the activity")
-def invite(activity_id: str = Query(..., description="The ID of the activity"), db=Depends(DB.get_db)):
+def invite(activity_id: ActivityId, db=Depends(DB.get_db)):
     cursor = db.cursor()
     cursor.execute(
         "SELECT  activity_name, date_start, date_end, drivers, description, groups FROM activities WHERE activity_id = ?", (activity_id,)    
@@ -1051,11 +1636,11 @@ def invite(activity_id: str = Query(..., description="The ID of the activity"),
     dt_start = datetime.fromisoformat(activity_data.date_start)
     dt_end = datetime.fromisoformat(activity_data.date_end)
 
-    cal = Calendar()
+    cal = icalendar.Calendar()
     cal.add("prodid", "-//Your App//youth-permission//EN")
     cal.add("version", "2.0")
 
-    evt = Event()
+    evt = icalendar.Event()
     evt.add("uid", str(uuid.uuid4()))
     evt.add("dtstamp", datetime.utcnow())
     evt.add("dtstart", dt_start)
@@ -1064,7 +1649,7 @@ def invite(activity_id: str = Query(..., description="The ID of the activity"),
     if activity_data.description:
         evt.add("description", activity_data.description)
     if activity_data.groups:
-        evt.add("location", vText(activity_data.groups))
+        evt.add("location", icalendar.vText(activity_data.groups))
     cal.add_component(evt)
     ics_bytes = cal.to_ical()
 
@@ -1124,21 +1709,32 @@ async def reconcile_activities(data:FullActivity, db=Depends(DB.get_db)):
         return {"message": "Activity not found."}
 
 
-@app.get("/activities/reconcile/{activity_id}", tags=["activities"], description="Get activity for reconciliation by ID", summary="Retrieve activity for reconciliation")
-def get_activity_for_reconciliation(activity_id: str, db=Depends(DB.get_db))->FullActivity:
+# `fields=` on GET /activities/reconcile/{activity_id}
+RECONCILE_FIELDS = FieldSet(FullActivity, FullActivity.model_fields, always=("activity_id",))
+
+
+@app.get("/activities/reconcile/{activity_id}", tags=["activities"], description="Get activity for reconciliation by ID", summary="Retrieve activity for reconciliation", responses=FIELDS_RESPONSES)
+def get_activity_for_reconciliation(activity_id: ActivityId, fields: Optional[str] = FIELDS_QUERY, db=Depends(DB.get_db))->Union[FullActivity, dict]:
+    selected = RECONCILE_FIELDS.parse(fields)
     cursor = db.cursor()
     cursor.execute(
-        "SELECT * FROM activities WHERE activity_id = ?", (activity_id,)
+        f"SELECT {RECONCILE_FIELDS.select(selected)} FROM activities WHERE activity_id = ?", (activity_id,)
     )
     row = cursor.fetchone()
     if not row:
         return Response(content="Activity not found.", status_code=404)
-    activity_data = FullActivity(**row)
-    return activity_data
+    values = decode_rows(
+        [row],
+        json_columns=("budget", "participants_youth_ids", "groups", "drivers"),
+        bool_columns=("is_overnight", "is_coed", "bishop_approval", "stake_approval"),
+    )[0]
+    if fields is None:
+        return FullActivity(**values)
+    return FastJSONResponse(RECONCILE_FIELDS.model(selected).model_validate(values).model_dump(mode="json"))
 
 
 @app.put("/activities/reconcile/{activity_id}", tags=["activities"], description="Update activity for reconciliation by ID", summary="Update reconciled activity")
-def update_activity_for_reconciliation(activity_id: str, data: FullActivity, db=Depends(DB.get_db)):
+def update_activity_for_reconciliation(activity_id: ActivityId, data: FullActivity, db=Depends(DB.get_db)):
     cursor = db.cursor()
 
     # Serialize complex fields as JSON
@@ -1190,9 +1786,10 @@ def update_activity_for_reconciliation(activity_id: str, data: FullActivity, db=
 def set_personal_goal(data: PersonalGoal, db=Depends(DB.get_db), user=Depends(require_role("youth"))):
     cursor = db.cursor()
     cursor.execute(
-        """INSERT INTO personal_goals (youth_id, goal_area, goal_name, goal_description,  target_date, status, progress_notes, visibility_level)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        """INSERT INTO personal_goals (goal_id, youth_id, goal_area, goal_name, goal_description,  target_date, status, progress_notes, visibility_level, org_group)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, (SELECT json_extract(youth, '$.org_group') FROM youth_medical WHERE youth_id = ?)))""",
         (
+            new_id(),
             data.youth_id,
             data.goal_area,
             data.goal_name,
@@ -1200,14 +1797,16 @@ def set_personal_goal(data: PersonalGoal, db=Depends(DB.get_db), user=Depends(re
             data.target_date,
             data.status,
             json.dumps(data.progress_notes) if data.progress_notes else None,
-            data.visibility_level
+            data.visibility_level,
+            data.org_group or user.get("org_group"),
+            data.youth_id,
         )
     )
     db.commit()
     return {"message": "Personal goal set successfully."}
 
 @app.get("/goals/{youth_id}", tags=["goals"], description="Get personal goals for youth", summary="Retrieve youth personal goals")
-def get_personal_goals(youth_id: str, db=Depends(DB.get_db), user=Depends(require_role("youth")))->List[PersonalGoal]:
+def get_personal_goals(youth_id: YouthId, db=Depends(DB.get_db), user=Depends(require_role("youth")))->List[PersonalGoal]:
     cursor = db.cursor()
     cursor.execute(
         "SELECT youth_id, goal_area, goal_name, goal_description, target_date, status, progress_notes, completed, visibility_level FROM personal_goals WHERE youth_id = ? group by goal_area", (youth_id,)
@@ -1232,7 +1831,7 @@ def get_personal_goals(youth_id: str, db=Depends(DB.get_db), user=Depends(requir
 
 
 @app.put("/goals/{youth_id}/{goal_name}", tags=["goals"], description="Update personal goal for youth", summary="Update personal goal")
-def update_personal_goal(youth_id: str, goal_name: str, data: PersonalGoal, db=Depends(DB.get_db), user=Depends(require_role("youth"))):
+def update_personal_goal(youth_id: YouthId, goal_name: str, data: PersonalGoal, db=Depends(DB.get_db), user=Depends(require_role("youth"))):
     cursor = db.cursor()
     cursor.execute(
         """UPDATE personal_goals 
@@ -1245,9 +1844,9 @@ def update_personal_goal(youth_id: str, goal_name: str, data: PersonalGoal, db=D
             data.status,
             json.dumps(data.progress_notes) if data.progress_notes else None,
             1 if data.completed else 0,
+            data.visibility_level,
             youth_id,
             goal_name,
-            data.visibility_level
         )
     )
     db.commit()
@@ -1257,37 +1856,83 @@ def update_personal_goal(youth_id: str, goal_name: str, data: PersonalGoal, db=D
         return {"message": "Personal goal not found."}
 
 
-@app.get("/goal-view", tags=["goals"], description="View goals", summary="Allows viewing of goals based on visibility level")
-def view_youth_goals(db=Depends(DB.get_db), user=Depends(require_role("all")))->List[PersonalGoal]:
-    cursor = db.cursor()
-    if user.role =="ecc_admin":
-        where_clause = " WHERE visibility_level IN ('public','ecclesiastical') "
-    elif user.role =="advisor":
-        where_clause = " WHERE visibility_level IN ('public','advisor') "
-    elif user.role == "youth": #TODO change so only show goals of same group
-        where_clause = " WHERE visibility_level IN ('public','group') AND group_"
-    elif user.role == "parent":
-        where_clause = " WHERE visibility_level IN ('public','parent') AND youth_id IN (SELECT youth_id FROM youth_parent WHERE parent_code = ? )"
-    cursor.execute(
-        "SELECT youth_id, goal_area, goal_name, goal_description, target_date, status, progress_notes, completed, visibility_level FROM personal_goals GROUP BY goal_area " + where_clause
-    )
-    rows = cursor.fetchall()
-    goals = []
-    for row in rows:
-        progress_notes = json.loads(row["progress_notes"]) if row["progress_notes"] else None
-        goal = PersonalGoal(
-            youth_id=row["youth_id"],
-            goal_area=row["goal_area"],
-            goal_name=row["goal_name"],
-            goal_description=row["goal_description"],
-            target_date=row["target_date"],
-            status=row["status"],
-            progress_notes=progress_notes,
-            completed=bool(row["completed"]),
-            visibility_level=row["visibility_level"]
-        )
-        goals.append(goal)
-    return goals
+@app.get("/goal-view", tags=["goals"], description="View goals grouped by group, then youth, then goal area", summary="Allows viewing of goals based on visibility level")
+def view_youth_goals(
+    org_group: Optional[str] = Query(None, description="Only show goals of this group"),
+    goal_area: Optional[str] = Query(None, description="Only show goals in this area"),
+    db=Depends(DB.get_db),
+    user=Depends(require_role({"youth", "parent", "advisor", "president", "bishop", "admin", "ecc_admin"})),
+)->Dict[str, Dict[str, Dict[str, List[PersonalGoal]]]]:
+    return FastJSONResponse(GoalViewQuery(db).grouped(user, org_group=org_group, goal_area=goal_area))
+
+
+#######################################
+##### Search
+#######################################
+@app.get("/search", tags=["search"], description="Full-text search over activities, reconciliation notes and goals", summary="Search activities and goals")
+def search(
+    q: str = Query(..., min_length=2, description="Search terms, e.g. 'temple trip'"),
+    kind: Optional[Literal["activities", "goals"]] = Query(None, description="Restrict the search to one index"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results"),
+    db=Depends(DB.get_db),
+    user=Depends(require_role({"advisor", "admin", "ecc_admin", "president", "bishop", "youth"})),
+)->List[SearchResult]:
+    kinds = (kind,) if kind else ("activities", "goals")
+    return SearchEngine(db).search(q, user, kinds=kinds, limit=limit)
+
+
+#######################################
+##### Stake reports
+#######################################
+def _unit_activity_summary(db) -> dict[str, int]:
+    row = db.execute(
+        """
+        SELECT
+            (SELECT COUNT(*) FROM youth_medical) AS youth,
+            (SELECT COUNT(*) FROM activities WHERE date_end >= date('now')) AS upcoming_activities,
+            (SELECT COUNT(*) FROM activities WHERE date_end >= date('now') AND requires_permission = 1) AS upcoming_needing_permission,
+            (SELECT COUNT(*) FROM permission_given WHERE created_at >= date('now', '-30 days')) AS permissions_last_30_days
+        """
+    ).fetchone()
+    return dict(row)
+
+
+@app.get("/stake-reports/activity-summary", tags=["reports"], description="Per-unit activity and permission counts across a stake", summary="Stake-wide activity summary")
+def stake_activity_summary(
+    stake: Optional[str] = Query(None, description="Stake to report on (admins only; defaults to your own stake)"),
+    user=Depends(require_role(STAKE_ROLES)),
+)->Dict[str, Dict[str, int]]:
+    # Fans out over every unit's database in parallel when sharded
+    stake_id = stake if stake and user.get("role") == "admin" else user.get("stake")
+    return DB.fan_out(_unit_activity_summary, stake_id=stake_id)
+
+
+#######################################
+##### Archive
+#######################################
+@app.get("/archive/{table}", tags=["archive"], description="Search rows that retention moved out of the hot tables", summary="Search archived rows")
+def search_archive(
+    table: Literal["audit_log", "visits", "activities", "permission_given"] = Path(..., description="Archived table"),
+    since: Optional[str] = Query(None, description="Inclusive lower bound on the table's timestamp, e.g. 2024-01-01"),
+    until: Optional[str] = Query(None, description="Exclusive upper bound on the table's timestamp"),
+    q: Optional[str] = Query(None, min_length=2, description="Substring matched against the table's text columns"),
+    where: List[str] = Query([], description="Exact column matches, e.g. where=youth_id:abc123"),
+    before_id: Optional[int] = Query(None, description="Only rows with a smaller id (pagination)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of rows"),
+    user=Depends(require_role({"admin"})),
+)->List[Dict[str, Any]]:
+    filters = {}
+    for item in where:
+        column, sep, value = item.partition(":")
+        if not sep:
+            raise HTTPException(status_code=400, detail=f"Invalid filter '{item}', expected column:value")
+        filters[column] = value
+    try:
+        rows = ArchiveQuery(ARCHIVE_DB_PATH).search(table, since=since, until=until, q=q, filters=filters, before_id=before_id, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(rows)
+
 
 # if __name__ == "__main__":
 # 	import uvicorn
@@ -0,0 +1,197 @@
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from time import perf_counter
+from typing import Callable
+
+from db import QueryStats, current_query_stats
+from traffic_capture import route_template
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram upper bounds (Prometheus convention: seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class RouteSeries:
+    """Preallocated counters for one (method, route) pair; recording only increments existing slots"""
+    __slots__ = ("latency", "latency_sum", "count", "queries", "queries_total", "db_seconds")
+
+    def __init__(self):
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.queries = [0] * (len(QUERY_COUNT_BUCKETS) + 1)
+        self.queries_total = 0
+        self.db_seconds = 0.0
+
+
+class MetricsShard:
+    """Counters written by a single thread; the scrape merges all shards"""
+    __slots__ = ("routes", "statuses", "in_flight")
+
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteSeries] = {}
+        self.statuses: dict[tuple[str, str, int], int] = {}
+        self.in_flight = 0
+
+
+class MetricsRegistry:
+    """
+    Request metrics kept in per-thread shards so recording never takes a lock.
+    The only lock guards the shard list, and is taken once per thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: list[MetricsShard] = []
+        self._lock = threading.Lock()
+        self._collectors: list[Callable[[], list[str]]] = []
+
+    def register_collector(self, collector: Callable[[], list[str]]) -> None:
+        """Add a callable returning extra exposition lines (e.g. WAL size) to every scrape"""
+        self._collectors.append(collector)
+
+    def shard(self) -> MetricsShard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = MetricsShard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, shard: MetricsShard, method: str, route: str, status: int, seconds: float, stats: QueryStats) -> None:
+        """
+        Record one finished request.
+        Args:
+            shard (MetricsShard): The calling thread's shard
+            method (str): HTTP method
+            route (str): Route template, never the raw path
+            status (int): Response status code
+            seconds (float): Request latency
+            stats (QueryStats): Queries made while handling the request
+        """
+        key = (method, route)
+        series = shard.routes.get(key)
+        if series is None:
+            series = shard.routes[key] = RouteSeries()
+        series.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series.latency_sum += seconds
+        series.count += 1
+        series.queries[bisect_left(QUERY_COUNT_BUCKETS, stats.queries)] += 1
+        series.queries_total += stats.queries
+        series.db_seconds += stats.seconds
+        status_key = (method, route, status)
+        shard.statuses[status_key] = shard.statuses.get(status_key, 0) + 1
+
+    def _merged(self) -> tuple[dict, dict, int]:
+        with self._lock:
+            shards = list(self._shards)
+        routes: dict[tuple[str, str], RouteSeries] = {}
+        statuses: dict[tuple[str, str, int], int] = {}
+        in_flight = 0
+        for shard in shards:
+            in_flight += shard.in_flight
+            # dict.copy() is atomic, so a concurrent insert cannot break the iteration
+            for key, series in shard.routes.copy().items():
+                total = routes.get(key)
+                if total is None:
+                    total = routes[key] = RouteSeries()
+                total.latency = [a + b for a, b in zip(total.latency, series.latency)]
+                total.latency_sum += series.latency_sum
+                total.count += series.count
+                total.queries = [a + b for a, b in zip(total.queries, series.queries)]
+                total.queries_total += series.queries_total
+                total.db_seconds += series.db_seconds
+            for key, count in shard.statuses.copy().items():
+                statuses[key] = statuses.get(key, 0) + count
+        return routes, statuses, in_flight
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        routes, statuses, in_flight = self._merged()
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), series in sorted(routes.items()):
+            lines.extend(_histogram("http_request_duration_seconds", _labels(method, route), LATENCY_BUCKETS, series.latency, series.latency_sum))
+        lines += ["# HELP http_requests_total Finished requests by route template and status code.", "# TYPE http_requests_total counter"]
+        for (method, route, status), count in sorted(statuses.items()):
+            lines.append(f'http_requests_total{{{_labels(method, route)},status="{status}"}} {count}')
+        lines += ["# HELP http_requests_in_flight Requests currently being handled.", "# TYPE http_requests_in_flight gauge",
+                  f"http_requests_in_flight {in_flight}"]
+        lines += ["# HELP http_request_db_queries Database queries made per request.", "# TYPE http_request_db_queries histogram"]
+        for (method, route), series in sorted(routes.items()):
+            lines.extend(_histogram("http_request_db_queries", _labels(method, route), QUERY_COUNT_BUCKETS, series.queries, series.queries_total))
+        lines += ["# HELP http_request_db_seconds_total Time spent executing and fetching database queries.", "# TYPE http_request_db_seconds_total counter"]
+        for (method, route), series in sorted(routes.items()):
+            lines.append(f"http_request_db_seconds_total{{{_labels(method, route)}}} {series.db_seconds:.6f}")
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method: str, route: str) -> str:
+    return f'method="{method}",route="{_escape(route)}"'
+
+
+def _histogram(name: str, labels: str, bounds: tuple, counts: list[int], total: float) -> list[str]:
+    lines, cumulative = [], 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    cumulative += counts[-1]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {round(total, 6)}")
+    lines.append(f"{name}_count{{{labels}}} {cumulative}")
+    return lines
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and database usage per route template.
+    It also sets the request's QueryStats, which TimedCursor (db.py) adds to from any thread
+    the endpoint runs in.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry | None = None):
+        self.app = app
+        self.registry = registry or get_metrics()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        shard = self.registry.shard()
+        shard.in_flight += 1
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        status = 500
+        start = perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            current_query_stats.reset(token)
+            shard.in_flight -= 1
+            self.registry.observe(shard, scope["method"], route_template(scope), status, elapsed, stats)
+
+
+@lru_cache(maxsize=1)
+def get_metrics() -> MetricsRegistry:
+    """Process-wide metrics registry"""
+    return MetricsRegistry()
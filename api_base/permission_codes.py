@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from math import isqrt
+from typing import Iterable
+
+from schema import ParentGuardian
+
+CODE_DIGITS = 6
+CODE_SPACE = 10 ** CODE_DIGITS
+
+ALLOCATOR_DDL = """
+    CREATE TABLE IF NOT EXISTS permission_code_allocator (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        feistel_key BLOB NOT NULL,
+        next_index INTEGER NOT NULL
+    );
+"""
+
+
+class FeistelPermutation:
+    """
+    Keyed bijection on range(domain): a balanced Feistel network over [0, m*m) with m = ceil(sqrt(domain)),
+    cycle-walking any output that lands outside the domain.  Walking index 0, 1, 2, ... through it yields every
+    code exactly once in an order that cannot be guessed without the key, at a constant cost per code
+    (for 10**6 codes m*m == domain, so there is nothing to walk).
+    """
+
+    def __init__(self, key: bytes, domain: int = CODE_SPACE, rounds: int = 4):
+        self.key = key
+        self.domain = domain
+        self.rounds = rounds
+        self.m = isqrt(domain - 1) + 1
+
+    def _round(self, r: int, value: int) -> int:
+        digest = hashlib.blake2b(f"{r}:{value}".encode(), key=self.key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.m
+
+    def _encrypt(self, x: int) -> int:
+        left, right = divmod(x, self.m)
+        for r in range(self.rounds):
+            left, right = right, (left + self._round(r, right)) % self.m
+        return left * self.m + right
+
+    def __call__(self, index: int) -> int:
+        if not 0 <= index < self.domain:
+            raise ValueError(f"Index {index} is outside the code space")
+        value = self._encrypt(index)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """
+    permission_codes maps every code (PRIMARY KEY, so lookups and uniqueness checks are one index probe) to its
+    household; the allocator row holds the permutation key and how far into it codes have been issued.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS permission_codes (
+            code TEXT PRIMARY KEY,
+            household_id TEXT,
+            status TEXT NOT NULL DEFAULT 'active',   -- active | retired
+            source TEXT NOT NULL DEFAULT 'issued',   -- issued | client (typed in on a form before codes were issued)
+            issued_at TEXT NOT NULL DEFAULT (datetime('now')),
+            expires_at TEXT,
+            replaced_by TEXT
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_permission_codes_household ON permission_codes(household_id);")
+    conn.execute(ALLOCATOR_DDL)
+    conn.execute("INSERT OR IGNORE INTO permission_code_allocator (id, feistel_key, next_index) VALUES (1, randomblob(16), 0);")
+
+
+def household_key(parent: ParentGuardian) -> str:
+    """Siblings share a code: their household is the parent's email, or phone digits when there is no email"""
+    if parent.email and parent.email.strip():
+        return parent.email.strip().lower()
+    return "tel:" + "".join(c for c in parent.phone if c.isdigit())
+
+
+def reserve_indexes(conn: sqlite3.Connection, count: int) -> tuple[bytes, int]:
+    """
+    Claim the next `count` positions of the permutation; returns (key, first index).
+    Runs inside the caller's write transaction, so concurrent allocators never get the same range.
+    """
+    row = conn.execute(
+        "UPDATE permission_code_allocator SET next_index = next_index + ? WHERE id = 1 AND next_index + ? <= ? "
+        "RETURNING feistel_key, next_index - ?",
+        (count, count, CODE_SPACE, count),
+    ).fetchone()
+    if row is None:
+        raise RuntimeError("Permission code space is exhausted; retire codes or move to longer codes")
+    return bytes(row[0]), row[1]
+
+
+class PermissionCodeAllocator:
+    """
+    Issues unique 6 digit permission codes.
+
+    Codes come from a keyed permutation of the code space, so issuing one is a counter bump plus a few keyed hashes
+    regardless of how many codes exist, and a code is never handed out twice.  The only codes the permutation
+    can run into are ones that parents typed in themselves before codes were issued (source 'client'); those
+    are skipped with one indexed lookup per batch, and since there are at most a few thousand of them the
+    cost per code stays constant as the space fills up.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def _reserve(self, count: int) -> tuple[bytes, int]:
+        return reserve_indexes(self.conn, count)
+
+    def _taken(self, codes: list[str]) -> set[str]:
+        rows = self.conn.execute(
+            "SELECT code FROM permission_codes WHERE code IN (SELECT value FROM json_each(?))", (json.dumps(codes),)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def claim_client_code(self, code: str) -> bool:
+        """Reserve a code a parent typed in for this database; False when another database already owns it"""
+        return True
+
+    def issue(self, count: int, household_ids: Iterable[str | None] | None = None, expires_at: str | None = None) -> list[str]:
+        """
+        Issue `count` new codes inside the caller's transaction (call after BEGIN IMMEDIATE, commit afterwards).
+        Args:
+            count (int): Number of codes
+            household_ids (Iterable): Household of each code, in order (default: none yet)
+            expires_at (str): UTC 'YYYY-MM-DD HH:MM:SS' after which the codes stop working (default: never)
+        """
+        households = list(household_ids) if household_ids is not None else [None] * count
+        if len(households) != count:
+            raise ValueError("household_ids must have one entry per code")
+        codes: list[str] = []
+        while len(codes) < count:
+            needed = count - len(codes)
+            key, start = self._reserve(needed)
+            permutation = FeistelPermutation(key)
+            candidates = [f"{permutation(i):0{CODE_DIGITS}d}" for i in range(start, start + needed)]
+            taken = self._taken(candidates)
+            codes += [code for code in candidates if code not in taken]
+        self.conn.executemany(
+            "INSERT INTO permission_codes (code, household_id, expires_at) VALUES (?, ?, ?)",
+            [(code, household, expires_at) for code, household in zip(codes, households)],
+        )
+        return codes
+
+    def for_household(self, household_id: str, expires_at: str | None = None) -> str:
+        """
+        The household's active code, issuing one if it has none.  When its codes have expired, the latest is
+        rotated (and any older expired ones retired into the same new code), so siblings registered earlier and
+        their grants move to the code the new youth gets instead of staying on a code that no longer works.
+        """
+        rows = self.conn.execute(
+            "SELECT code, expires_at IS NOT NULL AND expires_at <= datetime('now') FROM permission_codes "
+            "WHERE household_id = ? AND status = 'active' ORDER BY issued_at DESC",
+            (household_id,),
+        ).fetchall()
+        usable = [code for code, expired in rows if not expired]
+        if usable:
+            return usable[0]
+        if not rows:
+            return self.issue(1, [household_id], expires_at)[0]
+        new_code = self.rotate(rows[0][0], expires_at)
+        for code, _ in rows[1:]:
+            self._replace(code, new_code)
+        return new_code
+
+    def rotate(self, code: str, expires_at: str | None = None) -> str:
+        """
+        Replace a code (e.g. one that was shared too widely): the household's youth and past grants move to a new
+        code and the old one is retired.  Runs inside the caller's transaction.
+        """
+        row = self.conn.execute("SELECT household_id, status FROM permission_codes WHERE code = ?", (code,)).fetchone()
+        if row is None or row[1] != "active":
+            raise KeyError(code)
+        new_code = self.issue(1, [row[0]], expires_at)[0]
+        self._replace(code, new_code)
+        return new_code
+
+    def _replace(self, code: str, new_code: str) -> None:
+        """Retire `code` in favour of `new_code`, moving its youth and grants"""
+        self.conn.execute("UPDATE permission_codes SET status = 'retired', replaced_by = ? WHERE code = ?", (new_code, code))
+        self.conn.execute("UPDATE youth_medical SET permission_code = ? WHERE permission_code = ?", (new_code, code))
+        self.conn.execute("UPDATE permission_given SET permission_code = ? WHERE permission_code = ?", (new_code, code))
+
+
+def register_client_code(conn: sqlite3.Connection, code: str, household_id: str | None) -> bool:
+    """
+    Record a code a parent typed in, so the allocator never issues it to another household.
+
+    Returns False, recording nothing, when the code already belongs to a different household.
+    """
+    row = conn.execute("SELECT household_id FROM permission_codes WHERE code = ?", (code,)).fetchone()
+    if row is None:
+        conn.execute("INSERT INTO permission_codes (code, household_id, source) VALUES (?, ?, 'client')", (code, household_id))
+        return True
+    if row[0] is None:
+        conn.execute("UPDATE permission_codes SET household_id = ? WHERE code = ?", (household_id, code))
+        return True
+    return household_id is None or row[0] == household_id
+
+
+def code_state(conn: sqlite3.Connection, code: str) -> str | None:
+    """'active', 'expired' or 'retired'; None for a code this database has never seen"""
+    row = conn.execute(
+        "SELECT CASE WHEN status != 'active' THEN status WHEN expires_at <= datetime('now') THEN 'expired' ELSE 'active' END "
+        "FROM permission_codes WHERE code = ?",
+        (code,),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def backfill_client_codes(conn: sqlite3.Connection) -> int:
+    """Register the codes already on youth_medical rows, with the household of their first youth"""
+    rows = conn.execute(
+        "SELECT permission_code, parent_guardian, MIN(created_at) FROM youth_medical GROUP BY permission_code"
+    ).fetchall()
+    cursor = conn.executemany(
+        "INSERT OR IGNORE INTO permission_codes (code, household_id, source, issued_at) VALUES (?, ?, 'client', ?)",
+        [(code, household_key(ParentGuardian.model_validate_json(parent)), created_at) for code, parent, created_at in rows],
+    )
+    return cursor.rowcount
+
+
+def code_ttl_days_from_env() -> float | None:
+    """PERMISSION_CODE_TTL_DAYS: lifetime of newly issued codes (default: they do not expire)"""
+    value = os.getenv("PERMISSION_CODE_TTL_DAYS", "")
+    return float(value) if value else None
+
+
+def expiry_from_ttl(ttl_days: float | None) -> str | None:
+    """expires_at for a code issued now, in SQLite's datetime('now') format; None when codes do not expire"""
+    if not ttl_days:
+        return None
+    return (datetime.now(timezone.utc) + timedelta(days=ttl_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Issue and rotate parent permission codes")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "/data/data.sqlite3"), help="Path to the SQLite database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    issue = sub.add_parser("issue", help="Issue new codes, one per line")
+    issue.add_argument("count", type=int)
+    issue.add_argument("--ttl-days", type=float, help="Days until the codes expire (default: PERMISSION_CODE_TTL_DAYS, or never)")
+    rotate = sub.add_parser("rotate", help="Replace a code and retire the old one")
+    rotate.add_argument("code")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=5.0)
+    conn.execute("BEGIN IMMEDIATE")
+    allocator = PermissionCodeAllocator(conn)
+    if args.command == "issue":
+        print("\n".join(allocator.issue(args.count, expires_at=expiry_from_ttl(args.ttl_days or code_ttl_days_from_env()))))
+    else:
+        print(allocator.rotate(args.code))
+    conn.commit()
+    conn.close()
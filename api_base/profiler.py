@@ -0,0 +1,209 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Any
+
+from db import QueryStats, current_query_stats
+from traffic_capture import route_template
+
+logger = logging.getLogger("query_profile")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """
+    Statement template used to group queries: literals become '?', IN lists collapse to one
+    placeholder and whitespace is squeezed.
+    Args:
+        sql (str): SQL text as executed
+    """
+    template = _STRING_LITERAL.sub("?", sql)
+    template = _NUMBER_LITERAL.sub("?", template)
+    template = _IN_LIST.sub("IN (?...)", template)
+    return _WHITESPACE.sub(" ", template).strip()
+
+
+def full_scans(plan: list[str]) -> list[str]:
+    """Tables read without any index ('SCAN <table>' with no USING clause)"""
+    return [step for step in plan if step.startswith("SCAN ") and " USING " not in step]
+
+
+class QueryRecord:
+    """One executed statement"""
+    __slots__ = ("template", "seconds", "rows", "plan")
+
+    def __init__(self, template: str, seconds: float, rows: int):
+        self.template = template
+        self.seconds = seconds
+        self.rows = rows
+        self.plan: list[str] | None = None
+
+
+class QueryProfile:
+    """
+    Statements executed while handling one request.
+    TimedCursor (db.py) calls record() after each execute and adds fetched rows to the returned record.
+    """
+
+    def __init__(self, repeat_threshold: int, slow_seconds: float, plans: dict[str, list[str]]):
+        self.records: list[QueryRecord] = []
+        self.repeat_threshold = repeat_threshold
+        self.slow_seconds = slow_seconds
+        self._plans = plans
+
+    def record(self, cursor: sqlite3.Cursor, sql: str, parameters: Any, seconds: float) -> QueryRecord:
+        record = QueryRecord(normalize_sql(sql), seconds, max(cursor.rowcount, 0))
+        if seconds >= self.slow_seconds:
+            record.plan = self._explain(cursor.connection, sql, parameters, record.template)
+        self.records.append(record)
+        return record
+
+    def _explain(self, conn: sqlite3.Connection, sql: str, parameters: Any, template: str) -> list[str]:
+        plan = self._plans.get(template)
+        if plan is not None:
+            return plan
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            # A plain sqlite3.Cursor, so the EXPLAIN itself is neither timed nor profiled
+            cursor = sqlite3.Connection.cursor(conn, sqlite3.Cursor)
+            plan = [row[3] for row in cursor.execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()]
+        except sqlite3.Error:
+            plan = []
+        self._plans[template] = plan
+        return plan
+
+    def findings(self) -> dict[str, Any]:
+        """Per-request summary: totals, repeated templates (likely N+1 loops), slow statements and full scans"""
+        counts: dict[str, int] = {}
+        for record in self.records:
+            counts[record.template] = counts.get(record.template, 0) + 1
+        slow = [r for r in self.records if r.plan is not None]
+        return {
+            "queries": len(self.records),
+            "db_ms": round(sum(r.seconds for r in self.records) * 1000, 3),
+            "repeated": {t: n for t, n in counts.items() if n > self.repeat_threshold},
+            "slow": [{"sql": r.template, "ms": round(r.seconds * 1000, 3), "rows": r.rows, "plan": r.plan} for r in slow],
+            "scans": sorted({scan for r in slow for scan in full_scans(r.plan)}),
+        }
+
+
+class ProfileReport:
+    """Process-wide aggregate of every profiled request, served by /debug/query-profile"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates: dict[str, dict[str, Any]] = {}
+        self._flagged: dict[str, dict[str, int]] = {}
+
+    def add(self, route: str, profile: QueryProfile, findings: dict[str, Any]) -> None:
+        with self._lock:
+            for record in profile.records:
+                stats = self._templates.get(record.template)
+                if stats is None:
+                    stats = self._templates[record.template] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "routes": set()}
+                ms = record.seconds * 1000
+                stats["count"] += 1
+                stats["total_ms"] += ms
+                stats["max_ms"] = max(stats["max_ms"], ms)
+                stats["rows"] += record.rows
+                stats["routes"].add(route)
+            if findings["repeated"] or findings["scans"]:
+                flagged = self._flagged.setdefault(route, {"n_plus_one": 0, "full_scan": 0})
+                flagged["n_plus_one"] += bool(findings["repeated"])
+                flagged["full_scan"] += bool(findings["scans"])
+
+    def summary(self, limit: int = 50) -> dict[str, Any]:
+        with self._lock:
+            templates = sorted(self._templates.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:limit]
+            return {
+                "flagged_routes": dict(self._flagged),
+                "templates": [
+                    {"sql": sql, "count": s["count"], "total_ms": round(s["total_ms"], 3), "max_ms": round(s["max_ms"], 3),
+                     "mean_rows": round(s["rows"] / s["count"], 1), "routes": sorted(s["routes"])}
+                    for sql, s in templates
+                ],
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._templates.clear()
+            self._flagged.clear()
+
+
+class QueryProfileMiddleware:
+    """
+    ASGI middleware that profiles the SQL of every request (opt-in, see profile_settings_from_env).
+    Findings go to the X-Query-Profile response header, the 'query_profile' logger when a request
+    repeats a statement or scans a table, and the process-wide ProfileReport.
+    """
+
+    def __init__(self, app, report: ProfileReport, repeat_threshold: int = 5, slow_ms: float = 25.0, header: bool = True):
+        self.app = app
+        self.report = report
+        self.repeat_threshold = repeat_threshold
+        self.slow_seconds = slow_ms / 1000
+        self.header = header
+        self._plans: dict[str, list[str]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(self.repeat_threshold, self.slow_seconds, self._plans)
+        stats = current_query_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+        stats.profile = profile
+
+        async def send_wrapper(message):
+            if self.header and message["type"] == "http.response.start":
+                f = profile.findings()
+                value = f"queries={f['queries']}; db_ms={f['db_ms']}; repeated={len(f['repeated'])}; slow={len(f['slow'])}; scans={len(f['scans'])}"
+                message["headers"] = [*message.get("headers", []), (b"x-query-profile", value.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stats.profile = None
+            if token is not None:
+                current_query_stats.reset(token)
+            route = route_template(scope)
+            findings = profile.findings()
+            self.report.add(route, profile, findings)
+            if findings["repeated"] or findings["scans"]:
+                logger.warning("%s %s: %d queries in %.1f ms; repeated %s; full scans %s",
+                               scope["method"], route, findings["queries"], findings["db_ms"], findings["repeated"], findings["scans"])
+
+
+def profile_settings_from_env() -> dict[str, Any] | None:
+    """
+    QUERY_PROFILE=1 enables profiling; QUERY_PROFILE_REPEAT (default 5), QUERY_PROFILE_SLOW_MS (default 25)
+    and QUERY_PROFILE_HEADER (default 1) tune it.  Returns None when profiling is off.
+    """
+    if os.getenv("QUERY_PROFILE", "").lower() not in ("1", "true", "yes"):
+        return None
+    return {
+        "repeat_threshold": int(os.getenv("QUERY_PROFILE_REPEAT", "5")),
+        "slow_ms": float(os.getenv("QUERY_PROFILE_SLOW_MS", "25")),
+        "header": os.getenv("QUERY_PROFILE_HEADER", "1").lower() in ("1", "true", "yes"),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_profile_report() -> ProfileReport:
+    """Process-wide profile report"""
+    return ProfileReport()
@@ -0,0 +1,424 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path as PathlibPath
+from typing import Any
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+logger = logging.getLogger("retention")
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Rows of `table` whose `time_column` is older than `keep_days` move to the archive database.
+    Args:
+        append_only (bool): Rows arrive in time order, so the old rows are always a prefix of the rowid
+            order and a batch is found without an index on `time_column`
+        children (tuple): (table, column) pairs whose rows move together with each parent row,
+            matched on the parent's value of the same column
+        search_columns (tuple): Text columns matched by the `q` filter of the archive query path
+    """
+    table: str
+    time_column: str
+    keep_days: int
+    append_only: bool = True
+    children: tuple[tuple[str, str], ...] = ()
+    search_columns: tuple[str, ...] = ()
+
+
+# Applied in this order: activities take their permissions with them before permission_given runs
+DEFAULT_POLICIES = (
+    # idx_audit_ts finds old audit rows directly, even when ts was back-filled out of order
+    RetentionPolicy("audit_log", "ts", 548, append_only=False, search_columns=("actor_username", "action", "resource_type", "resource_id", "details")),
+    RetentionPolicy("visits", "created_at", 90),
+    RetentionPolicy("activities", "date_end", 730, append_only=False, children=(("permission_given", "activity_id"),),
+                    search_columns=("activity_id", "activity_name", "description", "location")),
+    RetentionPolicy("permission_given", "created_at", 1095, search_columns=("youth_id", "activity_id", "permission_code")),
+)
+
+# Archive tables that only receive rows as children of another policy still get a time column for queries
+ARCHIVE_TIME_COLUMNS = {policy.table: policy.time_column for policy in DEFAULT_POLICIES}
+
+
+def policies_from_spec(spec: str | None) -> tuple[RetentionPolicy, ...]:
+    """Override keep_days per table, e.g. "audit_log=548,visits=30"; tables not listed keep their defaults"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        table, _, days = item.partition("=")
+        overrides[table.strip()] = int(days)
+    unknown = set(overrides) - set(ARCHIVE_TIME_COLUMNS)
+    if unknown:
+        raise ValueError(f"No retention policy for: {', '.join(sorted(unknown))}")
+    return tuple(
+        RetentionPolicy(**{**policy.__dict__, "keep_days": overrides.get(policy.table, policy.keep_days)})
+        for policy in DEFAULT_POLICIES
+    )
+
+
+def parse_quiet_hours(window: str) -> tuple[int, int]:
+    """"01:00-05:00" -> (60, 300) minutes after midnight; the window may wrap past midnight"""
+    start, _, end = window.partition("-")
+    minutes = []
+    for value in (start, end):
+        hours, _, mins = value.strip().partition(":")
+        minutes.append(int(hours) * 60 + int(mins or 0))
+    return minutes[0], minutes[1]
+
+
+def in_quiet_hours(window: tuple[int, int], now: datetime | None = None) -> bool:
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    start, end = window
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def default_archive_path(db_path: str) -> str:
+    path = PathlibPath(db_path)
+    return str(path.with_name(f"{path.stem}.archive{path.suffix}"))
+
+
+class RetentionEngine:
+    """
+    Moves cold rows from the hot database into an attached archive database.
+
+    Each batch is two short transactions: copy into the archive (INSERT OR IGNORE on the original id),
+    then delete from the hot table only the rows the archive now holds.  SQLite does not make a commit
+    across an attached WAL database atomic, so the order matters: a crash in between leaves rows in
+    both files and the next run finishes the delete, it never loses them.  Writers wait at most one
+    batch for the write lock.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        archive_path: str | None = None,
+        policies: tuple[RetentionPolicy, ...] = DEFAULT_POLICIES,
+        quiet_hours: str = "01:00-05:00",
+        batch_size: int = 500,
+        pause: float = 0.05,
+        vacuum_pages: int = 2000,
+        check_interval: float = 600,
+        busy_timeout: float = 5.0,
+    ):
+        self.db_path = db_path
+        self.archive_path = archive_path or default_archive_path(db_path)
+        self.policies = policies
+        self.quiet_hours = parse_quiet_hours(quiet_hours)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.check_interval = check_interval
+        self.busy_timeout = busy_timeout
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        conn.execute("PRAGMA archive.journal_mode = WAL")
+        return conn
+
+    def _ensure_archive_table(self, conn: sqlite3.Connection, table: str) -> list[str]:
+        """Create (or widen) archive.<table> to mirror the hot table; returns the shared column names"""
+        hot = [(row[1], row[2]) for row in conn.execute(f"PRAGMA main.table_info({table})").fetchall()]
+        if not hot:
+            return []
+        existing = {row[1] for row in conn.execute(f"PRAGMA archive.table_info({table})").fetchall()}
+        if not existing:
+            # Keep the original id as the primary key so re-copying a batch is a no-op
+            columns = ", ".join(f"{name} {'INTEGER PRIMARY KEY' if name == 'id' else decl}" for name, decl in hot)
+            conn.execute(f"CREATE TABLE archive.{table} ({columns}, archived_at TEXT NOT NULL DEFAULT (datetime('now')))")
+            time_column = ARCHIVE_TIME_COLUMNS.get(table)
+            if time_column:
+                conn.execute(f"CREATE INDEX archive.idx_{table}_{time_column} ON {table}({time_column})")
+            for parent in self.policies:
+                for child, column in parent.children:
+                    if child == table:
+                        conn.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{table}_{column} ON {table}({column})")
+        else:
+            for name, decl in hot:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {decl}")
+        conn.commit()
+        return [name for name, _ in hot]
+
+    def _next_batch(self, conn: sqlite3.Connection, policy: RetentionPolicy, cutoff: str) -> list[int]:
+        if policy.append_only:
+            ids = []
+            rows = conn.execute(f"SELECT id, {policy.time_column} FROM main.{policy.table} ORDER BY id LIMIT ?", (self.batch_size,))
+            for row_id, value in rows.fetchall():
+                if value is None or str(value) >= cutoff:
+                    break
+                ids.append(row_id)
+            return ids
+        rows = conn.execute(
+            f"SELECT id FROM main.{policy.table} WHERE {policy.time_column} < ? ORDER BY id LIMIT ?",
+            (cutoff, self.batch_size),
+        )
+        return [row[0] for row in rows.fetchall()]
+
+    def _move_batch(self, conn: sqlite3.Connection, policy: RetentionPolicy, columns: dict[str, list[str]], ids: list[int]) -> dict[str, int]:
+        batch = json.dumps(ids)
+        in_batch = "id IN (SELECT value FROM json_each(?))"
+        moved = {}
+        # 1. Copy parent and child rows into the archive
+        with conn:
+            for child, column in policy.children:
+                cols = ", ".join(columns[child])
+                conn.execute(
+                    f"INSERT OR IGNORE INTO archive.{child} ({cols}) SELECT {cols} FROM main.{child} "
+                    f"WHERE {column} IN (SELECT {column} FROM main.{policy.table} WHERE {in_batch})",
+                    (batch,),
+                )
+            cols = ", ".join(columns[policy.table])
+            conn.execute(f"INSERT OR IGNORE INTO archive.{policy.table} ({cols}) SELECT {cols} FROM main.{policy.table} WHERE {in_batch}", (batch,))
+        # 2. Delete from the hot tables only what the archive holds
+        with conn:
+            for child, column in policy.children:
+                cur = conn.execute(
+                    f"DELETE FROM main.{child} WHERE {column} IN (SELECT {column} FROM main.{policy.table} WHERE {in_batch}) "
+                    f"AND id IN (SELECT id FROM archive.{child})",
+                    (batch,),
+                )
+                moved[child] = cur.rowcount
+            cur = conn.execute(f"DELETE FROM main.{policy.table} WHERE {in_batch} AND id IN (SELECT id FROM archive.{policy.table})", (batch,))
+            moved[policy.table] = cur.rowcount
+        return moved
+
+    def _incremental_vacuum(self, conn: sqlite3.Connection, deadline: float, force: bool) -> dict[str, Any]:
+        """Hand free pages back to the filesystem in small steps; needs auto_vacuum=INCREMENTAL"""
+        mode = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+        if mode != 2:
+            return {"skipped": "auto_vacuum is not INCREMENTAL; run `python retention.py enable-incremental-vacuum` once"}
+        freed = 0
+        while self._may_continue(deadline, force):
+            free = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+            if free == 0:
+                break
+            conn.execute(f"PRAGMA main.incremental_vacuum({min(free, self.vacuum_pages)})").fetchall()
+            freed += min(free, self.vacuum_pages)
+            time.sleep(self.pause)
+        return {"freed_pages": freed}
+
+    def _may_continue(self, deadline: float, force: bool) -> bool:
+        if self._stop.is_set() or time.monotonic() > deadline:
+            return False
+        return force or in_quiet_hours(self.quiet_hours)
+
+    def run(self, force: bool = False, max_seconds: float = 3600, now: datetime | None = None) -> dict[str, Any] | None:
+        """
+        Archive everything past its policy, then vacuum.
+        Args:
+            force (bool): Run outside the quiet-hours window (CLI / maintenance)
+            max_seconds (float): Stop after this long; the next run picks up where this one stopped
+            now (datetime): Reference time for the cutoffs (UTC, default: now)
+        Returns:
+            Rows moved per table and vacuum results, or None when outside quiet hours
+        """
+        if not force and not in_quiet_hours(self.quiet_hours):
+            return None
+        deadline = time.monotonic() + max_seconds
+        now = now or datetime.now(timezone.utc)
+        report: dict[str, Any] = {"moved": {}, "complete": True}
+        conn = self._connect()
+        try:
+            for policy in self.policies:
+                tables = [policy.table] + [child for child, _ in policy.children]
+                columns = {table: self._ensure_archive_table(conn, table) for table in tables}
+                if not columns[policy.table]:
+                    continue
+                cutoff = (now - timedelta(days=policy.keep_days)).strftime("%Y-%m-%d %H:%M:%S")
+                while True:
+                    if not self._may_continue(deadline, force):
+                        report["complete"] = False
+                        break
+                    ids = self._next_batch(conn, policy, cutoff)
+                    if not ids:
+                        break
+                    for table, count in self._move_batch(conn, policy, columns, ids).items():
+                        report["moved"][table] = report["moved"].get(table, 0) + count
+                    time.sleep(self.pause)
+            report["vacuum"] = self._incremental_vacuum(conn, deadline, force)
+            # Refresh planner statistics for the now smaller hot tables
+            conn.execute("PRAGMA main.optimize")
+        finally:
+            conn.close()
+        if report["moved"]:
+            logger.info("retention: moved %s", report["moved"])
+        return report
+
+    def _acquire_lock(self) -> bool:
+        """Only one process (e.g. one of several workers) runs retention for a database"""
+        if not HAS_FCNTL:
+            return True
+        self._lock_file = open(f"{self.db_path}.retention.lock", "a+")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def start(self) -> bool:
+        """Check every `check_interval` seconds and run inside the quiet hours; False if another process runs it"""
+        if not self._acquire_lock():
+            return False
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.run()
+            except Exception:
+                logger.exception("retention: run failed; retrying at the next check")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+
+class ArchiveQuery:
+    """Read-only queries over the archive database (the explicit path to data that left the hot tables)"""
+
+    def __init__(self, archive_path: str, policies: tuple[RetentionPolicy, ...] = DEFAULT_POLICIES):
+        self.archive_path = archive_path
+        self.search_columns = {policy.table: policy.search_columns for policy in policies}
+
+    def search(
+        self,
+        table: str,
+        since: str | None = None,
+        until: str | None = None,
+        q: str | None = None,
+        filters: dict[str, str] | None = None,
+        before_id: int | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """
+        Newest-first rows of one archived table.
+        Args:
+            table (str): One of the tables with a retention policy
+            since (str): Inclusive lower bound on the table's time column
+            until (str): Exclusive upper bound on the table's time column
+            q (str): Substring matched against the table's search columns
+            filters (dict[str, str]): Exact matches on archive columns
+            before_id (int): Keyset pagination: only rows with a smaller id
+            limit (int): Maximum number of rows
+        """
+        if table not in ARCHIVE_TIME_COLUMNS:
+            raise ValueError(f"Unknown archive table '{table}'")
+        if not PathlibPath(self.archive_path).exists():
+            return []
+        conn = sqlite3.connect(f"file:{self.archive_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+            if not columns:
+                return []
+            unknown = set(filters or {}) - columns
+            if unknown:
+                raise ValueError(f"Unknown column(s) for {table}: {', '.join(sorted(unknown))}")
+            time_column = ARCHIVE_TIME_COLUMNS[table]
+            clauses, params = [], []
+            if since:
+                clauses.append(f"{time_column} >= ?")
+                params.append(since)
+            if until:
+                clauses.append(f"{time_column} < ?")
+                params.append(until)
+            if before_id is not None:
+                clauses.append("id < ?")
+                params.append(before_id)
+            for column, value in (filters or {}).items():
+                clauses.append(f"{column} = ?")
+                params.append(value)
+            if q and self.search_columns.get(table):
+                clauses.append("(" + " OR ".join(f"{column} LIKE ?" for column in self.search_columns[table]) + ")")
+                params.extend([f"%{q}%"] * len(self.search_columns[table]))
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = conn.execute(f"SELECT * FROM {table} {where} ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+
+def retention_settings_from_env() -> dict[str, Any] | None:
+    """
+    RETENTION=1 archives in the background; RETENTION_POLICIES (e.g. "audit_log=548,visits=90"),
+    RETENTION_QUIET_HOURS (default 01:00-05:00, server local time) and RETENTION_BATCH (default 500) tune it.
+    Returns None when retention is off.
+    """
+    if os.getenv("RETENTION", "").lower() not in ("1", "true", "yes"):
+        return None
+    return {
+        "policies": policies_from_spec(os.getenv("RETENTION_POLICIES")),
+        "quiet_hours": os.getenv("RETENTION_QUIET_HOURS", "01:00-05:00"),
+        "batch_size": int(os.getenv("RETENTION_BATCH", "500")),
+    }
+
+
+def archive_path_from_env(db_path: str) -> str:
+    return os.getenv("ARCHIVE_DB_PATH") or default_archive_path(db_path)
+
+
+def enable_incremental_vacuum(db_path: str) -> None:
+    """Switch an existing database to auto_vacuum=INCREMENTAL (rewrites the file; run during maintenance)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move cold rows to the archive database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Archive everything past its policy now, ignoring quiet hours")
+    run.add_argument("--policies", default=os.getenv("RETENTION_POLICIES"), help='Days to keep per table, e.g. "audit_log=548,visits=90"')
+    run.add_argument("--batch", type=int, default=500, help="Rows per transaction (default: 500)")
+    run.add_argument("--max-seconds", type=float, default=3600, help="Stop after this long (default: 3600)")
+    vac = sub.add_parser("enable-incremental-vacuum", help="Rewrite the database with auto_vacuum=INCREMENTAL (takes an exclusive lock)")
+    query = sub.add_parser("query", help="Search an archived table")
+    query.add_argument("table", choices=sorted(ARCHIVE_TIME_COLUMNS))
+    query.add_argument("--since")
+    query.add_argument("--until")
+    query.add_argument("--q")
+    query.add_argument("--limit", type=int, default=20)
+    for cmd in (run, vac, query):
+        cmd.add_argument("--db", default=os.getenv("DB_PATH", "/data/data.sqlite3"))
+        cmd.add_argument("--archive", default=None, help="Archive database (default: ARCHIVE_DB_PATH or <db>.archive.sqlite3)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    archive = args.archive or archive_path_from_env(args.db)
+    if args.command == "run":
+        engine = RetentionEngine(args.db, archive, policies=policies_from_spec(args.policies), batch_size=args.batch)
+        print(json.dumps(engine.run(force=True, max_seconds=args.max_seconds), indent=2))
+    elif args.command == "enable-incremental-vacuum":
+        enable_incremental_vacuum(args.db)
+    else:
+        rows = ArchiveQuery(archive).search(args.table, since=args.since, until=args.until, q=args.q, limit=args.limit)
+        for row in rows:
+            print(json.dumps(row, default=str))
@@ -0,0 +1,284 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from typing import IO, Any, Iterable, Iterator
+
+from pydantic import ValidationError
+
+from blob_store import BlobStoreInterface, decode_base64_image, get_blob_store, store_signature
+from field_crypto import FieldCipher, get_cipher
+from permission_codes import PermissionCodeAllocator, code_state, household_key, register_client_code
+from ids import new_id
+from schema import Youth, YouthPermissionSubmission
+
+INSERT_SQL = """
+    INSERT INTO youth_medical
+        (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _identity(permission_code: str, youth: Youth) -> tuple:
+    """What makes two roster rows the same youth"""
+    return (permission_code, youth.first_name.strip().lower(), youth.last_name.strip().lower(), youth.birth_date)
+
+
+def _nest(flat: dict[str, str]) -> dict[str, Any]:
+    """
+    {"youth.first_name": "Ann"} -> {"youth": {"first_name": "Ann"}}.  Empty cells are left out, but their
+    section is kept, so a row with every medical.* cell empty still has an (all optional) medical object.
+    """
+    nested: dict[str, Any] = {}
+    for key, value in flat.items():
+        if key is None:
+            continue
+        target = nested
+        *parents, leaf = key.strip().split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        if value is not None and value != "":
+            target[leaf] = value
+    return nested
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[dict[str, Any]]:
+    """
+    Yield one raw record per row without loading the whole file (except for a JSON array).
+    Args:
+        stream (IO[str]): Text stream of the upload or file
+        fmt (str): "csv" (dotted headers, e.g. youth.first_name), "ndjson" (one object per line) or "json" (an array)
+    """
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield _nest(row)
+    elif fmt == "ndjson":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == "json":
+        records = json.load(stream)
+        if not isinstance(records, list):
+            raise ValueError("JSON roster must be an array of submissions")
+        yield from records
+    else:
+        raise ValueError(f"Unknown roster format '{fmt}'")
+
+
+def format_from_name(name: str | None, content_type: str | None = None) -> str:
+    """Pick the roster format from a file name or Content-Type (default: csv)"""
+    hint = f"{name or ''} {content_type or ''}".lower()
+    if "ndjson" in hint or "jsonl" in hint or "json-seq" in hint:
+        return "ndjson"
+    if "json" in hint:
+        return "json"
+    return "csv"
+
+
+@dataclass
+class ImportReport:
+    """Outcome of one import; `rows` has one entry per input row, in input order"""
+    dry_run: bool
+    rows: list[dict[str, Any]] = field(default_factory=list)
+
+    def summary(self) -> dict[str, Any]:
+        counts: dict[str, int] = {}
+        for row in self.rows:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        return {"dry_run": self.dry_run, "total": len(self.rows), "counts": counts, "rows": self.rows}
+
+
+class RosterImporter:
+    """
+    Validates roster records one at a time and writes the valid ones with executemany, a chunk per transaction.
+
+    Rows without a permission_code get their household's code, or a newly issued one, so siblings share it and a
+    re-import finds the same code again.  Every new youth gets a time-ordered id (ids.py).  A record whose youth
+    matches an existing row (same permission code, name and birth date) is reported as "exists" and skipped, so a
+    file can be re-imported safely; the check runs inside the chunk's write transaction, so a concurrent
+    POST /users cannot slip in between.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        cipher: FieldCipher,
+        blob_store: BlobStoreInterface,
+        chunk_size: int = 200,
+        allocator: PermissionCodeAllocator | None = None,
+        code_expiry: str | None = None,
+    ):
+        self.conn = conn
+        self.cipher = cipher
+        self.blob_store = blob_store
+        self.chunk_size = chunk_size
+        self.allocator = allocator or PermissionCodeAllocator(conn)
+        self.code_expiry = code_expiry
+
+    def _assign_code(self, submission: YouthPermissionSubmission) -> str | None:
+        """Fill in a missing code from the household; returns an error for a code that can no longer be used"""
+        household = household_key(submission.parent_guardian)
+        if submission.permission_code is None:
+            submission.permission_code = self.allocator.for_household(household, self.code_expiry)
+            return None
+        state = code_state(self.conn, submission.permission_code)
+        if state in ("expired", "retired"):
+            return f"permission_code is {state}"
+        if not register_client_code(self.conn, submission.permission_code, household):
+            return "permission_code belongs to another household"
+        if not self.allocator.claim_client_code(submission.permission_code):
+            return "permission_code belongs to another unit"
+        return None
+
+    def _validate(self, number: int, record: Any, report: ImportReport) -> YouthPermissionSubmission | None:
+        try:
+            submission = YouthPermissionSubmission.model_validate(record)
+        except ValidationError as e:
+            report.rows.append({"row": number, "status": "invalid", "errors": [
+                {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]} for error in e.errors()
+            ]})
+            return None
+        return submission
+
+    def _existing(self, codes: Iterable[str]) -> dict[tuple, str]:
+        """Identity -> youth_id of the youth already registered under `codes` (one indexed lookup per chunk)"""
+        rows = self.conn.execute(
+            "SELECT youth_id, permission_code, youth FROM youth_medical WHERE permission_code IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(dict.fromkeys(codes))),),
+        ).fetchall()
+        return {_identity(row[1], Youth.model_validate_json(row[2])): row[0] for row in rows}
+
+    def _resolve_ids(self, chunk: list[tuple[int, YouthPermissionSubmission]], report: ImportReport) -> list[tuple[int, str, YouthPermissionSubmission]]:
+        if not chunk:
+            return []
+        existing = self._existing(submission.permission_code for _, submission in chunk)
+        resolved = []
+        for number, submission in chunk:
+            identity = _identity(submission.permission_code, submission.youth)
+            if identity in existing:
+                report.rows.append({"row": number, "status": "exists", "youth_id": existing[identity]})
+                continue
+            youth_id = existing[identity] = new_id()
+            resolved.append((number, youth_id, submission))
+        return resolved
+
+    def _write_chunk(self, chunk: list[tuple[int, YouthPermissionSubmission]], report: ImportReport, dry_run: bool) -> set[str]:
+        params, codes = [], set()
+        # Reject unreadable signature images before they can claim a youth_id
+        readable = []
+        for number, submission in chunk:
+            try:
+                if submission.signature.signature_image_base64 is not None:
+                    decode_base64_image(submission.signature.signature_image_base64)
+            except ValueError as e:
+                report.rows.append({"row": number, "status": "invalid", "errors": [{"field": "signature", "message": str(e)}]})
+                continue
+            code_error = self._assign_code(submission)
+            if code_error is not None:
+                report.rows.append({"row": number, "status": "invalid", "errors": [{"field": "permission_code", "message": code_error}]})
+                continue
+            readable.append((number, submission))
+        for number, youth_id, submission in self._resolve_ids(readable, report):
+            if not dry_run:
+                signature = store_signature(self.blob_store, submission.signature)
+                params.append((
+                    youth_id,
+                    submission.permission_code,
+                    submission.youth.model_dump_json(),
+                    submission.parent_guardian.model_dump_json(),
+                    self.cipher.encrypt(submission.medical.model_dump_json(), "medical"),
+                    self.cipher.encrypt(submission.emergency_contact.model_dump_json(), "emergency_contact"),
+                    signature.model_dump_json(exclude_none=True),
+                    submission.signed_at,
+                ))
+            report.rows.append({"row": number, "status": "imported", "youth_id": youth_id, "permission_code": submission.permission_code})
+            codes.add(submission.permission_code)
+        if params:
+            self.conn.executemany(INSERT_SQL, params)
+        return codes
+
+    def run(self, records: Iterable[Any], dry_run: bool = False, atomic: bool = False) -> tuple[ImportReport, set[str]]:
+        """
+        Import a stream of raw records.
+        Args:
+            records (Iterable): Dicts shaped like YouthPermissionSubmission (see read_records)
+            dry_run (bool): Validate and resolve ids without writing anything
+            atomic (bool): Write everything in one transaction instead of one per chunk
+        Returns:
+            The per-row report and the permission codes that were written
+        """
+        report = ImportReport(dry_run=dry_run)
+        codes: set[str] = set()
+        chunk: list[tuple[int, YouthPermissionSubmission]] = []
+        single_transaction = atomic or dry_run
+
+        def flush() -> None:
+            nonlocal codes
+            if not single_transaction:
+                self.conn.execute("BEGIN IMMEDIATE")
+            codes |= self._write_chunk(chunk, report, dry_run)
+            if not single_transaction:
+                self.conn.commit()
+            chunk.clear()
+
+        # Row numbers are 1-based and count data rows only (spreadsheet row minus the header)
+        number = 0
+        records = iter(records)
+        if single_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                try:
+                    record = next(records)
+                except StopIteration:
+                    break
+                except (ValueError, csv.Error) as e:
+                    # Malformed input (e.g. a broken JSON line) ends the stream; the rows before it are still imported
+                    report.rows.append({"row": number + 1, "status": "invalid", "errors": [{"field": None, "message": str(e)}]})
+                    break
+                number += 1
+                submission = self._validate(number, record, report)
+                if submission is not None:
+                    chunk.append((number, submission))
+                if len(chunk) >= self.chunk_size:
+                    flush()
+            if chunk:
+                flush()
+            if single_transaction:
+                if dry_run:
+                    self.conn.rollback()
+                else:
+                    self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        report.rows.sort(key=lambda row: row["row"])
+        return report, codes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import youth medical/permission submissions")
+    parser.add_argument("file", help="CSV (dotted headers, e.g. youth.first_name), JSON array or NDJSON file; '-' for stdin")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "/data/data.sqlite3"), help="Path to the SQLite database")
+    parser.add_argument("--format", choices=["csv", "json", "ndjson"], help="Default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Rows per transaction (default: 200)")
+    parser.add_argument("--atomic", action="store_true", help="All rows in one transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    args = parser.parse_args()
+    # Signature images go to the blob store next to the database being imported into
+    os.environ["DB_PATH"] = args.db
+
+    conn = sqlite3.connect(args.db, timeout=5.0)
+    stream = io.TextIOWrapper(os.fdopen(0, "rb"), encoding="utf-8-sig") if args.file == "-" else open(args.file, encoding="utf-8-sig", newline="")
+    try:
+        importer = RosterImporter(conn, get_cipher(), get_blob_store(), chunk_size=args.chunk_size)
+        report, _ = importer.run(read_records(stream, args.format or format_from_name(args.file)), dry_run=args.dry_run, atomic=args.atomic)
+    finally:
+        stream.close()
+        conn.close()
+    summary = report.summary()
+    print(json.dumps({**summary, "rows": [row for row in summary["rows"] if row["status"] != "imported"]}, indent=2))
+    raise SystemExit(1 if summary["counts"].get("invalid") else 0)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List, Any, Literal
 from datetime import datetime
 
@@ -29,10 +29,19 @@ class EmergencyContact(BaseModel):
 
 class Signature(BaseModel):
     signed_by: str
-    signature_image_base64: str
+    # Submitted inline; stored in the blob store and replaced by signature_ref before it is written
+    signature_image_base64: str | None = None
+    signature_ref: str | None = None
+
+    @model_validator(mode="after")
+    def require_image_or_ref(self):
+        if self.signature_image_base64 is None and self.signature_ref is None:
+            raise ValueError("signature_image_base64 is required")
+        return self
 
 class YouthPermissionSubmission(BaseModel):
-    permission_code: str = Field(..., pattern=r"^\d{6}$")
+    # Left out, the server issues one (shared with siblings registered under the same parent)
+    permission_code: str | None = Field(None, pattern=r"^\d{6}$")
     youth: Youth
     parent_guardian: ParentGuardian
     medical: MedicalInfo
@@ -91,7 +100,39 @@ class PermissionGiven(BaseModel):
     permission_code: str
     granted_ip: str
 
+class PermissionCodeIssue(BaseModel):
+    count: int = Field(1, ge=1, le=5000)
+    # Optional household (parent email) per code, in order
+    household_ids: List[str] | None = None
+    # Default: PERMISSION_CODE_TTL_DAYS, or never
+    ttl_days: float | None = Field(None, gt=0)
+
+class PermissionBatchGrant(BaseModel):
+    permission_code: str = Field(..., pattern=r"^\d{6}$")
+    activity_ids: List[str] = Field(..., min_length=1, max_length=200)
+    # Defaults to every youth registered under the permission code
+    youth_ids: List[str] | None = None
+
+class PermissionGrantResult(BaseModel):
+    youth_id: str
+    activity_id: str
+    status: Literal["granted", "already_granted", "unknown_youth", "unknown_activity", "not_in_group"]
+
+class PermissionBatchResult(BaseModel):
+    granted: int
+    results: List[PermissionGrantResult]
+
+class BatchSubRequest(BaseModel):
+    # Echoed back so callers can match results; defaults to the position in the list
+    id: str | None = None
+    # Route path with an optional query string, e.g. "/activity-health-reports/act-1" or "/activities-all?include_past=true"
+    path: str = Field(..., min_length=1, max_length=2048)
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1, max_length=20)
+
 class ActivityBase(BaseModel):
+    activity_id: str | None = None
     activity_name: str
     date_start: datetime
     date_end: datetime
@@ -166,6 +207,15 @@ class PersonalGoal(BaseModel):
     progress_notes: Optional[List[str]] = None
     completed: bool = False
     visibility_level: Literal["private", "parents", "group", "group_leaders", "bishopric", "everyone"] = "private"
+    org_group: str | None = None
 
     # levels of visibility on a goal
-    # private, parents, group, group leaders, bishopric, everyone
\ No newline at end of file
+    # private, parents, group, group leaders, bishopric, everyone
+
+class SearchResult(BaseModel):
+    kind: Literal["activity", "goal"]
+    id: str
+    title: str
+    date: str | None = None
+    snippet: str
+    rank: float
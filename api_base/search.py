@@ -0,0 +1,103 @@
+import re
+from typing import Any, Iterable
+from goal_view import visibility_clause
+
+# Roles that may search across every group in the ward
+WARD_ROLES = {"all", "admin", "bishop", "ecc_admin"}
+
+MAX_TERMS = 10
+
+
+class SearchEngine:
+    """Full-text search over the FTS5 indexes created by DBSetup.create_search_index"""
+
+    def __init__(self, db_connection):
+        self.conn = db_connection
+
+    @staticmethod
+    def build_match(query: str) -> str:
+        """
+        Turn free text typed by a user into a safe FTS5 MATCH expression.
+        Every word is quoted (so FTS operators and punctuation cannot break the query)
+        and prefix-matched, e.g. 'temple trip' -> '"temple"* "trip"*'.
+        """
+        terms = re.findall(r"\w+", query, flags=re.UNICODE)[:MAX_TERMS]
+        return " ".join(f'"{term}"*' for term in terms)
+
+    @staticmethod
+    def _is_ward_wide(user: dict) -> bool:
+        return user.get("role") in WARD_ROLES or user.get("org_group") in ("admin", "ecc_admin")
+
+    def search_activities(self, match: str, user: dict, limit: int) -> list[dict[str, Any]]:
+        """Ranked activity matches, restricted to the caller's group unless they are ward-wide"""
+        sql = """
+            SELECT a.activity_id AS id,
+                   a.activity_name AS title,
+                   a.date_start AS date,
+                   snippet(activities_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+                   bm25(activities_fts, 10.0, 4.0, 2.0, 1.0) AS rank
+            FROM activities_fts
+            JOIN activities a ON a.id = activities_fts.rowid
+            WHERE activities_fts MATCH ?
+        """
+        params: list[Any] = [match]
+        if not self._is_ward_wide(user):
+            # groups is a JSON array; match whole group names, not substrings ("young women" of "older young women")
+            sql += " AND EXISTS (SELECT 1 FROM json_each(a.groups) WHERE value = ?)"
+            params.append(user.get("org_group"))
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return [dict(row, kind="activity") for row in self.conn.execute(sql, params).fetchall()]
+
+    def search_goals(self, match: str, user: dict, limit: int) -> list[dict[str, Any]]:
+        """Ranked goal matches, honouring the same visibility rules as the goal dashboard"""
+        sql = """
+            SELECT g.goal_id AS id,
+                   g.goal_name AS title,
+                   g.target_date AS date,
+                   snippet(personal_goals_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+                   bm25(personal_goals_fts, 10.0, 4.0, 1.0) AS rank
+            FROM personal_goals_fts
+            JOIN personal_goals g ON g.id = personal_goals_fts.rowid
+            WHERE personal_goals_fts MATCH ?
+        """
+        where, where_params = visibility_clause(user)
+        sql += f" AND {where}"
+        params: list[Any] = [match, *where_params]
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return [dict(row, kind="goal") for row in self.conn.execute(sql, params).fetchall()]
+
+    def search(self, query: str, user: dict, kinds: Iterable[str] = ("activities", "goals"), limit: int = 20) -> list[dict[str, Any]]:
+        """
+        Search every requested index and merge the hits by relevance.
+        Args:
+            query (str): Free text typed by the user
+            user (dict): Decoded JWT payload of the caller, used for role/group scoping
+            kinds (Iterable[str]): Which indexes to search ("activities", "goals")
+            limit (int): Maximum number of results returned
+        """
+        match = self.build_match(query)
+        if not match:
+            return []
+        results: list[dict[str, Any]] = []
+        if "activities" in kinds:
+            results.extend(self.normalise(self.search_activities(match, user, limit)))
+        if "goals" in kinds:
+            results.extend(self.normalise(self.search_goals(match, user, limit)))
+        results.sort(key=lambda r: r["rank"])
+        return results[:limit]
+
+    @staticmethod
+    def normalise(hits: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Rescale one index's bm25() ranks to [-1, 0) relative to its best hit, so hits from different indexes
+        can be merged: raw scores depend on each index's own column weights, row count and document lengths.
+        Lower is still better; the best hit of each kind ranks -1.
+        """
+        if not hits:
+            return hits
+        best = min(hit["rank"] for hit in hits)
+        for hit in hits:
+            hit["rank"] = -hit["rank"] / best if best < 0 else -1.0
+        return hits
@@ -0,0 +1,436 @@
+import argparse
+import json
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path as PathlibPath
+from typing import Any, AsyncGenerator, Callable, Iterable, Iterator
+
+from fastapi import HTTPException, Request
+
+from db import DatabaseEngine
+from db_setup import DBSetup
+from permission_codes import ALLOCATOR_DDL, PermissionCodeAllocator, reserve_indexes
+
+# Roles that may read any unit of their own stake (X-Unit header) and run stake-wide fan-out reports
+STAKE_ROLES = {"admin", "president"}
+
+# Request fields that carry a parent's permission code
+PERMISSION_CODE_FIELDS = ("permission_code", "parent_code")
+
+# The only routes whose unit can come from the request body (a JSON permission_code or a login form's username);
+# every other body is left for the endpoint to parse, however large
+BODY_UNIT_ROUTES = {
+    ("POST", "/token"),
+    ("POST", "/users"),
+    ("POST", "/activity-permissions"),
+    ("POST", "/activity-permissions/batch"),
+}
+
+
+class ShardDirectory:
+    """
+    Small SQLite database beside the shards mapping each org unit (ward) to its stake and
+    file, and permission codes and usernames to the unit that owns them.
+    Positive lookups are cached in memory: codes and users do not move between units at runtime.
+    """
+
+    def __init__(self, path: PathlibPath):
+        self.path = path
+        self._code_cache: dict[str, str] = {}
+        self._user_cache: dict[str, str] = {}
+        self._units: dict[str, str] | None = None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Short-lived connection that commits on success and is always closed"""
+        conn = sqlite3.connect(str(self.path), timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("CREATE TABLE IF NOT EXISTS units (unit_id TEXT PRIMARY KEY, stake_id TEXT NOT NULL, db_file TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS unit_codes (permission_code TEXT PRIMARY KEY, unit_id TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS unit_users (username TEXT PRIMARY KEY, unit_id TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_units_stake ON units(stake_id)")
+            # Every shard issues codes from this one allocator so no two units hand out the same code
+            conn.execute(ALLOCATOR_DDL)
+            conn.execute("INSERT OR IGNORE INTO permission_code_allocator (id, feistel_key, next_index) VALUES (1, randomblob(16), 0)")
+
+    def register_unit(self, unit_id: str, stake_id: str, db_file: str) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO units (unit_id, stake_id, db_file) VALUES (?, ?, ?)", (unit_id, stake_id, db_file))
+        self._units = None
+
+    def assign_codes(self, unit_id: str, codes: Iterable[str]) -> list[str]:
+        """Record new codes as owned by the unit; returns the codes another unit already owns, which keep their owner"""
+        codes = list(codes)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO unit_codes (permission_code, unit_id) VALUES (?, ?) ON CONFLICT(permission_code) DO NOTHING",
+                [(c, unit_id) for c in codes],
+            )
+            rows = conn.execute(
+                "SELECT permission_code FROM unit_codes WHERE unit_id != ? AND permission_code IN (SELECT value FROM json_each(?))",
+                (unit_id, json.dumps(codes)),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim_code(self, unit_id: str, code: str) -> bool:
+        """Assign a code to the unit unless another unit owns it; True when the unit owns it afterwards"""
+        owner = self.unit_for_code(code)
+        if owner is None:
+            return not self.assign_codes(unit_id, [code])
+        return owner == unit_id
+
+    def assign_users(self, unit_id: str, usernames: Iterable[str]) -> None:
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO unit_users (username, unit_id) VALUES (?, ?)", [(u, unit_id) for u in usernames])
+
+    def units(self) -> dict[str, str]:
+        """Map of unit id -> stake id"""
+        units = self._units
+        if units is None:
+            with self._connect() as conn:
+                units = {row["unit_id"]: row["stake_id"] for row in conn.execute("SELECT unit_id, stake_id FROM units")}
+            self._units = units
+        return units
+
+    def db_file(self, unit_id: str) -> str:
+        with self._connect() as conn:
+            row = conn.execute("SELECT db_file FROM units WHERE unit_id = ?", (unit_id,)).fetchone()
+        return row["db_file"] if row else f"{unit_id}.sqlite3"
+
+    def _lookup(self, cache: dict[str, str], sql: str, key: str) -> str | None:
+        unit = cache.get(key)
+        if unit is None:
+            with self._connect() as conn:
+                row = conn.execute(sql, (key,)).fetchone()
+            if row:
+                unit = cache[key] = row[0]
+        return unit
+
+    def unit_for_code(self, code: str) -> str | None:
+        return self._lookup(self._code_cache, "SELECT unit_id FROM unit_codes WHERE permission_code = ?", code)
+
+    def unit_for_user(self, username: str) -> str | None:
+        return self._lookup(self._user_cache, "SELECT unit_id FROM unit_users WHERE username = ?", username)
+
+
+class DirectoryCodeAllocator(PermissionCodeAllocator):
+    """
+    Allocator for one shard: the permutation position lives in the shard directory, a code any unit already
+    owns counts as taken, and new codes are assigned to the unit as they are issued.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, directory: ShardDirectory, unit_id: str):
+        super().__init__(conn)
+        self.directory = directory
+        self.unit_id = unit_id
+
+    def _reserve(self, count: int) -> tuple[bytes, int]:
+        with self.directory._connect() as conn:
+            return reserve_indexes(conn, count)
+
+    def _taken(self, codes: list[str]) -> set[str]:
+        with self.directory._connect() as conn:
+            rows = conn.execute(
+                "SELECT permission_code FROM unit_codes WHERE permission_code IN (SELECT value FROM json_each(?))", (json.dumps(codes),)
+            ).fetchall()
+        return super()._taken(codes) | {row[0] for row in rows}
+
+    def issue(self, count: int, household_ids: Iterable[str | None] | None = None, expires_at: str | None = None) -> list[str]:
+        codes = super().issue(count, household_ids, expires_at)
+        self.directory.assign_codes(self.unit_id, codes)
+        return codes
+
+    def claim_client_code(self, code: str) -> bool:
+        return self.directory.claim_code(self.unit_id, code)
+
+
+class ConnectionPool:
+    """LIFO pool of open connections to one shard; connections beyond max_idle are closed on release"""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_idle: int):
+        self._connect = connect
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=max_idle)
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        # Never hand the next request a connection with half a transaction on it
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ShardedDatabaseEngine(DatabaseEngine):
+    """
+    One SQLite file per org unit (ward), so each ward has its own write lock.
+    The unit of a request comes from, in order: the JWT 'unit' claim (stake roles may switch to
+    another unit of their stake with X-Unit), a permission code in the path or query, a permission code in
+    the JSON body or the username of a login form (BODY_UNIT_ROUTES only), an explicit X-Unit header or
+    ?unit= parameter (anonymous requests only), and default_unit.
+    """
+
+    def __init__(self, root: str, claims_from_token: Callable[[str], dict[str, Any]], pool_size: int = 8, default_unit: str | None = None):
+        """
+        Args:
+            root (str): Directory holding directory.sqlite3 and one <unit>.sqlite3 per unit
+            claims_from_token (Callable): Verifies a bearer token and returns its claims (raises on invalid tokens)
+            pool_size (int): Idle connections kept open per shard
+            default_unit (str | None): Unit for requests that carry no unit information
+        """
+        self.root = PathlibPath(root)
+        super().__init__(str(self.root / "directory.sqlite3"))
+        self.directory = ShardDirectory(self.root / "directory.sqlite3")
+        self.claims_from_token = claims_from_token
+        self.pool_size = pool_size
+        self.default_unit = default_unit
+        self._pools: dict[str, ConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+
+    def shard_path(self, unit_id: str) -> PathlibPath:
+        return self.root / self.directory.db_file(unit_id)
+
+    def startup(self, app):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.directory.create()
+        for unit_id in self.directory.units():
+            self.prepare_database(self.shard_path(unit_id)).close()
+        app.state._db = None
+        return app
+
+    def _pool(self, unit_id: str) -> ConnectionPool:
+        pool = self._pools.get(unit_id)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(unit_id)
+                if pool is None:
+                    path = str(self.shard_path(unit_id))
+                    pool = self._pools[unit_id] = ConnectionPool(lambda: self._open(path), self.pool_size)
+        return pool
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        conn = self.connect(path)
+        conn.execute("PRAGMA foreign_keys = ON;")
+        return conn
+
+    def _claims(self, request: Request) -> dict[str, Any]:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return {}
+        try:
+            return self.claims_from_token(token)
+        except Exception:
+            # Invalid tokens are rejected by require_role; here they simply carry no unit
+            return {}
+
+    async def _unit_from_request_data(self, request: Request) -> str | None:
+        for field in PERMISSION_CODE_FIELDS:
+            code = request.path_params.get(field) or request.query_params.get(field)
+            if code:
+                return self.directory.unit_for_code(code)
+        route = request.scope.get("route")
+        if (request.method, getattr(route, "path", None)) not in BODY_UNIT_ROUTES:
+            return None
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and body.get("permission_code"):
+                return self.directory.unit_for_code(str(body["permission_code"]))
+        elif content_type.startswith(("application/x-www-form-urlencoded", "multipart/form-data")):
+            username = (await request.form()).get("username")
+            if username:
+                return self.directory.unit_for_user(str(username))
+        return None
+
+    async def resolve_unit(self, request: Request) -> str:
+        """Unit whose shard serves this request; stored on request.state.unit"""
+        claims = self._claims(request)
+        requested = request.headers.get("x-unit") or request.query_params.get("unit")
+        units = self.directory.units()
+        unit = claims.get("unit")
+        if claims:
+            # Signed-in callers only leave their own unit for another of their stake, and only with a stake role;
+            # a token issued without a unit has no stake, so it cannot pick one with X-Unit at all
+            if requested and requested != unit:
+                if claims.get("role") not in STAKE_ROLES or units.get(requested) != claims.get("stake"):
+                    raise HTTPException(status_code=403, detail="Unit is outside your stake")
+                unit = requested
+            unit = unit or await self._unit_from_request_data(request) or self.default_unit
+        else:
+            unit = await self._unit_from_request_data(request) or requested or self.default_unit
+        if not unit:
+            raise HTTPException(status_code=400, detail="Cannot determine the unit for this request; send X-Unit")
+        if unit not in units:
+            raise HTTPException(status_code=404, detail=f"Unknown unit '{unit}'")
+        request.state.unit = unit
+        return unit
+
+    async def get_db(self, request: Request) -> AsyncGenerator:
+        """Pooled connection to the shard of the request's unit"""
+        pool = self._pool(await self.resolve_unit(request))
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    def token_claims(self, request: Request) -> dict[str, Any]:
+        unit = getattr(request.state, "unit", None)
+        return {"unit": unit, "stake": self.directory.units().get(unit)} if unit else {}
+
+    def register_permission_code(self, request: Request, code: str) -> None:
+        # Codes are claimed before they are written (DirectoryCodeAllocator); this never takes one from another unit
+        self.directory.assign_codes(request.state.unit, [code])
+
+    def code_allocator(self, request: Request, conn: sqlite3.Connection) -> DirectoryCodeAllocator:
+        return DirectoryCodeAllocator(conn, self.directory, request.state.unit)
+
+    def fan_out(self, fn: Callable[[sqlite3.Connection], Any], stake_id: str | None = None, max_workers: int = 8) -> dict[str, Any]:
+        """
+        Run fn against every shard of a stake in parallel (read-only reports).
+        Args:
+            fn (Callable): Called with a pooled connection; its result is returned per unit
+            stake_id (str | None): Stake to cover (None for every unit)
+            max_workers (int): Shards queried at the same time
+        """
+        units = [u for u, s in sorted(self.directory.units().items()) if stake_id is None or s == stake_id]
+
+        def run(unit_id: str) -> Any:
+            pool = self._pool(unit_id)
+            conn = pool.acquire()
+            try:
+                return fn(conn)
+            finally:
+                pool.release(conn)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(units)))) as executor:
+            return dict(zip(units, executor.map(run, units)))
+
+
+def _copy_rows(conn: sqlite3.Connection, table: str, where: str, params: tuple = ()) -> int:
+    """Copy rows of src.<table> matching `where` into the shard, by column name"""
+    shard_columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+    source_columns = {row[1] for row in conn.execute(f"PRAGMA src.table_info({table})")}
+    columns = ", ".join(c for c in shard_columns if c in source_columns)
+    if not columns:
+        return 0
+    cursor = conn.execute(f"INSERT OR IGNORE INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} AS t WHERE {where}", params)
+    return cursor.rowcount
+
+
+def split_database(source: str, root: str, unit_map: dict[str, Any]) -> dict[str, dict[str, int]]:
+    """
+    Split a single database into one shard per unit and fill the shard directory.
+    Args:
+        source (str): Existing single-file database
+        root (str): Shard directory to create (SHARD_ROOT)
+        unit_map (dict): {"units": {"<unit>": {"stake": "<stake>", "groups": [org groups]}},
+                          "users": {"<username>": "<unit>"}} - "users" places stake-level accounts
+    Rows are assigned by org group: youth by their group, activities by any of their groups,
+    permissions and goals by youth.  Admin users whose group belongs to no unit are copied to every shard.
+    Audit and visit history stay in the source database.
+    """
+    root_path = PathlibPath(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    directory = ShardDirectory(root_path / "directory.sqlite3")
+    directory.create()
+    user_units = unit_map.get("users", {})
+    all_groups = [g for spec in unit_map["units"].values() for g in spec["groups"]]
+    report = {}
+
+    for unit_id, spec in unit_map["units"].items():
+        db_file = f"{unit_id}.sqlite3"
+        conn = sqlite3.connect(str(root_path / db_file))
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        conn.execute("PRAGMA journal_mode = WAL;")
+        setup = DBSetup(conn)
+        setup.create_tables()
+        setup.mark_current()
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        groups = json.dumps(spec["groups"])
+        in_groups = "IN (SELECT value FROM json_each(?))"
+        counts = {
+            "youth_medical": _copy_rows(conn, "youth_medical", f"json_extract(t.youth, '$.org_group') {in_groups}", (groups,)),
+            "activities": _copy_rows(conn, "activities", f"EXISTS (SELECT 1 FROM json_each(t.groups) WHERE value {in_groups})", (groups,)),
+            "permission_given": _copy_rows(conn, "permission_given", "t.youth_id IN (SELECT youth_id FROM main.youth_medical)"),
+            "personal_goals": _copy_rows(conn, "personal_goals", "t.youth_id IN (SELECT youth_id FROM main.youth_medical)"),
+            "interest_survey": _copy_rows(conn, "interest_survey", f"t.org_group {in_groups}", (groups,)),
+            "concern_survey": _copy_rows(conn, "concern_survey", f"t.org_group {in_groups}", (groups,)),
+            "permission_codes": _copy_rows(conn, "permission_codes", "t.code IN (SELECT permission_code FROM main.youth_medical)"),
+            "admin_users": _copy_rows(conn, "admin_users", f"t.org_group {in_groups} OR t.org_group NOT IN (SELECT value FROM json_each(?))",
+                                      (groups, json.dumps(all_groups))),
+        }
+        conn.commit()
+        codes = [row[0] for row in conn.execute("SELECT DISTINCT permission_code FROM main.youth_medical")]
+        usernames = [row[0] for row in conn.execute(f"SELECT username FROM main.admin_users WHERE org_group {in_groups}", (groups,))]
+        conn.execute("DETACH DATABASE src")
+        conn.close()
+
+        directory.register_unit(unit_id, spec["stake"], db_file)
+        directory.assign_codes(unit_id, codes)
+        directory.assign_users(unit_id, usernames)
+        report[unit_id] = counts
+
+    # Codes issued before the split must not be issued again by any shard
+    with sqlite3.connect(source) as src, directory._connect() as conn:
+        has_allocator = src.execute("SELECT 1 FROM sqlite_master WHERE name = 'permission_code_allocator'").fetchone()
+        allocator = has_allocator and src.execute("SELECT feistel_key, next_index FROM permission_code_allocator WHERE id = 1").fetchone()
+        if allocator:
+            conn.execute("UPDATE permission_code_allocator SET feistel_key = ?, next_index = ? WHERE id = 1", allocator)
+
+    # Stake-level accounts live in every shard; the map says which unit they log in to
+    first_unit = next(iter(unit_map["units"]))
+    with sqlite3.connect(source) as conn:
+        unplaced = [row[0] for row in conn.execute("SELECT username FROM admin_users WHERE org_group NOT IN (SELECT value FROM json_each(?))", (json.dumps(all_groups),))]
+    for username in unplaced:
+        directory.assign_users(user_units.get(username, first_unit), [username])
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-unit database shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+    split = sub.add_parser("split", help="Split a single database into per-unit shards")
+    split.add_argument("--source", required=True, help="Existing database file (DB_PATH)")
+    split.add_argument("--root", required=True, help="Shard directory to create (SHARD_ROOT)")
+    split.add_argument("--map", required=True, help="JSON file mapping units to their stake and org groups")
+    listing = sub.add_parser("list", help="List the units of a shard directory")
+    listing.add_argument("--root", required=True)
+    args = parser.parse_args()
+
+    if args.command == "split":
+        with open(args.map, encoding="utf-8") as f:
+            result = split_database(args.source, args.root, json.load(f))
+        print(json.dumps(result, indent=2))
+    else:
+        directory = ShardDirectory(PathlibPath(args.root) / "directory.sqlite3")
+        for unit_id, stake_id in sorted(directory.units().items()):
+            print(f"{unit_id}\t{stake_id}\t{directory.db_file(unit_id)}")
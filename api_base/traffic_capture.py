@@ -0,0 +1,138 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any
+from urllib.parse import parse_qsl
+
+# Largest JSON request body whose shape is recorded; bigger bodies only record their size
+MAX_SHAPE_BODY_BYTES = 64 * 1024
+
+
+def route_template(scope: dict) -> str:
+    """
+    Route template of a handled request (e.g. '/activities/{activity_id}').
+    Starlette records the matched route in the scope; unmatched requests share one label
+    so that random paths cannot create unbounded label sets.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def value_shape(value: Any) -> str:
+    """Describe a value by type only, never by content"""
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, list):
+        return f"list[{len(value)}]"
+    if isinstance(value, dict):
+        return "object"
+    return "null" if value is None else type(value).__name__
+
+
+def body_shape(body: bytes) -> dict[str, str] | None:
+    """Top-level keys of a JSON object body with the type of each value"""
+    if not body or len(body) > MAX_SHAPE_BODY_BYTES:
+        return None
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict):
+        return {"$": value_shape(parsed)}
+    return {key: value_shape(value) for key, value in parsed.items()}
+
+
+class TraceWriter:
+    """Appends trace records as JSON lines from a background thread so requests never wait on disk"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict) -> None:
+        self._queue.put(record)
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                # Drain whatever else is waiting before flushing
+                while not self._queue.empty():
+                    f.write(json.dumps(self._queue.get(), separators=(",", ":")) + "\n")
+                f.flush()
+
+
+class TrafficCaptureMiddleware:
+    """
+    ASGI middleware that records a sanitized trace of every HTTP request for replay.
+    Only the route template, parameter names with value types, body size/shape, status
+    and timing are kept - no ids, names, tokens or medical data.
+    Enable by setting TRAFFIC_CAPTURE_PATH; replay with benchmarks/replay.py.
+    """
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.writer = TraceWriter(path)
+        self.started = time.monotonic()
+        self.started_at = time.time()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.monotonic()
+        # The full size is counted; only bodies small enough for shape inference are kept
+        body = bytearray()
+        received = {"bytes": 0}
+        status = {"code": 500}
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                received["bytes"] += len(chunk)
+                if received["bytes"] <= MAX_SHAPE_BODY_BYTES:
+                    body.extend(chunk)
+                else:
+                    body.clear()
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            query = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+            headers = dict(scope.get("headers") or [])
+            self.writer.write({
+                "t": round(arrived - self.started, 4),
+                "wall": round(self.started_at + (arrived - self.started), 3),
+                "method": scope["method"],
+                "route": route_template(scope),
+                "path_params": sorted((scope.get("path_params") or {}).keys()),
+                "query": {key: value_shape(value) for key, value in query},
+                "authenticated": b"authorization" in headers,
+                "content_type": headers.get(b"content-type", b"").decode("latin-1").split(";")[0] or None,
+                "body_bytes": received["bytes"],
+                "body_shape": body_shape(bytes(body)),
+                "status": status["code"],
+                "duration_ms": round((time.monotonic() - arrived) * 1000, 3),
+            })
+
+
+def capture_path_from_env() -> str | None:
+    """TRAFFIC_CAPTURE_PATH, if set, is the JSON lines file traces are appended to"""
+    return os.getenv("TRAFFIC_CAPTURE_PATH") or None
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Latency added by field-level encryption of youth_medical values.
+
+Measures key derivation (paid once per process), then encrypt and batch decrypt
+of N medical records - the work get_activity_health_reports does per request.
+
+Usage:
+  python benchmarks/bench_field_crypto.py
+  python benchmarks/bench_field_crypto.py --records 500 --repeat 20
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api_base"))
+
+from field_crypto import FieldCipher  # noqa: E402
+
+
+def medical_record(i: int) -> str:
+    return json.dumps({
+        "conditions": "asthma" if i % 7 == 0 else None,
+        "medications": f"inhaler {i}" if i % 5 == 0 else None,
+        "allergies": "peanuts, tree nuts" if i % 3 == 0 else None,
+        "dietary_restrictions": "vegetarian" if i % 11 == 0 else None,
+        "limitations": None,
+        "special_accommodations": None,
+    })
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=300, help="Records per simulated request (default: 300)")
+    parser.add_argument("--repeat", type=int, default=20, help="Simulated requests (default: 20)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cipher = FieldCipher({"v1": "benchmark-secret"}, "v1")
+    derive_ms = (time.perf_counter() - start) * 1000
+
+    plaintexts = [medical_record(i) for i in range(args.records)]
+    encrypt_ms, decrypt_ms = [], []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        sealed = [cipher.encrypt(p, "medical") for p in plaintexts]
+        encrypt_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        opened = cipher.decrypt_many(sealed, "medical")
+        decrypt_ms.append((time.perf_counter() - start) * 1000)
+        assert opened == plaintexts
+
+    print(f"key derivation (once per process): {derive_ms:.2f} ms")
+    print(f"encrypt {args.records} records: median {statistics.median(encrypt_ms):.2f} ms")
+    print(f"decrypt {args.records} records: median {statistics.median(decrypt_ms):.2f} ms "
+          f"({statistics.median(decrypt_ms) * 1000 / args.records:.1f} us/record)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Full rows vs `fields=` sparse fieldsets on the activity list, the reconciliation view and a youth's record.
+
+Seeds a database with datagen.py, then for each view compares the full response with a typical list-view
+fieldset: bytes SQLite hands back for the projection, time to run the query, time to decode the rows (JSON
+columns, decryption of medical data, response models), the JSON payload size, and the median time of the
+whole request through the FastAPI app.  Compression is turned off so payload sizes are the raw JSON.
+
+Usage:
+  python benchmarks/bench_fieldsets.py
+  python benchmarks/bench_fieldsets.py --scale stake --repeat 20
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent / "api_base"
+sys.path.insert(0, str(API_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from datagen import add_scale_arguments, generate, scale_from_args  # noqa: E402
+
+SAMPLE = 50
+
+
+def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def row_bytes(rows) -> int:
+    return sum(len(v) if isinstance(v, (str, bytes)) else 8 for row in rows for v in row if v is not None)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=10, help="Timed repetitions per measurement (default: 10)")
+    args = parser.parse_args()
+
+    db_path = str(Path(tempfile.mkdtemp(prefix="youth-bench-")) / "fieldsets.sqlite3")
+    manifest = generate(db_path, seed=args.seed, **scale_from_args(args))
+
+    # main.py reads its settings at import time
+    os.environ.update({"DB_PATH": db_path, "COMPRESSION": "0", "LIVE_EVENTS": "0", "IDEMPOTENCY": "0"})
+    os.chdir(API_DIR)
+    import main as api
+    from fastapi.testclient import TestClient
+    from fast_json import decode_rows
+    from field_crypto import get_cipher
+    from schema import FullActivity, YouthPermissionSubmission
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cipher = get_cipher()
+    youth_ids = manifest.youth_ids[:SAMPLE]
+    activity_ids = manifest.activity_ids[:SAMPLE]
+
+    def activity_list(fields):
+        columns = api.ACTIVITY_LIST_FIELDS.select(api.ACTIVITY_LIST_FIELDS.parse(fields))
+        rows = conn.execute(f"SELECT {columns} FROM activities").fetchall()
+        return rows, lambda: decode_rows(rows, json_columns=("drivers", "groups"), bool_columns=("requires_permission",), datetime_columns=("date_start", "date_end"))
+
+    def reconcile(fields):
+        selected = api.RECONCILE_FIELDS.parse(fields)
+        sql = f"SELECT {api.RECONCILE_FIELDS.select(selected)} FROM activities WHERE activity_id = ?"
+        rows = [conn.execute(sql, (a,)).fetchone() for a in activity_ids]
+        model = FullActivity if fields is None else api.RECONCILE_FIELDS.model(selected)
+        return rows, lambda: [model.model_validate(v) for v in decode_rows(
+            rows, json_columns=("budget", "participants_youth_ids", "groups", "drivers"),
+            bool_columns=("is_overnight", "is_coed", "bishop_approval", "stake_approval"))]
+
+    def users(fields):
+        selected = api.USER_FIELDS.parse(fields)
+        sql = f"SELECT {api.USER_FIELDS.select(selected)} FROM youth_medical WHERE youth_id = ?"
+        rows = [conn.execute(sql, (y,)).fetchone() for y in youth_ids]
+        model = YouthPermissionSubmission if fields is None else api.USER_FIELDS.model(selected)
+
+        def decode():
+            out = []
+            for row in rows:
+                values = dict(row)
+                for column in ("medical", "emergency_contact"):
+                    if column in values:
+                        values[column] = cipher.decrypt(values[column], column)
+                for column in ("youth", "parent_guardian", "medical", "emergency_contact", "signature"):
+                    if column in values:
+                        values[column] = json.loads(values[column])
+                out.append(model.model_validate(values))
+            return out
+        return rows, decode
+
+    cases = (
+        ("activities-all", activity_list, "activity_name,date_start", lambda f: ["/activities-all?include_past=true" + (f"&fields={f}" if f else "")]),
+        (f"reconcile x{len(activity_ids)}", reconcile, "activity_name,date_start,date_end",
+         lambda f: [f"/activities/reconcile/{a}" + (f"?fields={f}" if f else "") for a in activity_ids]),
+        (f"users/{{id}} x{len(youth_ids)}", users, "youth,signed_at",
+         lambda f: [f"/users/{y}" + (f"?fields={f}" if f else "") for y in youth_ids]),
+    )
+
+    print(f"{'view':<22}{'fields':<34}{'SQL KiB':>9}{'query ms':>10}{'decode ms':>11}{'payload KiB':>13}{'request ms':>12}")
+    with TestClient(api.app) as client:
+        for name, build, sparse, paths in cases:
+            for fields in (None, sparse):
+                rows, decode = build(fields)
+                query_ms = median_ms(lambda: build(fields), args.repeat)
+                decode_ms = median_ms(decode, args.repeat)
+                urls = paths(fields)
+                payload = sum(len(client.get(url).content) for url in urls)
+                request_ms = median_ms(lambda: [client.get(url) for url in urls], args.repeat)
+                print(f"{name:<22}{fields or '(all)':<34}{row_bytes(rows) / 1024:>9.1f}{query_ms:>10.2f}{decode_ms:>11.2f}"
+                      f"{payload / 1024:>13.1f}{request_ms:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
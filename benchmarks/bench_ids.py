@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Insert locality and index size of uuid4 strings vs the time-ordered ids from ids.py.
+
+Fills a table shaped like `activities` (an INTEGER PRIMARY KEY plus a UNIQUE text id) with --rows rows in
+transactions of --batch rows, once per id format, with a page cache far smaller than the table so random
+inserts have to go to disk like they do once a real table outgrows memory.  Reports insert throughput, how
+many pages each batch wrote to the WAL (locality: ordered ids keep dirtying the same right-most pages), and
+the size and fill of the id index from dbstat.
+
+Usage:
+  python benchmarks/bench_ids.py
+  python benchmarks/bench_ids.py --rows 2000000 --cache-kib 4096
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api_base"))
+
+from ids import new_id  # noqa: E402
+
+FORMATS = {
+    "uuid4": lambda: str(uuid.uuid4()),
+    "time-ordered": new_id,
+}
+
+
+def run_format(name: str, workdir: str, args) -> dict:
+    path = os.path.join(workdir, f"{name}.sqlite3")
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{args.cache_kib}")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    wal_path = f"{path}-wal"
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, item_id TEXT UNIQUE, payload TEXT)")
+    make_id = FORMATS[name]
+    payload = "x" * args.payload
+    batches = args.rows // args.batch
+    frames = 0
+    elapsed = 0.0
+    for n in range(batches):
+        rows = [(make_id(), payload) for _ in range(args.batch)]
+        wal_before = os.path.getsize(wal_path)
+        start = time.perf_counter()
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO items (item_id, payload) VALUES (?, ?)", rows)
+        conn.execute("COMMIT")
+        elapsed += time.perf_counter() - start
+        # Every page a commit dirties is appended to the WAL as one frame
+        frames += (os.path.getsize(wal_path) - wal_before) // (page_size + 24)
+        if n % 100 == 99:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    index = conn.execute(
+        "SELECT COUNT(*), SUM(pgsize), SUM(pgsize - unused) FROM dbstat WHERE name = 'sqlite_autoindex_items_1'"
+    ).fetchone()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(path)
+    conn.close()
+    return {
+        "format": name,
+        "id_bytes": len(make_id()),
+        "rows_per_s": args.rows / elapsed,
+        "seconds": elapsed,
+        "pages_per_batch": frames / batches,
+        "index_pages": index[0],
+        "index_mib": index[1] / 1024 / 1024,
+        "index_fill": 100 * index[2] / index[1],
+        "file_mib": size / 1024 / 1024,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000, help="Rows per id format (default: 500000)")
+    parser.add_argument("--batch", type=int, default=1000, help="Rows per transaction (default: 1000)")
+    parser.add_argument("--payload", type=int, default=200, help="Bytes of payload per row (default: 200)")
+    parser.add_argument("--cache-kib", type=int, default=2048, help="Page cache per connection in KiB (default: 2048)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run_format(name, workdir, args) for name in FORMATS]
+
+    columns = ("id_bytes", "rows_per_s", "seconds", "pages_per_batch", "index_pages", "index_mib", "index_fill", "file_mib")
+    print(f"{args.rows} rows in batches of {args.batch}, {args.cache_kib} KiB page cache\n")
+    print(f"{'format':<14}" + "".join(f"{c:>16}" for c in columns))
+    for row in results:
+        print(f"{row['format']:<14}" + "".join(f"{row[c]:>16.2f}" if isinstance(row[c], float) else f"{row[c]:>16}" for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
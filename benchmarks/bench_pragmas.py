@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+SQLite tuning profiles (db.PRAGMA_PROFILES) under a mixed read/write load.
+
+Seeds one database with datagen.py, copies it per profile, then runs reader threads and one writer
+thread for a fixed time.  Like the API, every simulated request opens its own connection through
+DatabaseEngine.connect, so the numbers include the cost of applying the profile.  Readers run the
+permission/health-report style lookups; the writer inserts audit and permission rows.  The
+"+checkpointer" variants set wal_autocheckpoint=0 and run checkpoint.WalCheckpointer in the background,
+which moves checkpoint stalls out of the writer's commits (see the write p99/max columns).
+
+Usage:
+  python benchmarks/bench_pragmas.py
+  python benchmarks/bench_pragmas.py --scale stake --seconds 20 --readers 8
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api_base"))
+
+from checkpoint import WalCheckpointer  # noqa: E402
+from datagen import add_scale_arguments, generate, scale_from_args  # noqa: E402
+from db import PRAGMA_PROFILES, DatabaseEngine  # noqa: E402
+from run import percentile  # noqa: E402
+
+READS = (
+    ("SELECT * FROM activities WHERE activity_id = ?", "activity"),
+    ("SELECT p.youth_id, p.created_at, m.youth FROM permission_given p JOIN youth_medical m ON m.youth_id = p.youth_id "
+     "WHERE p.activity_id = ?", "activity"),
+    ("SELECT * FROM personal_goals WHERE youth_id = ? ORDER BY goal_area", "youth"),
+    ("SELECT activity_id, activity_name, date_start, groups FROM activities WHERE date_end >= ? ORDER BY date_start LIMIT 200",
+     "date"),
+)
+
+
+def reader(engine: DatabaseEngine, manifest, stop: threading.Event, latencies: list[float], seed: int) -> None:
+    i = seed
+    while not stop.is_set():
+        i += 1
+        params = {"activity": manifest.activity_ids[i % len(manifest.activity_ids)],
+                  "youth": manifest.youth_ids[i % len(manifest.youth_ids)], "date": "2026-01-01"}
+        start = time.perf_counter()
+        conn = engine.connect(engine.DB_PATH)
+        for sql, param in READS:
+            conn.execute(sql, (params[param],)).fetchall()
+        conn.close()
+        latencies.append(time.perf_counter() - start)
+
+
+def writer(engine: DatabaseEngine, manifest, stop: threading.Event, latencies: list[float]) -> None:
+    i = 0
+    payload = "x" * 400
+    while not stop.is_set():
+        i += 1
+        start = time.perf_counter()
+        conn = engine.connect(engine.DB_PATH)
+        conn.execute("INSERT INTO audit_log (actor_username, action, success, details) VALUES ('bench', 'WRITE', 1, ?)", (payload,))
+        conn.execute("INSERT INTO permission_given (youth_id, activity_id, permission_code, data) VALUES (?, ?, 'bench', ?)",
+                     (f"bench-{i}", manifest.activity_ids[i % len(manifest.activity_ids)], payload))
+        conn.commit()
+        conn.close()
+        latencies.append(time.perf_counter() - start)
+
+
+def run_profile(template: str, workdir: str, name: str, background: bool, manifest, args) -> dict:
+    db_path = os.path.join(workdir, f"{name}{'-bg' if background else ''}.sqlite3")
+    shutil.copy(template, db_path)
+    engine = DatabaseEngine(db_path)
+    engine.profile = PRAGMA_PROFILES[name]
+    checkpointer = None
+    if background:
+        engine.profile = replace(engine.profile, wal_autocheckpoint=0)
+        checkpointer = WalCheckpointer(db_path, interval=args.checkpoint_interval, optimize_interval=0)
+        checkpointer.start()
+
+    stop = threading.Event()
+    reads: list[list[float]] = [[] for _ in range(args.readers)]
+    writes: list[float] = []
+    threads = [threading.Thread(target=reader, args=(engine, manifest, stop, reads[n], n * 7919)) for n in range(args.readers)]
+    threads.append(threading.Thread(target=writer, args=(engine, manifest, stop, writes)))
+    for thread in threads:
+        thread.start()
+    wal_peak = 0
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        wal_peak = max(wal_peak, os.path.getsize(f"{db_path}-wal") if os.path.exists(f"{db_path}-wal") else 0)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if checkpointer is not None:
+        checkpointer.stop()
+
+    all_reads = sorted(x for per_thread in reads for x in per_thread)
+    writes.sort()
+    return {
+        "profile": name + (" +checkpointer" if background else ""),
+        "reads_per_s": len(all_reads) / args.seconds,
+        "read_p50": percentile(all_reads, 50) * 1000,
+        "read_p95": percentile(all_reads, 95) * 1000,
+        "writes_per_s": len(writes) / args.seconds,
+        "write_p50": percentile(writes, 50) * 1000,
+        "write_p99": percentile(writes, 99) * 1000,
+        "write_max": writes[-1] * 1000 if writes else 0.0,
+        "wal_peak_mb": wal_peak / 1024 / 1024,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument("--seconds", type=float, default=10, help="Load duration per profile (default: 10)")
+    parser.add_argument("--readers", type=int, default=4, help="Concurrent reader threads (default: 4)")
+    parser.add_argument("--checkpoint-interval", type=float, default=5, help="Background checkpoint interval (default: 5)")
+    parser.add_argument("--profiles", default=",".join(PRAGMA_PROFILES), help="Comma separated profile names")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        template = os.path.join(workdir, "template.sqlite3")
+        manifest = generate(template, seed=args.seed, **scale_from_args(args))
+        with sqlite3.connect(template) as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        results = []
+        for name in args.profiles.split(","):
+            for background in (False, True):
+                results.append(run_profile(template, workdir, name, background, manifest, args))
+
+    columns = ("profile", "reads_per_s", "read_p50", "read_p95", "writes_per_s", "write_p50", "write_p99", "write_max", "wal_peak_mb")
+    print(f"{args.scale} scale, {args.readers} readers + 1 writer, {args.seconds:.0f}s per profile (latencies in ms)\n")
+    print(f"{columns[0]:<26}" + "".join(f"{c:>14}" for c in columns[1:]))
+    for row in results:
+        print(f"{row['profile']:<26}" + "".join(f"{row[c]:>14.2f}" for c in columns[1:]))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
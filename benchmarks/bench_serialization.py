@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Per-row Pydantic construction + response-model validation + stdlib JSON
+versus bulk row decoding + FastJSONResponse, for the API's largest responses:
+the all-activities list, the goal dashboard and an activity health report.
+
+Usage:
+  python benchmarks/bench_serialization.py
+  python benchmarks/bench_serialization.py --activities 5000 --goals 8000 --repeat 10
+"""
+import argparse
+import json
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api_base"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from fast_json import FastJSONResponse, HAS_ORJSON, decode_rows  # noqa: E402
+from schema import ActivityBase, ActivityHealthReport, MedicalInfo, PersonalGoal  # noqa: E402
+
+GROUPS = ["deacons", "teachers", "priest", "younger young women", "older young women"]
+AREAS = ["physical", "social", "intellectual", "spiritual"]
+
+
+def seed(conn: sqlite3.Connection, activities: int, goals: int, rng: random.Random) -> None:
+    conn.execute("CREATE TABLE activities (activity_id TEXT, activity_name TEXT, date_start TEXT, date_end TEXT, drivers TEXT, description TEXT, groups TEXT, requires_permission INTEGER, location TEXT)")
+    conn.executemany("INSERT INTO activities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        (f"act-{i}", f"Activity {i}", f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T18:00:00",
+         "2026-12-31T21:00:00", json.dumps(["Driver A", "Driver B"]), "Service project at the food bank " * 3,
+         json.dumps(rng.sample(GROUPS, 2)), rng.randint(0, 1), "Stake center")
+        for i in range(activities)
+    ])
+    conn.execute("CREATE TABLE personal_goals (org_group TEXT, youth_id TEXT, goal_area TEXT, goal_name TEXT, goal_description TEXT, target_date TEXT, status TEXT, progress_notes TEXT, completed INTEGER, visibility_level TEXT)")
+    conn.executemany("INSERT INTO personal_goals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        (rng.choice(GROUPS), f"youth-{rng.randint(0, 400)}", rng.choice(AREAS), f"Goal {i}", "Read the scriptures daily",
+         "2026-12-31T00:00:00", "In Progress", json.dumps(["week 1", "week 2"]), rng.randint(0, 1), "group")
+        for i in range(goals)
+    ])
+
+
+def time_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--activities", type=int, default=2000)
+    parser.add_argument("--goals", type=int, default=4000)
+    parser.add_argument("--participants", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    seed(conn, args.activities, args.goals, rng)
+
+    activity_rows = conn.execute("SELECT * FROM activities").fetchall()
+    goal_rows = conn.execute("SELECT * FROM personal_goals ORDER BY org_group, youth_id, goal_area").fetchall()
+    medical_rows = [json.dumps({"allergies": "peanuts", "medications": "inhaler", "conditions": None}) for _ in range(args.participants)]
+
+    activities_adapter = TypeAdapter(Dict[str, List[ActivityBase]])
+    goals_adapter = TypeAdapter(Dict[str, Dict[str, Dict[str, List[PersonalGoal]]]])
+
+    def old_activities():
+        items = [ActivityBase(**{**dict(r), "drivers": json.loads(r["drivers"]), "groups": json.loads(r["groups"])}) for r in activity_rows]
+        validated = activities_adapter.validate_python({"activities": items})
+        return json.dumps(jsonable_encoder(validated)).encode()
+
+    def new_activities():
+        return FastJSONResponse({"activities": decode_rows(activity_rows, json_columns=("drivers", "groups"), bool_columns=("requires_permission",), datetime_columns=("date_start", "date_end"))}).body
+
+    def nest(goals):
+        view = {}
+        for g in goals:
+            view.setdefault(g["org_group"], {}).setdefault(g["youth_id"], {}).setdefault(g["goal_area"], []).append(g)
+        return view
+
+    def old_goals():
+        goals = [PersonalGoal(**{**dict(r), "progress_notes": json.loads(r["progress_notes"]), "completed": bool(r["completed"])}) for r in goal_rows]
+        view = nest([g.model_dump() | {"org_group": g.org_group} for g in goals])
+        return json.dumps(jsonable_encoder(goals_adapter.validate_python(view))).encode()
+
+    def new_goals():
+        return FastJSONResponse(nest(decode_rows(goal_rows, json_columns=("progress_notes",), bool_columns=("completed",), datetime_columns=("target_date",)))).body
+
+    def report(infos):
+        return {
+            "activity_id": "act-1",
+            "allergies": [i["allergies"] for i in infos if i.get("allergies")],
+            "dietary_restrictions": [], "medical_conditions": [], "special_notes": [],
+            "medications": [i["medications"] for i in infos if i.get("medications")],
+        }
+
+    def old_health():
+        infos = [MedicalInfo(**json.loads(m)).model_dump() for m in medical_rows]
+        return json.dumps(jsonable_encoder(ActivityHealthReport(**report(infos)))).encode()
+
+    def new_health():
+        return FastJSONResponse(report([json.loads(m) for m in medical_rows])).body
+
+    print(f"JSON backend: {'orjson' if HAS_ORJSON else 'stdlib json'}")
+    print(f"{'response':<28}{'per-row models (ms)':>22}{'bulk + fast JSON (ms)':>24}{'speedup':>10}")
+    for name, old, new in (
+        (f"activities-all ({args.activities})", old_activities, new_activities),
+        (f"goal-view ({args.goals})", old_goals, new_goals),
+        (f"health report ({args.participants})", old_health, new_health),
+    ):
+        old_ms, new_ms = time_ms(old, args.repeat), time_ms(new, args.repeat)
+        print(f"{name:<28}{old_ms:>22.2f}{new_ms:>24.2f}{old_ms / new_ms:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic ward/stake data for benchmarks.
+
+Seeds a fresh SQLite database (created with the app's own DBSetup) with groups, youth and
+their encrypted medical records, activities, permissions, goals, surveys, visits and audit rows.
+The same --seed and scale always produce the same rows.
+
+Usage:
+  python benchmarks/datagen.py --db /tmp/bench.sqlite3 --scale ward
+  python benchmarks/datagen.py --db /tmp/bench.sqlite3 --groups 40 --youth 2000 --activities 2500
+"""
+import argparse
+import hashlib
+import json
+import random
+import sqlite3
+import sys
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api_base"))
+
+from db_setup import DBSetup  # noqa: E402
+from field_crypto import get_cipher  # noqa: E402
+from permission_codes import backfill_client_codes  # noqa: E402
+
+SCALES = {
+    "small": {"groups": 5, "youth": 100, "activities": 50},
+    "ward": {"groups": 5, "youth": 250, "activities": 400},
+    "stake": {"groups": 50, "youth": 2500, "activities": 4000},
+}
+
+BASE_GROUPS = ["deacons", "teachers", "priest", "younger young women", "older young women"]
+FIRST_NAMES = ["Ann", "Ben", "Cara", "Dan", "Eve", "Finn", "Gus", "Hana", "Ivy", "Jake", "Kate", "Liam", "Mia", "Noah", "Owen", "Pia"]
+LAST_NAMES = ["Smith", "Young", "Lee", "Jensen", "Nielsen", "Taylor", "Brown", "Walker", "Hall", "Allen", "King", "Wright"]
+ACTIVITY_NAMES = ["Temple trip", "Service project", "Youth conference", "Camp out", "Game night", "Family history night", "Hike", "Fireside"]
+AREAS = ["physical", "social", "intellectual", "spiritual"]
+VISIBILITY = ["private", "parents", "group", "group_leaders", "bishopric", "everyone"]
+STATUSES = ["Not Started", "In Progress", "Completed"]
+ALLERGIES = [None, None, None, "peanuts", "shellfish", "penicillin", "bees"]
+MEDICATIONS = [None, None, None, "inhaler", "epipen", "insulin"]
+
+# Fixed "today" so generated dates do not drift between runs
+EPOCH = datetime(2026, 1, 1)
+
+
+@dataclass
+class Manifest:
+    """Ids the benchmark scenarios pick from"""
+    db_path: str
+    seed: int
+    groups: list[str] = field(default_factory=list)
+    youth_ids: list[str] = field(default_factory=list)
+    permission_codes: dict[str, str] = field(default_factory=dict)  # youth_id -> parent permission code
+    activity_ids: list[str] = field(default_factory=list)
+    counts: dict[str, int] = field(default_factory=dict)
+
+
+def group_names(count: int) -> list[str]:
+    if count <= len(BASE_GROUPS):
+        return BASE_GROUPS[:count]
+    # Stake scale: the same five groups in every ward
+    return [f"ward{w + 1} {g}" for w in range((count + len(BASE_GROUPS) - 1) // len(BASE_GROUPS)) for g in BASE_GROUPS][:count]
+
+
+def generate(db_path: str, groups: int, youth: int, activities: int, seed: int = 42,
+             goals_per_youth: int = 3, permission_rate: float = 0.6, audit_rows: int | None = None) -> Manifest:
+    """
+    Create and fill a benchmark database.
+    Args:
+        db_path (str): SQLite file to create (an existing file is replaced)
+        groups (int): Number of org groups
+        youth (int): Number of youth, spread evenly over the groups
+        activities (int): Number of activities, half in the past and half upcoming
+        seed (int): Random seed; identical arguments give identical data
+        goals_per_youth (int): Personal goals per youth
+        permission_rate (float): Share of invited youth who have a permission row
+        audit_rows (int | None): Audit log rows (defaults to 20 per youth)
+    """
+    rng = random.Random(seed)
+    path = Path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(str(path) + suffix).unlink(missing_ok=True)
+
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL;")
+    setup = DBSetup(conn)
+    setup.create_tables()
+    setup.load_admins()
+    setup.mark_current()
+
+    cipher = get_cipher()
+    manifest = Manifest(db_path=str(path), seed=seed, groups=group_names(groups))
+
+    # Youth and their medical releases; siblings share a parent permission code
+    members: dict[str, list[str]] = {g: [] for g in manifest.groups}
+    medical_rows = []
+    code = None
+    for i in range(youth):
+        group = manifest.groups[i % len(manifest.groups)]
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        youth_id = f"{first.lower()}_{last.lower()}_{i}"
+        if code is None or rng.random() > 0.2:
+            code = f"{rng.randint(0, 999999):06d}"
+        medical = {"allergies": rng.choice(ALLERGIES), "medications": rng.choice(MEDICATIONS),
+                   "conditions": "asthma" if rng.random() < 0.1 else None, "dietary_restrictions": None}
+        signature_ref = "sha256:" + hashlib.sha256(youth_id.encode()).hexdigest()
+        medical_rows.append((
+            youth_id, code,
+            json.dumps({"first_name": first, "last_name": last, "org_group": group, "birth_date": "2011-05-01"}),
+            json.dumps({"name": f"Parent {last}", "phone": f"555{rng.randint(1000000, 9999999)}"}),
+            cipher.encrypt(json.dumps(medical), "medical"),
+            cipher.encrypt(json.dumps({"name": f"Parent {last}", "phone": "5550100"}), "emergency_contact"),
+            json.dumps({"signed_by": f"Parent {last}", "signature_ref": signature_ref}),
+            EPOCH.isoformat(),
+        ))
+        members[group].append(youth_id)
+        manifest.youth_ids.append(youth_id)
+        manifest.permission_codes[youth_id] = code
+    conn.executemany(
+        "INSERT INTO youth_medical (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        medical_rows,
+    )
+    # Same state as a migrated database: the parents' own codes are registered with the allocator
+    backfill_client_codes(conn)
+
+    # Activities: half in the past, half upcoming
+    activity_rows, permission_rows = [], []
+    for i in range(activities):
+        activity_id = f"act-{seed}-{i:06d}"
+        activity_groups = rng.sample(manifest.groups, k=min(len(manifest.groups), rng.choice([1, 1, 2])))
+        participants = [y for g in activity_groups for y in members[g]]
+        start = EPOCH + timedelta(days=rng.randint(-365, 365), hours=18)
+        requires_permission = rng.random() < 0.5
+        activity_rows.append((
+            activity_id, rng.choice(ACTIVITY_NAMES), "An activity for the youth of the ward " * 2, "Stake center",
+            json.dumps({"total_amount": 100.0, "items": [], "budget_id": activity_id}),
+            json.dumps(participants), json.dumps(activity_groups), json.dumps(["Brother Smith", "Sister Young"]),
+            start.isoformat(), (start + timedelta(hours=3)).isoformat(),
+            1 if requires_permission else 0,
+            "Went well, repeat next year" if start < EPOCH else None,
+        ))
+        manifest.activity_ids.append(activity_id)
+        if requires_permission:
+            for youth_id in participants:
+                if rng.random() < permission_rate:
+                    granted = (start - timedelta(days=rng.randint(1, 14))).isoformat()
+                    permission_rows.append((youth_id, activity_id, manifest.permission_codes[youth_id], json.dumps({"granted_at": granted}), granted))
+    conn.executemany(
+        """INSERT INTO activities (activity_id, activity_name, description, location, budget, participants_youth_ids, groups, drivers,
+                                   date_start, date_end, requires_permission, thoughts)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        activity_rows,
+    )
+    conn.executemany(
+        "INSERT INTO permission_given (youth_id, activity_id, permission_code, data, created_at) VALUES (?, ?, ?, ?, ?)",
+        permission_rows,
+    )
+
+    # Goals, surveys, visits and audit history
+    goal_rows = []
+    group_of = {y: g for g, ys in members.items() for y in ys}
+    for youth_id in manifest.youth_ids:
+        for n in range(goals_per_youth):
+            goal_rows.append((
+                youth_id, rng.choice(AREAS), f"Goal {n} for {youth_id}", "Read, serve, run and learn every week",
+                (EPOCH + timedelta(days=rng.randint(0, 300))).isoformat(), rng.choice(STATUSES),
+                json.dumps(["started"]), rng.choice(VISIBILITY), group_of[youth_id],
+            ))
+    conn.executemany(
+        """INSERT INTO personal_goals (youth_id, goal_area, goal_name, goal_description, target_date, status, progress_notes, visibility_level, org_group)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        goal_rows,
+    )
+    conn.executemany(
+        "INSERT INTO interest_survey (youth_id, interests, org_group, submitted_at) VALUES (?, ?, ?, ?)",
+        [(y, json.dumps(rng.sample(ACTIVITY_NAMES, 3)), group_of[y], EPOCH.isoformat()) for y in manifest.youth_ids],
+    )
+    conn.executemany(
+        "INSERT INTO concern_survey (concerns, org_group, submitted_at) VALUES (?, ?, ?)",
+        [(json.dumps(["screen time"]), g, EPOCH.isoformat()) for g in manifest.groups],
+    )
+    audit_count = audit_rows if audit_rows is not None else youth * 20
+    conn.executemany(
+        "INSERT INTO audit_log (ts, actor_username, actor_role, action, resource_type, resource_id, success, details, client_ip, user_agent) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [((EPOCH - timedelta(minutes=i * 7)).isoformat(sep=" ", timespec="seconds"), "deacon_advisor", "advisor",
+          rng.choice(["LOGIN", "get_users_health", "get_activity_health_reports"]), "activity",
+          rng.choice(manifest.activity_ids) if manifest.activity_ids else None, 1, "{}", "10.0.0.1", "bench")
+         for i in range(audit_count)],
+    )
+    conn.executemany("INSERT INTO visits (created_at) VALUES (?)",
+                     [((EPOCH - timedelta(minutes=i)).isoformat(sep=" ", timespec="seconds"),) for i in range(youth * 10)])
+    conn.commit()
+    conn.execute("ANALYZE;")
+    conn.close()
+
+    manifest.counts = {
+        "groups": len(manifest.groups), "youth": youth, "activities": activities,
+        "permissions": len(permission_rows), "goals": len(goal_rows), "audit_log": audit_count,
+    }
+    return manifest
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--scale", choices=sorted(SCALES), default="ward", help="Preset size (default: ward)")
+    parser.add_argument("--groups", type=int, help="Override the preset's group count")
+    parser.add_argument("--youth", type=int, help="Override the preset's youth count")
+    parser.add_argument("--activities", type=int, help="Override the preset's activity count")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+
+
+def scale_from_args(args: argparse.Namespace) -> dict[str, int]:
+    scale = dict(SCALES[args.scale])
+    for key in ("groups", "youth", "activities"):
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+    return scale
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="SQLite file to create")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    manifest = generate(args.db, seed=args.seed, **scale_from_args(args))
+    print(json.dumps({k: v for k, v in asdict(manifest).items() if k in ("db_path", "seed", "counts")}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Cold-start profile of the API: how long `import main` takes and which modules cost the most.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters, reports the median
+import time of `main` and the heaviest modules, and fails when the median exceeds a budget
+or when a lazily loaded subsystem is imported at startup.
+
+Usage:
+  python benchmarks/import_time.py
+  python benchmarks/import_time.py --runs 7 --top 25
+  python benchmarks/import_time.py --budget-ms 900
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent / "api_base"
+
+# Subsystems main.py must only import on first use
+LAZY_MODULES = ("qrcode", "icalendar", "twilio", "PIL")
+
+
+def profile_once(python: str) -> dict[str, tuple[int, int]]:
+    """Map of module -> (self us, cumulative us) for one cold `import main`"""
+    env = dict(os.environ, DB_PATH=os.environ.get("DB_PATH", "/tmp/import-time.sqlite3"))
+    proc = subprocess.run([python, "-X", "importtime", "-c", "import main"], cwd=API_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to sample (default: 5)")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest modules to list (default: 15)")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1200")),
+                        help="Fail when the median import of main exceeds this (default: 1200, or IMPORT_BUDGET_MS)")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter to profile (default: this one)")
+    args = parser.parse_args()
+
+    runs = [profile_once(args.python) for _ in range(args.runs)]
+    totals = [run["main"][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals)
+
+    # Per-module medians across runs, ranked by time spent in the module itself
+    names = set().union(*runs)
+    ranked = sorted(
+        ((name, statistics.median(run.get(name, (0, 0))[0] for run in runs) / 1000,
+          statistics.median(run.get(name, (0, 0))[1] for run in runs) / 1000) for name in names),
+        key=lambda item: item[1], reverse=True,
+    )
+    print(f"import main: median {median_ms:.1f} ms over {args.runs} runs (min {min(totals):.1f}, max {max(totals):.1f})\n")
+    print(f"{'module':<50}{'self ms':>10}{'cumulative ms':>15}")
+    for name, self_ms, cumulative_ms in ranked[:args.top]:
+        print(f"{name:<50}{self_ms:>10.1f}{cumulative_ms:>15.1f}")
+
+    failures = []
+    eager = sorted({name.split(".")[0] for name in names} & set(LAZY_MODULES))
+    if eager:
+        failures.append(f"imported at startup but should load lazily: {', '.join(eager)}")
+    if median_ms > args.budget_ms:
+        failures.append(f"median {median_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
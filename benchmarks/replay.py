@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Replay captured traffic against a running API, compressed in time.
+
+Traces come from the API's TrafficCaptureMiddleware (set TRAFFIC_CAPTURE_PATH).  They hold
+only route templates and parameter shapes, so concrete ids are drawn from the database
+the target instance serves (--db): activity ids, youth ids, groups and permission codes.
+
+Rehearse "permission night" - most parents opening the link within 20 minutes - at 10x:
+
+  python benchmarks/datagen.py --db /tmp/night.sqlite3 --scale ward
+  DB_PATH=/tmp/night.sqlite3 uvicorn main:app --port 8000      # from api_base/
+  python benchmarks/replay.py --trace traces.jsonl --db /tmp/night.sqlite3 --speed 10 --concurrency 32
+
+Options:
+  --speed        1, 10, 100... replay the trace's timeline this many times faster
+  --concurrency  maximum requests in flight
+  --loops        play the trace this many times back to back
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run import percentile  # noqa: E402
+
+
+class ValuePool:
+    """Concrete parameter values read from the target instance's database"""
+
+    def __init__(self, db_path: str, rng: random.Random):
+        self.rng = rng
+        conn = sqlite3.connect(db_path)
+        try:
+            self.activity_ids = [r[0] for r in conn.execute("SELECT activity_id FROM activities")]
+            youth = conn.execute("SELECT youth_id, permission_code, json_extract(youth, '$.org_group') FROM youth_medical").fetchall()
+            self.goal_keys = conn.execute("SELECT youth_id, goal_name FROM personal_goals LIMIT 5000").fetchall()
+        finally:
+            conn.close()
+        self.youth_ids = [r[0] for r in youth]
+        self.code_of = {r[0]: r[1] for r in youth}
+        self.groups = sorted({r[2] for r in youth if r[2]}) or ["deacons"]
+        self.pools: dict[str, list] = {
+            "activity_id": self.activity_ids,
+            "acivity_id": self.activity_ids,
+            "youth_id": self.youth_ids,
+            "group": self.groups,
+            "org_group": self.groups,
+            "parent_code": sorted(set(self.code_of.values())),
+            "permission_code": sorted(set(self.code_of.values())),
+            "q": ["temple", "service", "camp", "hike"],
+        }
+
+    def value(self, name: str, shape: str = "str") -> str | None:
+        pool = self.pools.get(name)
+        if pool:
+            return str(self.rng.choice(pool))
+        if name == "goal_name" and self.goal_keys:
+            return self.rng.choice(self.goal_keys)[1]
+        if shape == "bool":
+            return "true"
+        if shape == "number":
+            return "1"
+        return None
+
+
+def _permission_body(pool: ValuePool) -> dict[str, Any]:
+    youth_id = pool.rng.choice(pool.youth_ids)
+    return {"json": {
+        "youth_id": youth_id,
+        "activity_id": pool.rng.choice(pool.activity_ids),
+        "granted_at": datetime.now(timezone.utc).isoformat(),
+        "permission_code": pool.code_of[youth_id],
+        "granted_ip": "10.0.0.1",
+    }}
+
+
+def _user_body(pool: ValuePool) -> dict[str, Any]:
+    n = pool.rng.randint(0, 10**9)
+    return {"json": {
+        "permission_code": f"{n % 1000000:06d}",
+        "youth": {"first_name": f"Replay{n}", "last_name": "Youth", "org_group": pool.rng.choice(pool.groups)},
+        "parent_guardian": {"name": "Replay Parent", "phone": "5550100"},
+        "medical": {"allergies": None},
+        "emergency_contact": {"name": "Replay Parent", "phone": "5550100"},
+        "signature": {"signed_by": "Replay Parent", "signature_image_base64": "iVBORw0KGgo="},
+        "signed_at": datetime.now(timezone.utc).isoformat(),
+    }}
+
+
+# Request bodies for the write routes the replay knows how to fake
+BODY_BUILDERS: dict[tuple[str, str], Callable[[ValuePool], dict[str, Any]]] = {
+    ("POST", "/activity-permissions"): _permission_body,
+    ("POST", "/users"): _user_body,
+    ("POST", "/token"): lambda pool: {"data": {"username": "deacon_advisor", "password": "password_da"}},
+    ("POST", "/interest-survey"): lambda pool: {"json": {"youth_id": pool.rng.choice(pool.youth_ids), "interests": ["hiking"], "org_group": pool.rng.choice(pool.groups)}},
+    ("POST", "/group-concerns"): lambda pool: {"json": {"concerns": ["screen time"], "org_group": pool.rng.choice(pool.groups)}},
+}
+
+
+def build_request(record: dict, pool: ValuePool, token: str) -> dict[str, Any] | None:
+    """Turn a sanitized trace record into concrete httpx request arguments (None if it cannot be faked)"""
+    method, route = record["method"], record["route"]
+    if route == "unmatched":
+        return None
+    path = route
+    for name in record.get("path_params", []):
+        value = pool.value(name)
+        if value is None:
+            return None
+        path = path.replace("{" + name + "}", value)
+
+    params = {}
+    for name, shape in record.get("query", {}).items():
+        value = pool.value(name, shape)
+        if value is not None:
+            params[name] = value
+
+    request: dict[str, Any] = {"method": method, "url": path, "params": params, "headers": {}}
+    if record.get("body_bytes"):
+        builder = BODY_BUILDERS.get((method, route))
+        if builder is None:
+            return None
+        request.update(builder(pool))
+    if record.get("authenticated"):
+        request["headers"]["Authorization"] = f"Bearer {token}"
+    return request
+
+
+def make_token() -> str:
+    """Admin token signed with the same SECRET_KEY the target instance uses"""
+    from jose import jwt
+    expire = datetime.now(timezone.utc) + timedelta(hours=2)
+    return jwt.encode({"sub": "replay", "role": "admin", "org_group": "admin", "exp": expire},
+                      os.getenv("SECRET_KEY", "super-secret-key"), algorithm="HS256")
+
+
+async def replay(records: list[dict], base_url: str, pool: ValuePool, token: str, speed: float, concurrency: int) -> dict:
+    stats: dict[str, dict[str, list]] = defaultdict(lambda: {"latencies": [], "errors": [], "skipped": []})
+    semaphore = asyncio.Semaphore(concurrency)
+    lags = []
+    t0 = records[0]["t"] if records else 0.0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=httpx.Limits(max_connections=concurrency)) as client:
+        started = time.perf_counter()
+
+        async def fire(record: dict) -> None:
+            key = f"{record['method']} {record['route']}"
+            request = build_request(record, pool, token)
+            if request is None:
+                stats[key]["skipped"].append(1)
+                return
+            due = (record["t"] - t0) / speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with semaphore:
+                begin = time.perf_counter()
+                lags.append(max(0.0, (begin - started) - due) * 1000)
+                try:
+                    response = await client.request(**request)
+                    if response.status_code >= 400:
+                        stats[key]["errors"].append(response.status_code)
+                except httpx.HTTPError as e:
+                    stats[key]["errors"].append(type(e).__name__)
+                stats[key]["latencies"].append((time.perf_counter() - begin) * 1000)
+
+        await asyncio.gather(*(fire(r) for r in records))
+        wall = time.perf_counter() - started
+
+    report = {"wall_seconds": round(wall, 3), "requests": sum(len(s["latencies"]) for s in stats.values()),
+              "max_schedule_lag_ms": round(max(lags), 1) if lags else 0.0, "routes": {}}
+    for key, s in sorted(stats.items()):
+        latencies = sorted(s["latencies"])
+        report["routes"][key] = {
+            "requests": len(latencies),
+            "errors": len(s["errors"]),
+            "error_codes": sorted({str(e) for e in s["errors"]}),
+            "skipped": len(s["skipped"]),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+    return report
+
+
+def load_trace(path: str, loops: int) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda r: r["t"])
+    if not records or loops <= 1:
+        return records
+    span = records[-1]["t"] - records[0]["t"] + 1.0
+    return [dict(r, t=r["t"] + i * span) for i in range(loops) for r in records]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", required=True, help="JSON lines file written by TrafficCaptureMiddleware")
+    parser.add_argument("--db", required=True, help="Database the target instance serves (source of concrete ids)")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Target instance (default: http://127.0.0.1:8000)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression factor, e.g. 1, 10, 100 (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight (default: 16)")
+    parser.add_argument("--loops", type=int, default=1, help="Play the trace this many times back to back (default: 1)")
+    parser.add_argument("--token", help="Bearer token for authenticated routes (default: admin token from SECRET_KEY)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    records = load_trace(args.trace, args.loops)
+    pool = ValuePool(args.db, random.Random(args.seed))
+    report = asyncio.run(replay(records, args.base_url, pool, args.token or make_token(), args.speed, args.concurrency))
+    report["meta"] = {"trace": args.trace, "speed": args.speed, "concurrency": args.concurrency, "loops": args.loops}
+
+    print(f"Replayed {report['requests']} requests in {report['wall_seconds']}s at {args.speed}x "
+          f"(max schedule lag {report['max_schedule_lag_ms']} ms)\n")
+    print(f"{'route':<52}{'n':>6}{'err':>6}{'skip':>6}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for key, r in report["routes"].items():
+        print(f"{key:<52}{r['requests']:>6}{r['errors']:>6}{r['skipped']:>6}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark suite.
+
+Seeds a synthetic database (datagen.py), drives the FastAPI app in-process through its
+test client and reports p50/p95/p99 latency and throughput per scenario (scenarios.py).
+Results are written as JSON so runs can be compared with a saved baseline.
+
+Usage:
+  python benchmarks/run.py
+  python benchmarks/run.py --scale stake --requests 500 --concurrency 4
+  python benchmarks/run.py --output benchmarks/results/baseline.json
+  python benchmarks/run.py --baseline benchmarks/results/baseline.json --max-regression 15
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+API_DIR = BENCH_DIR.parent / "api_base"
+sys.path.insert(0, str(API_DIR))
+
+from datagen import add_scale_arguments, generate, scale_from_args  # noqa: E402
+from scenarios import SCENARIOS  # noqa: E402
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_scenario(client, scenario, manifest, headers, requests: int, warmup: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    # Build every request up front so only the HTTP round trip is timed
+    calls = [scenario.build(rng, manifest, headers) for _ in range(warmup + requests)]
+
+    def send(kwargs: dict) -> tuple[float, int]:
+        start = time.perf_counter()
+        response = client.request(scenario.method, **kwargs)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    for kwargs in calls[:warmup]:
+        send(kwargs)
+
+    wall_start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, calls[warmup:]))
+    else:
+        results = [send(kwargs) for kwargs in calls[warmup:]]
+    wall = time.perf_counter() - wall_start
+
+    latencies = sorted(ms for ms, _ in results)
+    errors = sum(1 for _, code in results if code >= 400)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "throughput_rps": round(requests / wall, 1) if wall else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Print a comparison with a baseline run and return the scenarios that regressed"""
+    regressions = []
+    print(f"\n{'scenario':<22}{'p50 base':>10}{'p50 now':>10}{'delta':>9}{'p95 base':>10}{'p95 now':>10}{'delta':>9}")
+    for name, now in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms"):
+            deltas.append((now[key] - base[key]) / base[key] * 100 if base[key] else 0.0)
+        print(f"{name:<22}{base['p50_ms']:>10.2f}{now['p50_ms']:>10.2f}{deltas[0]:>8.1f}%"
+              f"{base['p95_ms']:>10.2f}{now['p95_ms']:>10.2f}{deltas[1]:>8.1f}%")
+        if max(deltas) > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS), help="Scenarios to run (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per scenario (default: 200)")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per scenario (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Client threads (default: 1)")
+    parser.add_argument("--db", help="Database file to seed (default: a temporary file)")
+    parser.add_argument("--output", help="Write results JSON here (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Fail when p50/p95 regress by more than this percent (default: 20)")
+    args = parser.parse_args()
+
+    scale = scale_from_args(args)
+    db_path = args.db or str(Path(tempfile.mkdtemp(prefix="youth-bench-")) / "bench.sqlite3")
+    print(f"Seeding {db_path} with {scale} (seed {args.seed})...")
+    manifest = generate(db_path, seed=args.seed, **scale)
+
+    # main.py reads DB_PATH at import time
+    os.environ["DB_PATH"] = db_path
+    os.chdir(API_DIR)
+    import main as api
+    from fastapi.testclient import TestClient
+
+    headers = {"Authorization": "Bearer " + api.create_access_token({"sub": "bench_admin", "role": "admin", "org_group": "admin"})}
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "scale": scale,
+            "counts": manifest.counts,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": {},
+    }
+
+    print(f"\n{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}")
+    with TestClient(api.app) as client:
+        for name in args.scenarios:
+            stats = run_scenario(client, SCENARIOS[name], manifest, headers, args.requests, args.warmup, args.concurrency, args.seed)
+            results["scenarios"][name] = stats
+            print(f"{name:<22}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['throughput_rps']:>9.1f}{stats['errors']:>8}")
+
+    output = Path(args.output) if args.output else BENCH_DIR / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        if regressions:
+            print(f"\nRegressed by more than {args.max_regression}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
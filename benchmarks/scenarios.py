@@ -0,0 +1,59 @@
+"""
+Benchmark scenarios: each one builds a single request against data from datagen.Manifest.
+A scenario's build function receives a seeded random.Random so runs are repeatable.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from datagen import Manifest
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    build: Callable[[random.Random, Manifest, dict[str, str]], dict[str, Any]]
+    description: str = ""
+
+
+def _login(rng: random.Random, manifest: Manifest, headers: dict[str, str]) -> dict[str, Any]:
+    return {"url": "/token", "data": {"username": "deacon_advisor", "password": "password_da"}}
+
+
+def _permission_submit(rng: random.Random, manifest: Manifest, headers: dict[str, str]) -> dict[str, Any]:
+    youth_id = rng.choice(manifest.youth_ids)
+    return {
+        "url": "/activity-permissions",
+        "json": {
+            "youth_id": youth_id,
+            "activity_id": rng.choice(manifest.activity_ids),
+            "granted_at": datetime.now(timezone.utc).isoformat(),
+            "permission_code": manifest.permission_codes[youth_id],
+            "granted_ip": "10.0.0.1",
+        },
+    }
+
+
+def _health_report(rng: random.Random, manifest: Manifest, headers: dict[str, str]) -> dict[str, Any]:
+    return {"url": f"/activity-health-reports/{rng.choice(manifest.activity_ids)}", "headers": headers}
+
+
+def _activities_all(rng: random.Random, manifest: Manifest, headers: dict[str, str]) -> dict[str, Any]:
+    return {"url": "/activities-all", "params": {"include_past": "true"}}
+
+
+def _approval_dashboard(rng: random.Random, manifest: Manifest, headers: dict[str, str]) -> dict[str, Any]:
+    return {"url": "/activities-pending-approval", "headers": headers}
+
+
+SCENARIOS = {
+    s.name: s for s in (
+        Scenario("login", "POST", _login, "POST /token with a seeded advisor"),
+        Scenario("permission_submit", "POST", _permission_submit, "Parent records permission for one youth"),
+        Scenario("health_report", "GET", _health_report, "Decrypted health summary for one activity"),
+        Scenario("activities_all", "GET", _activities_all, "Every activity, past included"),
+        Scenario("approval_dashboard", "GET", _approval_dashboard, "Upcoming activities awaiting approval with permission counts"),
+    )
+}
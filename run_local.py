@@ -10,6 +10,7 @@ Usage examples:
   python run_local.py
   python run_local.py --web-port 8080 --api-port 8000
   python run_local.py --bind 0.0.0.0
+  python run_local.py --workers 4      # multi-process API, no auto-reload
 """
 
 from __future__ import annotations
@@ -48,6 +49,7 @@ def main() -> int:
     parser.add_argument("--web-port", type=int, default=8080, help="Web server port (default: 8080)")
     parser.add_argument("--bind", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
     parser.add_argument("--no-install", action="store_true", help="Skip pip install step")
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes (default: 1; >1 disables --reload)")
     args = parser.parse_args()
 
     # Basic structure checks
@@ -71,19 +73,20 @@ def main() -> int:
             print("ERROR: pip install failed.")
             return code
 
-    # Start API via uvicorn (reload enabled for dev)
+    # Start API via uvicorn (reload enabled for dev, or several workers)
     # Assumes FastAPI app is defined as `app` inside api_base/main.py
     api_cmd = [
         sys.executable,
         "-m",
         "uvicorn",
         "main:app",
-        "--reload",
         "--host",
         args.bind,
         "--port",
         str(args.api_port),
     ]
+    # uvicorn cannot combine --reload with --workers; the first worker sets up the DB, the rest wait for it
+    api_cmd += ["--workers", str(args.workers)] if args.workers > 1 else ["--reload"]
 
     # Start web server to host new_site/
     web_cmd = [
@@ -104,7 +107,8 @@ def main() -> int:
 
     print("\nServers starting...")
     print(f"  Web: http://{args.bind}:{args.web_port}/  (serving {site_dir})")
-    print(f"  API: http://{args.bind}:{args.api_port}/  (uvicorn reload)")
+    api_mode = f"{args.workers} workers" if args.workers > 1 else "uvicorn reload"
+    print(f"  API: http://{args.bind}:{args.api_port}/  ({api_mode})")
     print("\nPress Ctrl+C to stop both.\n")
 
     def shutdown():
@@ -0,0 +1,20 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# api_base modules import each other by their flat names (from schema import ...)
+API_DIR = Path(__file__).resolve().parent.parent / "api_base"
+sys.path.insert(0, str(API_DIR))
+os.environ.setdefault("ENV", "test")
+
+from db import DatabaseEngine  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    """A fresh database with the full schema and the seeded admin users"""
+    path = tmp_path / "data.sqlite3"
+    DatabaseEngine(str(path)).prepare_database(path).close()
+    return str(path)
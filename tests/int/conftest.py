@@ -0,0 +1,121 @@
+import base64
+import importlib
+import os
+import sqlite3
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32).decode()
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """main.py with its database under a temporary directory (main reads its settings at import time)"""
+    root = tmp_path_factory.mktemp("api")
+    os.environ.update({
+        "DB_PATH": str(root / "data.sqlite3"),
+        "IDEMPOTENCY": "1",
+        "LIVE_EVENTS": "0",
+        "COMPRESSION": "0",
+    })
+    return importlib.import_module("main")
+
+
+@pytest.fixture(scope="session")
+def client(api):
+    with TestClient(api.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def auth(api):
+    """Authorization header for a token with the given role, group and username"""
+    def header(role: str, org_group: str = "admin", sub: str | None = None) -> dict[str, str]:
+        token = api.create_access_token({"sub": sub or f"{role}-{uuid.uuid4().hex[:8]}", "role": role, "org_group": org_group})
+        return {"Authorization": f"Bearer {token}"}
+    return header
+
+
+def submission(email: str, org_group: str = "deacons", permission_code: str | None = None, first_name: str = "Sam") -> dict:
+    """A POST /users body for one youth of the household `email`"""
+    body = {
+        "youth": {"first_name": first_name, "last_name": "Tester", "org_group": org_group},
+        "parent_guardian": {"name": "Pat Tester", "phone": "555-0100", "email": email},
+        "medical": {"allergies": "peanuts"},
+        "emergency_contact": {"name": "Lee Tester", "phone": "555-0101"},
+        "signature": {"signed_by": "Pat Tester", "signature_image_base64": PNG},
+        "signed_at": "2026-01-05T10:00:00Z",
+    }
+    if permission_code is not None:
+        body["permission_code"] = permission_code
+    return body
+
+
+def household() -> str:
+    return f"{uuid.uuid4().hex[:12]}@example.com"
+
+
+def create_activity(client, groups: list[str], name: str = "Campout") -> str:
+    response = client.post("/activities", json={
+        "activity_id": "", "name": name, "description": "Overnight campout", "date": "2026-07-01",
+        "location": "Camp", "budget": {"total_amount": 0, "items": [], "budget_id": "b1"},
+        "drivers": [], "groups": groups, "start_time": "2026-07-01T09:00:00", "end_time": "2026-07-02T12:00:00",
+        "requires_permission": True,
+    })
+    assert response.status_code == 200
+    return response.json()["activity_id"]
+
+
+def unused_code(api) -> str:
+    conn = sqlite3.connect(api.DB_PATH)
+    try:
+        taken = {row[0] for row in conn.execute("SELECT code FROM permission_codes")}
+    finally:
+        conn.close()
+    return next(f"{n:06d}" for n in range(123456, 10**6) if f"{n:06d}" not in taken)
+
+
+LEVELS = ("private", "parents", "group", "group_leaders", "bishopric", "everyone")
+
+# (who, token role and group or None for the youth's own account, goal levels they see of a deacon's goals)
+VISIBLE_TO = [
+    ("own youth", None, set(LEVELS)),
+    ("youth of the group", ("youth", "deacons"), {"group", "everyone"}),
+    ("youth of another group", ("youth", "teachers"), {"everyone"}),
+    ("advisor of the group", ("advisor", "deacons"), {"group", "group_leaders", "bishopric", "everyone"}),
+    ("advisor of another group", ("advisor", "teachers"), set()),
+    ("bishop", ("bishop", "ecc_admin"), {"group", "group_leaders", "bishopric", "everyone"}),
+]
+
+
+@pytest.fixture(scope="session")
+def family(api, client, auth):
+    """A deacon with one goal per visibility level, a youth account and a parent account linked to them"""
+    email = household()
+    youth_id = client.post("/users", json=submission(email, "deacons")).json()["youth_id"]
+    word = f"zq{uuid.uuid4().hex[:8]}"
+    youth_user = f"youth-{word}"
+    created = client.post("/youth", params={"username": youth_user, "password": "pw", "group": "deacons", "youth_id": youth_id})
+    assert created.status_code == 200
+    for level in LEVELS:
+        response = client.post("/goals", headers=auth("youth", "deacons", youth_user), json={
+            "youth_id": youth_id, "goal_area": "physical", "goal_name": f"{word} {level}",
+            "goal_description": "Run a 5k", "target_date": "2026-09-01T00:00:00Z", "visibility_level": level,
+        })
+        assert response.status_code == 200
+
+    parent_user = f"parent-{word}"
+    conn = sqlite3.connect(api.DB_PATH)
+    with conn:
+        conn.execute(
+            "INSERT INTO admin_users (username, password, role, org_group, user_id, household_id) VALUES (?, 'pw', 'parent', 'parents', ?, ?)",
+            (parent_user, str(uuid.uuid4()), email),
+        )
+    conn.close()
+    return {"youth_id": youth_id, "word": word, "youth": youth_user, "parent": parent_user}
+
+
+def headers_for(auth, family, token) -> dict[str, str]:
+    return auth("youth", "deacons", family["youth"]) if token is None else auth(*token)
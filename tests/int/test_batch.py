@@ -0,0 +1,43 @@
+from .conftest import create_activity
+
+
+def batch(client, headers, *paths):
+    response = client.post("/batch", json={"requests": [{"path": path} for path in paths]}, headers=headers)
+    assert response.status_code == 200
+    return response.json()["responses"]
+
+
+def test_sub_requests_keep_their_route_roles(client, auth):
+    # /activity-groups is not open to bishops, /search is
+    responses = batch(client, auth("bishop", "ecc_admin"), "/activity-groups", "/search?q=campout")
+    assert [r["status"] for r in responses] == [403, 200]
+    assert responses[0]["body"] == {"detail": "Insufficient permissions"}
+    assert [r["status"] for r in batch(client, auth("advisor", "deacons"), "/activity-groups")] == [200]
+
+
+def test_routes_outside_the_whitelist_are_not_found(client, auth, family):
+    responses = batch(client, auth("admin"), f"/users/{family['youth_id']}", "/activities-all/../users", "/health")
+    assert [r["status"] for r in responses] == [404, 404, 404]
+    assert responses[0]["body"] == {"detail": "Route is not available in a batch"}
+
+
+def test_batch_results_match_the_routes(client, auth):
+    activity_id = create_activity(client, ["deacons"], name="Batch campout")
+    headers = auth("advisor", "deacons")
+    responses = client.post("/batch", json={"requests": [
+        {"id": "all", "path": "/activities-all?include_past=true&fields=activity_name"},
+        {"path": "/activity-groups"},
+        {"path": "/search?q=c"},
+    ]}, headers=headers).json()["responses"]
+    assert [r["id"] for r in responses] == ["all", "1", "2"]
+    assert responses[0]["body"] == client.get("/activities-all", params={"include_past": "true", "fields": "activity_name"}).json()
+    assert {"activity_id": activity_id, "activity_name": "Batch campout"} in responses[0]["body"]["activities"]
+    assert responses[1]["body"] == client.get("/activity-groups", headers=headers).json()
+    # Query(...) constraints apply as they do on the route: q needs two characters
+    assert responses[2]["status"] == 422
+
+
+def test_batch_itself_needs_a_leader_role(client, auth, family):
+    body = {"requests": [{"path": "/activities-all"}]}
+    assert client.post("/batch", json=body).status_code == 401
+    assert client.post("/batch", json=body, headers=auth("parent", "parents", family["parent"])).status_code == 403
@@ -0,0 +1,51 @@
+import uuid
+
+import pytest
+
+from .conftest import create_activity, household, submission, unused_code
+
+
+def test_batch_grant_outcomes(client):
+    email = household()
+    deacon = client.post("/users", json=submission(email, "deacons")).json()
+    teacher = client.post("/users", json=submission(email, "teachers", first_name="Alex")).json()
+    code = deacon["permission_code"]
+    deacons_activity = create_activity(client, ["deacons"])
+    missing_activity = str(uuid.uuid4())
+    missing_youth = str(uuid.uuid4())
+
+    response = client.post("/activity-permissions/batch", json={
+        "permission_code": code,
+        "youth_ids": [deacon["youth_id"], teacher["youth_id"], missing_youth],
+        "activity_ids": [deacons_activity, missing_activity],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    outcomes = {(r["youth_id"], r["activity_id"]): r["status"] for r in body["results"]}
+    assert body["granted"] == 1
+    assert outcomes == {
+        (deacon["youth_id"], deacons_activity): "granted",
+        (deacon["youth_id"], missing_activity): "unknown_activity",
+        (teacher["youth_id"], deacons_activity): "not_in_group",
+        (teacher["youth_id"], missing_activity): "unknown_activity",
+        (missing_youth, deacons_activity): "unknown_youth",
+        (missing_youth, missing_activity): "unknown_youth",
+    }
+
+    # Every sibling by default; the earlier grant is reported, not repeated
+    again = client.post("/activity-permissions/batch", json={"permission_code": code, "activity_ids": [deacons_activity]}).json()
+    assert again["granted"] == 0
+    assert {r["youth_id"]: r["status"] for r in again["results"]} == {
+        deacon["youth_id"]: "already_granted",
+        teacher["youth_id"]: "not_in_group",
+    }
+
+
+@pytest.mark.parametrize("code, status", [("12345", 422), ("abcdef", 422)])
+def test_batch_grant_rejects_malformed_codes(client, code, status):
+    assert client.post("/activity-permissions/batch", json={"permission_code": code, "activity_ids": ["a"]}).status_code == status
+
+
+def test_batch_grant_unknown_code(api, client):
+    response = client.post("/activity-permissions/batch", json={"permission_code": unused_code(api), "activity_ids": ["a"]})
+    assert response.status_code == 404
@@ -0,0 +1,56 @@
+import json
+import sqlite3
+
+from .conftest import create_activity
+
+
+def decrypt_audits(api) -> list[tuple]:
+    conn = sqlite3.connect(api.DB_PATH)
+    try:
+        return conn.execute("SELECT actor_username, actor_role FROM audit_log WHERE action = 'decrypt_medical'").fetchall()
+    finally:
+        conn.close()
+
+
+def test_fields_projection(client, auth, family, api):
+    headers = auth("admin")
+    full = client.get(f"/users/{family['youth_id']}", headers=headers).json()
+    assert full["medical"]["allergies"] == "peanuts"
+
+    audits = len(decrypt_audits(api))
+    response = client.get(f"/users/{family['youth_id']}", params={"fields": "youth,signed_at"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"youth_id": family["youth_id"], "youth": full["youth"], "signed_at": full["signed_at"]}
+    assert len(decrypt_audits(api)) == audits
+
+    assert client.get(f"/users/{family['youth_id']}", params={"fields": "youth,password"}, headers=headers).status_code == 400
+
+
+def test_medical_reads_need_a_medical_role_and_are_audited(client, auth, family, api):
+    assert client.get(f"/users/{family['youth_id']}").status_code == 401
+    assert client.get(f"/users/{family['youth_id']}", headers=auth("parent", "parents", family["parent"])).status_code == 403
+    assert client.get(f"/users/{family['youth_id']}", headers=auth("youth", "deacons", family["youth"])).status_code == 403
+    response = client.get(f"/users/{family['youth_id']}", params={"fields": "medical"}, headers=auth("advisor", "deacons", "deacon_advisor"))
+    assert response.status_code == 200
+    assert decrypt_audits(api)[-1] == ("deacon_advisor", "advisor")
+
+
+def test_fields_projection_on_lists(client):
+    create_activity(client, ["deacons"], name="Service project")
+    response = client.get("/activities-all", params={"include_past": "true", "fields": "activity_name"})
+    assert response.status_code == 200
+    activities = response.json()["activities"]
+    assert activities
+    assert all(set(row) == {"activity_id", "activity_name"} for row in activities)
+
+
+def test_reconcile_fields_and_documented_partial_responses(client):
+    activity_id = create_activity(client, ["deacons"], name="Reconciled trip")
+    response = client.get(f"/activities/reconcile/{activity_id}", params={"fields": "activity_name,groups"})
+    assert response.json() == {"activity_id": activity_id, "activity_name": "Reconciled trip", "groups": ["deacons"]}
+
+    paths = client.get("/openapi.json").json()["paths"]
+    for path in ("/activities-all", "/activities-all-parents", "/activities/reconcile/{activity_id}", "/users/{youth_id}"):
+        ok = paths[path]["get"]["responses"]["200"]
+        assert "fields=" in ok["description"]
+        assert "anyOf" in json.dumps(ok["content"]["application/json"]["schema"])
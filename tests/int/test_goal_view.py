@@ -0,0 +1,26 @@
+import pytest
+
+from .conftest import LEVELS, VISIBLE_TO, headers_for
+
+
+def visible_levels(client, headers, family) -> set[str]:
+    response = client.get("/goal-view", params={"org_group": "deacons"}, headers=headers)
+    assert response.status_code == 200
+    goals = response.json().get("deacons", {}).get(family["youth_id"], {}).get("physical", [])
+    return {goal["visibility_level"] for goal in goals}
+
+
+@pytest.mark.parametrize("who, token, levels", VISIBLE_TO, ids=[r[0] for r in VISIBLE_TO])
+def test_goal_view_per_role(client, auth, family, who, token, levels):
+    assert visible_levels(client, headers_for(auth, family, token), family) == levels
+
+
+def test_goal_view_for_parents(client, auth, family):
+    assert visible_levels(client, auth("parent", "parents", family["parent"]), family) == set(LEVELS) - {"private"}
+    # A parent account that is not linked to the household sees nothing
+    assert visible_levels(client, auth("parent", "parents"), family) == set()
+
+
+def test_goal_view_filters(client, auth, family):
+    response = client.get("/goal-view", params={"org_group": "deacons", "goal_area": "spiritual"}, headers=auth("admin"))
+    assert family["youth_id"] not in response.json().get("deacons", {})
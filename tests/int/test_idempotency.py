@@ -0,0 +1,74 @@
+import hashlib
+import json
+import sqlite3
+
+from idempotency import IdempotencyMiddleware
+
+from .conftest import household, submission
+
+JSON = {"Content-Type": "application/json"}
+
+
+def post_user(client, body: bytes, key: str):
+    return client.post("/users", content=body, headers={**JSON, "Idempotency-Key": key})
+
+
+def youth_count(api) -> int:
+    conn = sqlite3.connect(api.DB_PATH)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM youth_medical").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_retry_replays_the_first_response(api, client):
+    body = json.dumps(submission(household())).encode()
+    first = post_user(client, body, "retry-1")
+    assert first.status_code == 200
+    before = youth_count(api)
+
+    retry = post_user(client, body, "retry-1")
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert youth_count(api) == before
+
+
+def test_key_reused_for_another_body_is_rejected(client):
+    assert post_user(client, json.dumps(submission(household())).encode(), "reuse-1").status_code == 200
+    response = post_user(client, json.dumps(submission(household())).encode(), "reuse-1")
+    assert response.status_code == 422
+
+
+def test_retry_while_the_first_request_runs_conflicts(api, client):
+    body = json.dumps(submission(household())).encode()
+    store = next(m.kwargs["store"] for m in api.app.user_middleware if m.cls is IdempotencyMiddleware)
+    # The same claim the middleware makes for an anonymous POST /users, left unfinished
+    scope = f"/users {hashlib.sha256(b'').hexdigest()[:16]}"
+    assert store.claim(scope, "running-1", hashlib.sha256(body).digest())[0] == "claimed"
+
+    response = post_user(client, body, "running-1")
+    assert response.status_code == 409
+
+    store.release(scope, "running-1")
+    assert post_user(client, body, "running-1").status_code == 200
+
+
+def test_keys_are_scoped_per_caller(client, auth):
+    body = json.dumps(submission(household())).encode()
+    assert post_user(client, body, "caller-1").status_code == 200
+    other = client.post("/users", content=body, headers={**JSON, **auth("admin"), "Idempotency-Key": "caller-1"})
+    assert other.status_code == 200
+    assert "Idempotent-Replayed" not in other.headers
+
+
+def test_replays_and_conflicts_carry_cors_headers(client):
+    origin = {"Origin": "http://localhost:8080"}
+    body = json.dumps(submission(household())).encode()
+    first = client.post("/users", content=body, headers={**JSON, **origin, "Idempotency-Key": "cors-1"})
+    replay = client.post("/users", content=body, headers={**JSON, **origin, "Idempotency-Key": "cors-1"})
+    mismatch = client.post("/users", content=json.dumps(submission(household())).encode(), headers={**JSON, **origin, "Idempotency-Key": "cors-1"})
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert mismatch.status_code == 422
+    for response in (first, replay, mismatch):
+        assert response.headers["access-control-allow-origin"] in ("*", origin["Origin"])
@@ -0,0 +1,89 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from live_events import EventHub, disable_live_events, install_triggers
+
+
+def grant(db_path: str, youth_id: str, activity_id: str) -> None:
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO permission_given (youth_id, activity_id, permission_code) VALUES (?, ?, '123456')", (youth_id, activity_id))
+    conn.close()
+
+
+def event_ids(db_path: str) -> list[int]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT id FROM live_events ORDER BY id")]
+    finally:
+        conn.close()
+
+
+async def take(stream, count: int) -> list[bytes]:
+    chunks = [await anext(stream) for _ in range(count)]
+    await stream.aclose()
+    return chunks
+
+
+@pytest.fixture
+def hub(db_path):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        install_triggers(conn)
+    conn.close()
+    # Polled by hand instead of from start()'s thread, so every step is deterministic
+    hub = EventHub(db_path, buffer_size=2, heartbeat=5)
+    yield hub
+    hub.stop()
+
+
+def test_triggers_record_grants(hub, db_path):
+    grant(db_path, "y1", "a1")
+    assert len(event_ids(db_path)) == 1
+    disable_live_events(db_path)
+    grant(db_path, "y2", "a1")
+    assert event_ids(db_path) == []
+
+
+def test_resume_from_buffer(hub, db_path):
+    for youth_id in ("y1", "y2", "y3"):
+        grant(db_path, youth_id, "a1")
+    assert hub.poll() == 3
+    _, second, third = event_ids(db_path)
+
+    chunks = asyncio.run(take(hub.stream(activity_id="a1", last_event_id=second), 2))
+    assert chunks[0] == f"retry: 3000\nid: {second}\n\n".encode()
+    assert chunks[1].startswith(f"id: {third}\nevent: permission_granted\n".encode())
+
+
+def test_resume_from_table_past_the_buffer(hub, db_path):
+    for youth_id in ("y1", "y2", "y3"):
+        grant(db_path, youth_id, "a1")
+    grant(db_path, "y4", "a2")
+    hub.poll()
+    first, second, third, _ = event_ids(db_path)
+
+    chunks = asyncio.run(take(hub.stream(activity_id="a1", last_event_id=first), 3))
+    assert [chunk.split(b"\n", 1)[0] for chunk in chunks[1:]] == [f"id: {second}".encode(), f"id: {third}".encode()]
+
+
+def test_live_events_after_resume(hub, db_path):
+    grant(db_path, "y1", "a1")
+    hub.poll()
+    (first,) = event_ids(db_path)
+
+    async def scenario():
+        stream = hub.stream(activity_id="a1", last_event_id=first)
+        await anext(stream)
+        grant(db_path, "y2", "a2")
+        grant(db_path, "y3", "a1")
+        hub.poll()
+        chunk = await asyncio.wait_for(anext(stream), timeout=2)
+        await stream.aclose()
+        return chunk
+
+    chunk = asyncio.run(scenario())
+    assert chunk.startswith(f"id: {event_ids(db_path)[-1]}\n".encode())
+    assert b'"youth_id":"y3"' in chunk.replace(b" ", b"")
@@ -0,0 +1,14 @@
+def test_metrics_token(client, api, monkeypatch):
+    client.get("/health")
+    monkeypatch.setattr(api, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="GET",route="/health",status="200"}' in response.text
+
+
+def test_metrics_are_open_without_a_token(client, api, monkeypatch):
+    monkeypatch.setattr(api, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 200
@@ -0,0 +1,46 @@
+import json
+
+from .conftest import create_activity, household, submission, unused_code
+
+
+def test_client_code_of_another_household_conflicts(api, client, auth):
+    code = unused_code(api)
+    first = client.post("/users", json=submission(household(), permission_code=code))
+    assert first.status_code == 200
+    assert first.json()["permission_code"] == code
+
+    assert client.post("/users", json=submission(household(), permission_code=code)).status_code == 409
+
+    roster = json.dumps([submission(household(), permission_code=code)])
+    report = client.post("/users/import?format=json", content=roster, headers=auth("admin")).json()
+    assert report["counts"]["invalid"] == 1
+    assert report["rows"][0]["errors"][0]["field"] == "permission_code"
+
+
+def test_siblings_share_a_server_issued_code(client):
+    email = household()
+    first = client.post("/users", json=submission(email)).json()
+    second = client.post("/users", json=submission(email, first_name="Alex")).json()
+    assert first["permission_code"] == second["permission_code"]
+    assert first["youth_id"] != second["youth_id"]
+
+
+def test_rotation_retires_the_old_code(client, auth):
+    created = client.post("/users", json=submission(household())).json()
+    old = created["permission_code"]
+    activity_id = create_activity(client, ["deacons"])
+    grant = {"permission_code": old, "activity_ids": [activity_id]}
+    assert client.post("/activity-permissions/batch", json=grant).json()["granted"] == 1
+
+    assert client.post(f"/permission-codes/{old}/rotate", headers=auth("advisor", "deacons")).status_code == 403
+    rotated = client.post(f"/permission-codes/{old}/rotate", headers=auth("admin"))
+    assert rotated.status_code == 200
+    new = rotated.json()["permission_code"]
+    assert new != old
+
+    assert client.post("/activity-permissions/batch", json=grant).status_code == 410
+    assert client.post(f"/permission-codes/{old}/rotate", headers=auth("admin")).status_code == 404
+    # The grant made under the old code still stands
+    results = client.post("/activity-permissions/batch", json={**grant, "permission_code": new}).json()["results"]
+    assert [r["status"] for r in results] == ["already_granted"]
+    assert client.get(f"/users/{created['youth_id']}?fields=permission_code", headers=auth("admin")).json()["permission_code"] == new
@@ -0,0 +1,72 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from retention import ArchiveQuery, RetentionEngine
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def engine(db_path, tmp_path):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO audit_log (ts, actor_username, action, resource_type, resource_id, success) VALUES (?, ?, ?, ?, ?, 1)",
+            [
+                ("2023-01-10 08:00:00", "bishop", "approve_activity", "activity", "a-old"),
+                ("2023-02-10 08:00:00", "admin", "decrypt_medical", "youth", "y-old"),
+                ("2026-05-01 08:00:00", "admin", "decrypt_medical", "youth", "y-new"),
+            ],
+        )
+        conn.executemany("INSERT INTO visits (created_at) VALUES (?)", [("2026-01-01 00:00:00",), ("2026-05-30 00:00:00",)])
+        conn.executemany(
+            "INSERT INTO activities (activity_id, activity_name, description, location, date_start, date_end) VALUES (?, ?, '', '', ?, ?)",
+            [("a-old", "Old camp", "2023-06-01", "2023-06-03"), ("a-new", "New camp", "2026-06-10", "2026-06-12")],
+        )
+        conn.executemany(
+            "INSERT INTO permission_given (youth_id, activity_id, permission_code, created_at) VALUES (?, ?, '123456', ?)",
+            [("y1", "a-old", "2023-05-01 00:00:00"), ("y1", "a-new", "2026-05-01 00:00:00")],
+        )
+    conn.close()
+    return RetentionEngine(db_path, str(tmp_path / "archive.sqlite3"), pause=0)
+
+
+def test_run_moves_rows_past_their_policy(engine, db_path):
+    report = engine.run(force=True, now=NOW)
+    assert report["complete"]
+    assert report["moved"] == {"audit_log": 2, "visits": 1, "activities": 1, "permission_given": 1}
+
+    conn = sqlite3.connect(db_path)
+    assert [r[0] for r in conn.execute("SELECT resource_id FROM audit_log")] == ["y-new"]
+    assert [r[0] for r in conn.execute("SELECT activity_id FROM activities")] == ["a-new"]
+    # Grants of an archived activity go with it
+    assert [r[0] for r in conn.execute("SELECT activity_id FROM permission_given")] == ["a-new"]
+    conn.close()
+
+    # A second run has nothing left to move
+    assert engine.run(force=True, now=NOW)["moved"] == {}
+
+
+def test_run_waits_for_quiet_hours(engine):
+    engine.quiet_hours = (0, 0)
+    assert engine.run() is None
+
+
+def test_archive_query(engine):
+    engine.run(force=True, now=NOW)
+    archive = ArchiveQuery(engine.archive_path)
+
+    rows = archive.search("audit_log")
+    assert [r["resource_id"] for r in rows] == ["y-old", "a-old"]
+    assert [r["resource_id"] for r in archive.search("audit_log", q="approve")] == ["a-old"]
+    assert [r["resource_id"] for r in archive.search("audit_log", filters={"actor_username": "admin"})] == ["y-old"]
+    assert [r["resource_id"] for r in archive.search("audit_log", since="2023-02-01")] == ["y-old"]
+    assert [r["resource_id"] for r in archive.search("audit_log", before_id=rows[0]["id"])] == ["a-old"]
+    assert [r["activity_id"] for r in archive.search("permission_given")] == ["a-old"]
+
+    with pytest.raises(ValueError):
+        archive.search("admin_users")
+    with pytest.raises(ValueError):
+        archive.search("audit_log", filters={"password": "x"})
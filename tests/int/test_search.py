@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from .conftest import VISIBLE_TO, create_activity, headers_for
+
+
+def searched_levels(client, headers, family) -> set[str]:
+    response = client.get("/search", params={"q": family["word"], "kind": "goals"}, headers=headers)
+    assert response.status_code == 200
+    return {hit["title"].split()[-1] for hit in response.json()}
+
+
+@pytest.mark.parametrize("who, token, levels", VISIBLE_TO, ids=[r[0] for r in VISIBLE_TO])
+def test_goal_search_per_role(client, auth, family, who, token, levels):
+    assert searched_levels(client, headers_for(auth, family, token), family) == levels
+
+
+def test_parents_cannot_search(client, auth, family):
+    assert client.get("/search", params={"q": family["word"]}, headers=auth("parent", "parents", family["parent"])).status_code == 403
+
+
+def test_search_ranks_are_normalised(client, auth, family):
+    hits = client.get("/search", params={"q": family["word"]}, headers=auth("admin")).json()
+    assert hits[0]["rank"] == -1
+    assert all(-1 <= hit["rank"] < 0 for hit in hits)
+    assert [hit["rank"] for hit in hits] == sorted(hit["rank"] for hit in hits)
+
+
+def test_build_match_quotes_every_term():
+    from search import SearchEngine
+    assert SearchEngine.build_match('temple "trip" OR') == '"temple"* "trip"* "OR"*'
+    assert SearchEngine.build_match("*()") == ""
+
+
+def test_activity_search_matches_whole_group_names(client, auth):
+    create_activity(client, ["older young women"], "Quiltingbee")
+    own = create_activity(client, ["young women"], "Quiltingbee")
+    hits = client.get("/search", params={"q": "quiltingbee", "kind": "activities"}, headers=auth("advisor", "young women")).json()
+    assert [hit["id"] for hit in hits] == [own]
+
+
+def test_goal_hits_carry_the_goal_id(client, auth, family, api):
+    hits = client.get("/search", params={"q": family["word"], "kind": "goals"}, headers=auth("admin")).json()
+    conn = sqlite3.connect(api.DB_PATH)
+    try:
+        goal_ids = {row[0] for row in conn.execute("SELECT goal_id FROM personal_goals WHERE youth_id = ?", (family["youth_id"],))}
+    finally:
+        conn.close()
+    assert hits and {hit["id"] for hit in hits} <= goal_ids
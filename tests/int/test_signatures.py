@@ -0,0 +1,35 @@
+import base64
+
+from .conftest import PNG, household, submission
+
+
+def test_signature_is_served_to_medical_roles_only(client, auth, family):
+    url = f"/users/{family['youth_id']}/signature"
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers=auth("parent", "parents", family["parent"])).status_code == 403
+
+    response = client.get(url, headers=auth("advisor", "deacons"))
+    assert response.status_code == 200
+    assert response.content == base64.b64decode(PNG)
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["content-security-policy"] == "default-src 'none'"
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_signature_revalidates_with_its_etag(client, auth, family):
+    url = f"/users/{family['youth_id']}/signature"
+    headers = auth("admin")
+    etag = client.get(url, headers=headers).headers["etag"]
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert client.get(url, headers={**headers, "If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_non_image_signatures_are_rejected(client, auth):
+    body = submission(household())
+    body["signature"]["signature_image_base64"] = base64.b64encode(b"<svg onload='alert(1)'></svg>").decode()
+    assert client.post("/users", json=body).status_code == 422
+    assert client.get("/users/missing-youth/signature", headers=auth("admin")).status_code == 404
@@ -0,0 +1,50 @@
+import asyncio
+import sqlite3
+
+from fastapi import Depends, FastAPI
+
+from batch import BatchRouter
+from schema import BatchSubRequest
+
+
+def test_sub_requests_share_one_snapshot(tmp_path):
+    path = str(tmp_path / "data.sqlite3")
+    setup = sqlite3.connect(path)
+    setup.execute("PRAGMA journal_mode = WAL")
+    setup.execute("CREATE TABLE items (name TEXT)")
+    setup.execute("INSERT INTO items VALUES ('first')")
+    setup.commit()
+    setup.close()
+
+    app = FastAPI()
+
+    def get_db():
+        raise AssertionError("a batch passes its own connection")
+
+    def checker(token: str = ""):
+        return {}
+    checker.allowed_roles = {"advisor"}
+
+    @app.get("/count")
+    def count(db=Depends(get_db)):
+        return {"count": db.execute("SELECT COUNT(*) FROM items").fetchone()[0]}
+
+    @app.get("/add/{name}")
+    def add(name: str, user=Depends(checker)):
+        # Another request committing between the batch's reads
+        with sqlite3.connect(path) as other:
+            other.execute("INSERT INTO items VALUES (?)", (name,))
+        return {"added": name, "by": user["sub"]}
+
+    router = BatchRouter(app, ["/count", "/add/{name}"], get_db)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    requests = [BatchSubRequest(path=p) for p in ("/count", "/add/second", "/count")]
+    results = asyncio.run(router.run(None, conn, {"sub": "deacon_advisor", "role": "advisor"}, requests))
+    assert [r["body"] for r in results] == [{"count": 1}, {"added": "second", "by": "deacon_advisor"}, {"count": 1}]
+    # The snapshot ends with the batch
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 2
+
+    results = asyncio.run(router.run(None, conn, {"role": "youth"}, [BatchSubRequest(path="/add/third")]))
+    assert results == [{"id": "0", "status": 403, "body": {"detail": "Insufficient permissions"}}]
+    conn.close()
@@ -0,0 +1,78 @@
+import base64
+import sqlite3
+
+import pytest
+
+from blob_store import LocalBlobStore, decode_base64_image, migrate_inline_signatures, sniff_media_type, store_signature
+from schema import Signature
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+@pytest.fixture
+def store(tmp_path) -> LocalBlobStore:
+    return LocalBlobStore(str(tmp_path / "blobs"))
+
+
+def test_put_is_content_addressed(store):
+    ref = store.put(PNG)
+    assert ref == LocalBlobStore.ref_for(PNG)
+    assert store.put(PNG) == ref
+    assert store.exists(ref)
+    assert store.size(ref) == len(PNG)
+    assert b"".join(store.iter_chunks(ref, chunk_size=7)) == PNG
+    assert not list(store.root.rglob(".tmp-*"))
+    store.delete(ref)
+    assert not store.exists(ref)
+    store.delete(ref)
+
+
+def test_invalid_refs_are_rejected(store):
+    for ref in ("md5:abc", "sha256:" + "0" * 63, "sha256:../../etc/passwd"):
+        with pytest.raises(ValueError):
+            store.exists(ref)
+
+
+def test_sniff_media_type():
+    assert sniff_media_type(PNG[:16]) == "image/png"
+    assert sniff_media_type(b"\xff\xd8\xff\xe0") == "image/jpeg"
+    assert sniff_media_type(b"GIF89a") == "image/gif"
+    assert sniff_media_type(b"RIFF\x00\x00\x00\x00WEBP") == "image/webp"
+    assert sniff_media_type(b"<svg xmlns=") is None
+    assert sniff_media_type(b"") is None
+
+
+def test_decode_base64_image():
+    encoded = base64.b64encode(PNG).decode()
+    assert decode_base64_image(encoded) == PNG
+    assert decode_base64_image(f"data:image/png;base64,{encoded}") == PNG
+    with pytest.raises(ValueError, match="not valid base64"):
+        decode_base64_image("not base64!")
+    html = base64.b64encode(b"<html><script></script></html>").decode()
+    with pytest.raises(ValueError, match="must be a PNG"):
+        decode_base64_image(html)
+    assert decode_base64_image(html, require_image=False).startswith(b"<html>")
+
+
+def test_store_signature_keeps_only_the_reference(store):
+    signature = store_signature(store, Signature(signed_by="Pat", signature_image_base64=base64.b64encode(PNG).decode()))
+    assert signature.signature_image_base64 is None
+    assert signature.signature_ref == LocalBlobStore.ref_for(PNG)
+    assert store.exists(signature.signature_ref)
+
+
+def test_migrate_inline_signatures(store, db_path):
+    conn = sqlite3.connect(db_path)
+    inline = Signature(signed_by="Pat", signature_image_base64=base64.b64encode(PNG).decode()).model_dump_json(exclude_none=True)
+    for youth_id in ("y1", "y2", "y3"):
+        conn.execute(
+            "INSERT INTO youth_medical (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at) "
+            "VALUES (?, '100001', '{}', '{}', '{}', '{}', ?, '2025-01-01')",
+            (youth_id, inline),
+        )
+    conn.commit()
+    assert migrate_inline_signatures(conn, store, batch_size=2) == 3
+    refs = {row[0] for row in conn.execute("SELECT json_extract(signature, '$.signature_ref') FROM youth_medical")}
+    assert refs == {LocalBlobStore.ref_for(PNG)}
+    assert migrate_inline_signatures(conn, store) == 0
+    conn.close()
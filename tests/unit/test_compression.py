@@ -0,0 +1,134 @@
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressedBodyCache, CompressionMiddleware, compression_settings_from_env, negotiate
+
+BODY = '{"activities": [' + ", ".join(f'{{"activity_id": "a{n}", "activity_name": "Campout"}}' for n in range(200)) + "]}"
+
+
+@pytest.mark.parametrize("accept, brotli, expected", [
+    ("gzip, deflate, br", True, "br"),
+    ("gzip, deflate, br", False, "gzip"),
+    ("br;q=0.5, gzip;q=0.8", True, "gzip"),
+    ("br;q=0.8, gzip;q=0.8", True, "br"),
+    ("gzip;q=0", True, None),
+    ("identity", True, None),
+    ("*", False, "gzip"),
+    ("*;q=0.1, gzip;q=0", True, "br"),
+    ("gzip;q=oops", True, None),
+    ("", True, None),
+])
+def test_negotiate(accept, brotli, expected):
+    assert negotiate(accept, brotli_available=brotli) == expected
+
+
+@pytest.fixture
+def cache() -> CompressedBodyCache:
+    return CompressedBodyCache(1024 * 1024)
+
+
+@pytest.fixture
+def client(cache) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, min_size=1024, cache=cache)
+
+    @app.get("/big")
+    def big():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((BODY[i:i + 500] for i in range(0, len(BODY), 500)), media_type="application/x-ndjson")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: " + BODY + "\n\n"]), media_type="text/event-stream")
+
+    @app.get("/image")
+    def image():
+        return Response(b"\x89PNG" + b"\x00" * 4096, media_type="image/png")
+
+    return TestClient(app)
+
+
+def raw(client, path: str, accept: str = "gzip"):
+    return client.get(path, headers={"Accept-Encoding": accept})
+
+
+def test_large_bodies_are_compressed_with_a_weak_etag(client, cache):
+    response = raw(client, "/big")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.text == BODY
+
+    raw(client, "/big")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_identity_keeps_the_strong_etag(client):
+    response = raw(client, "/big", accept="identity")
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == BODY
+
+
+def test_small_and_binary_bodies_pass_through(client):
+    small = raw(client, "/small")
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+    image = raw(client, "/image")
+    assert "content-encoding" not in image.headers
+    assert "vary" not in image.headers
+
+
+def test_streams_are_compressed_as_they_go(client):
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        compressed = b"".join(response.iter_raw())
+    assert zlib.decompress(compressed, 31).decode() == BODY
+
+
+def test_event_streams_are_never_compressed(client):
+    response = raw(client, "/events")
+    assert "content-encoding" not in response.headers
+    assert response.text.startswith("data: ")
+
+
+def test_cache_is_bounded():
+    cache = CompressedBodyCache(800)
+    for n in range(10):
+        cache.put(cache.key("gzip", str(n).encode()), b"x" * 100)
+    assert cache.get(cache.key("gzip", b"0")) is None
+    assert cache.get(cache.key("gzip", b"9")) == b"x" * 100
+    cache.put(cache.key("gzip", b"huge"), b"x" * 101)
+    assert cache.get(cache.key("gzip", b"huge")) is None
+    assert "compression_cache_bytes 800" in cache.metric_lines()
+
+
+def test_gzip_output_is_deterministic():
+    middleware = CompressionMiddleware(None)
+    assert middleware.compress("gzip", BODY.encode()) == middleware.compress("gzip", BODY.encode())
+    assert gzip.decompress(middleware.compress("gzip", BODY.encode())) == BODY.encode()
+
+
+def test_compression_settings_from_env(monkeypatch):
+    monkeypatch.delenv("COMPRESSION", raising=False)
+    monkeypatch.setenv("COMPRESSION_CACHE_MB", "0")
+    monkeypatch.setenv("COMPRESSION_MIN_BYTES", "500")
+    settings = compression_settings_from_env()
+    assert settings["min_size"] == 500 and settings["cache"] is None
+    monkeypatch.setenv("COMPRESSION", "0")
+    assert compression_settings_from_env() is None
@@ -0,0 +1,73 @@
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import fast_json
+from fast_json import FastJSONResponse, decode_rows, normalise_datetime
+from schema import ActivityBase, ReturnGroupActivityList
+
+ROWS = [
+    ("a1", "Campout", "2026-07-01 09:00:00", "2026-07-02T12:00:00Z", '["Pat"]', "Overnight", '["deacons"]', 1, "Camp"),
+    ("a2", "Temple trip", "2026-07-01 09:00:00", "2026-07-01T12:00:00+02:00", "[]", "", '["teachers", "priest"]', 0, "Temple"),
+]
+
+
+@pytest.fixture
+def rows():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE activities (activity_id, activity_name, date_start, date_end, drivers, description, groups, "
+        "requires_permission, location)"
+    )
+    conn.executemany("INSERT INTO activities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", ROWS)
+    yield conn.execute("SELECT * FROM activities ORDER BY activity_id").fetchall()
+    conn.close()
+
+
+def model_json(model, row) -> dict:
+    """What the endpoint returned before FastJSONResponse: json.loads per column, then response model validation"""
+    item = dict(row)
+    for column in ("drivers", "groups"):
+        item[column] = json.loads(item[column])
+    return model.model_validate(item).model_dump(mode="json")
+
+
+@pytest.mark.parametrize("orjson", [True, False], ids=["orjson", "stdlib"])
+def test_decoded_rows_match_the_response_model(rows, monkeypatch, orjson):
+    monkeypatch.setattr(fast_json, "HAS_ORJSON", orjson and fast_json.HAS_ORJSON)
+    decoded = decode_rows(rows, json_columns=("drivers", "groups"), bool_columns=("requires_permission",),
+                          datetime_columns=("date_start", "date_end"))
+    expected = [model_json(ActivityBase, row) for row in rows]
+    assert decoded == expected
+    assert json.loads(FastJSONResponse({"activities": decoded}).body) == {"activities": expected}
+
+
+def test_group_list_matches_its_model(rows):
+    decoded = decode_rows(rows, bool_columns=("requires_permission",), datetime_columns=("date_start",))
+    for item, row in zip(decoded, rows):
+        expected = model_json(ReturnGroupActivityList, row)
+        assert {key: item[key] for key in expected} == expected
+
+
+def test_undecodable_values_are_kept():
+    decoded = decode_rows([{"groups": "not json", "done": None, "when": "someday", "other": "[1]"}],
+                          json_columns=("groups", "missing"), bool_columns=("done",), datetime_columns=("when",))
+    assert decoded == [{"groups": "not json", "done": None, "when": "someday", "other": "[1]"}]
+    assert decode_rows([{"groups": ["already"]}], json_columns=("groups",)) == [{"groups": ["already"]}]
+
+
+def test_normalise_datetime():
+    assert normalise_datetime("2026-05-01") == "2026-05-01T00:00:00"
+    assert normalise_datetime("2026-05-01T10:00:00+00:00") == "2026-05-01T10:00:00Z"
+    assert normalise_datetime("2026-05-01T10:00:00Z") == "2026-05-01T10:00:00Z"
+
+
+def test_stdlib_fallback_encodes_like_orjson(monkeypatch):
+    content = {"name": "Zoë", "when": datetime(2026, 5, 1), 1: True}
+    monkeypatch.setattr(fast_json, "HAS_ORJSON", False)
+    fallback = fast_json.dumps(content)
+    assert json.loads(fallback) == {"name": "Zoë", "when": "2026-05-01 00:00:00", "1": True}
+    assert "Zoë".encode() in fallback
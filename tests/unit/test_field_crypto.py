@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from field_crypto import FieldCipher
+
+
+def test_round_trip():
+    cipher = FieldCipher({"v1": "secret-one"}, "v1")
+    sealed = cipher.encrypt('{"allergies": "peanuts"}', "medical")
+    assert sealed.startswith("enc:v1:")
+    assert "peanuts" not in sealed
+    assert cipher.decrypt(sealed, "medical") == '{"allergies": "peanuts"}'
+
+
+def test_nonce_is_fresh_per_value():
+    cipher = FieldCipher({"v1": "secret-one"}, "v1")
+    assert cipher.encrypt("same", "medical") != cipher.encrypt("same", "medical")
+
+
+def test_ciphertext_is_bound_to_its_column():
+    cipher = FieldCipher({"v1": "secret-one"}, "v1")
+    sealed = cipher.encrypt("value", "medical")
+    with pytest.raises(InvalidTag):
+        cipher.decrypt(sealed, "emergency_contact")
+
+
+def test_legacy_plaintext_is_returned_unchanged():
+    cipher = FieldCipher({"v1": "secret-one"}, "v1")
+    assert cipher.decrypt('{"allergies": null}', "medical") == '{"allergies": null}'
+    assert cipher.needs_rotation('{"allergies": null}')
+
+
+def test_unknown_key_id_is_an_error():
+    sealed = FieldCipher({"v1": "secret-one"}, "v1").encrypt("value", "medical")
+    with pytest.raises(ValueError):
+        FieldCipher({"v2": "secret-two"}, "v2").decrypt(sealed, "medical")
+
+
+def test_rotation_reads_old_keys_and_rewrites_with_the_active_one():
+    old = FieldCipher({"v1": "secret-one"}, "v1")
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE youth_medical (youth_id TEXT PRIMARY KEY, medical TEXT, emergency_contact TEXT)")
+    conn.executemany(
+        "INSERT INTO youth_medical VALUES (?, ?, ?)",
+        [
+            ("y1", old.encrypt("m1", "medical"), old.encrypt("e1", "emergency_contact")),
+            ("y2", "m2", "e2"),  # written before encryption
+        ],
+    )
+    conn.commit()
+
+    rotated = FieldCipher({"v2": "secret-two", "v1": "secret-one"}, "v2")
+    assert rotated.rotate_table(conn, batch_size=1) == 2
+    rows = conn.execute("SELECT youth_id, medical, emergency_contact FROM youth_medical ORDER BY youth_id").fetchall()
+    assert all(rotated.key_id_of(value) == "v2" for row in rows for value in row[1:])
+    assert [rotated.decrypt(row[1], "medical") for row in rows] == ["m1", "m2"]
+    assert [rotated.decrypt(row[2], "emergency_contact") for row in rows] == ["e1", "e2"]
+    # Nothing left to do on a second pass
+    assert rotated.rotate_table(conn) == 0
+
+
+def test_from_env_requires_keys_outside_test(monkeypatch):
+    monkeypatch.delenv("FIELD_ENCRYPTION_KEYS", raising=False)
+    monkeypatch.setenv("SECRET_KEY", "jwt-secret")
+    monkeypatch.setenv("ENV", "production")
+    with pytest.raises(RuntimeError):
+        FieldCipher.from_env()
+
+
+def test_from_env_never_uses_the_jwt_secret(monkeypatch):
+    monkeypatch.delenv("FIELD_ENCRYPTION_KEYS", raising=False)
+    monkeypatch.setenv("SECRET_KEY", "jwt-secret")
+    monkeypatch.setenv("ENV", "test")
+    cipher = FieldCipher.from_env()
+    sealed = cipher.encrypt("value", "medical")
+    with pytest.raises(InvalidTag):
+        FieldCipher({cipher.active_key_id: "jwt-secret"}, cipher.active_key_id).decrypt(sealed, "medical")
+
+
+def test_from_env_active_key(monkeypatch):
+    monkeypatch.setenv("FIELD_ENCRYPTION_KEYS", "v2:secret-two,v1:secret-one")
+    monkeypatch.delenv("FIELD_ENCRYPTION_ACTIVE_KEY", raising=False)
+    assert FieldCipher.from_env().active_key_id == "v2"
+    monkeypatch.setenv("FIELD_ENCRYPTION_ACTIVE_KEY", "v1")
+    assert FieldCipher.from_env().active_key_id == "v1"
+    monkeypatch.setenv("FIELD_ENCRYPTION_KEYS", "no-secret")
+    with pytest.raises(ValueError):
+        FieldCipher.from_env()
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from fieldsets import FieldSet
+
+
+class Item(BaseModel):
+    item_id: str
+    name: str
+    notes: str | None = None
+
+
+FIELDS = FieldSet(Item, ("item_id", "name", "notes"), always=("item_id",))
+
+
+def test_parse_defaults_to_every_field():
+    assert FIELDS.parse(None) == ("item_id", "name", "notes")
+    assert FIELDS.parse("") == ("item_id", "name", "notes")
+
+
+def test_parse_keeps_column_order_and_adds_always():
+    assert FIELDS.parse(" notes ,name") == ("item_id", "name", "notes")
+    assert FIELDS.parse("name") == ("item_id", "name")
+    assert FIELDS.select(FIELDS.parse("name")) == "item_id, name"
+
+
+def test_parse_rejects_unknown_fields():
+    with pytest.raises(HTTPException) as excinfo:
+        FIELDS.parse("name,password")
+    assert excinfo.value.status_code == 400
+    assert "password" in excinfo.value.detail
+
+
+def test_model_is_trimmed_and_cached():
+    fields = FIELDS.parse("name")
+    model = FIELDS.model(fields)
+    assert set(model.model_fields) == {"item_id", "name"}
+    assert model.model_validate({"item_id": "i1", "name": "Hike"}).model_dump() == {"item_id": "i1", "name": "Hike"}
+    assert FIELDS.model(fields) is model
@@ -0,0 +1,92 @@
+import json
+import sqlite3
+
+import pytest
+
+from group_index import GroupMembershipIndex
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def add_youth(conn, youth_id: str, group: str) -> None:
+    conn.execute(
+        "INSERT INTO youth_medical (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at) "
+        "VALUES (?, '100001', ?, '{}', '{}', '{}', '{}', '2025-01-01')",
+        (youth_id, json.dumps({"first_name": youth_id, "org_group": group})),
+    )
+    conn.commit()
+
+
+def test_participants_in_group_order(conn):
+    for youth_id, group in (("y1", "deacons"), ("y2", "teachers"), ("y3", "deacons")):
+        add_youth(conn, youth_id, group)
+    index = GroupMembershipIndex()
+    assert index.participants(conn, ["teachers", "deacons", "teachers", "priest"]) == ["y2", "y1", "y3"]
+    assert index.participants(conn, ["deacons"]) == ["y1", "y3"]
+    assert index.loads == 1
+
+
+def test_writes_from_another_connection_invalidate_the_snapshot(conn, db_path):
+    add_youth(conn, "y1", "deacons")
+    index = GroupMembershipIndex()
+    assert index.participants(conn, ["deacons"]) == ["y1"]
+
+    # Another worker (its own connection) adds, moves and deletes youth; only the version triggers tell us
+    other = sqlite3.connect(db_path)
+    add_youth(other, "y2", "deacons")
+    assert index.participants(conn, ["deacons"]) == ["y1", "y2"]
+    assert index.loads == 2
+
+    other.execute("UPDATE youth_medical SET youth = json_set(youth, '$.org_group', 'teachers') WHERE youth_id = 'y2'")
+    other.commit()
+    assert index.participants(conn, ["deacons", "teachers"]) == ["y1", "y2"]
+    assert index.participants(conn, ["teachers"]) == ["y2"]
+    assert index.loads == 3
+
+    other.execute("DELETE FROM youth_medical WHERE youth_id = 'y1'")
+    other.commit()
+    assert index.participants(conn, ["deacons"]) == []
+    assert index.loads == 4
+    other.close()
+
+
+def test_unrelated_updates_keep_the_snapshot(conn):
+    add_youth(conn, "y1", "deacons")
+    index = GroupMembershipIndex()
+    index.participants(conn, ["deacons"])
+    conn.execute("UPDATE youth_medical SET youth = json_set(youth, '$.first_name', 'Sam'), medical = '{\"a\": 1}' WHERE youth_id = 'y1'")
+    conn.commit()
+    index.participants(conn, ["deacons"])
+    assert index.loads == 1
+
+
+def test_snapshots_are_kept_per_database(conn, tmp_path):
+    add_youth(conn, "y1", "deacons")
+    index = GroupMembershipIndex()
+    assert index.participants(conn, ["deacons"], key="ward1") == ["y1"]
+    assert index.participants(conn, ["deacons"], key="ward2") == ["y1"]
+    assert index.loads == 2
+    index.invalidate("ward1")
+    index.participants(conn, ["deacons"], key="ward1")
+    index.participants(conn, ["deacons"], key="ward2")
+    assert index.loads == 3
+    index.invalidate()
+    index.participants(conn, ["deacons"], key="ward2")
+    assert index.loads == 4
+
+
+def test_unmigrated_databases_are_never_cached(tmp_path):
+    conn = sqlite3.connect(tmp_path / "old.sqlite3")
+    conn.execute("CREATE TABLE youth_medical (youth_id TEXT, youth TEXT)")
+    conn.execute("CREATE TABLE cache_versions (name TEXT PRIMARY KEY, version INTEGER)")
+    conn.execute("INSERT INTO youth_medical VALUES ('y1', '{\"org_group\": \"deacons\"}')")
+    index = GroupMembershipIndex()
+    assert index.participants(conn, ["deacons"]) == ["y1"]
+    assert index.participants(conn, ["deacons"]) == ["y1"]
+    assert index.loads == 2
+    conn.close()
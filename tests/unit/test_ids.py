@@ -0,0 +1,90 @@
+import json
+import sqlite3
+
+import pytest
+
+from goal_view import GoalViewQuery
+from ids import ID_LENGTH, IdGenerator, id_at, id_timestamp, is_id, migrate_ids, new_id, resolve_id
+
+
+def test_generator_is_strictly_increasing():
+    generator = IdGenerator()
+    ids = [generator.new() for _ in range(5000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(len(value) == ID_LENGTH for value in ids)
+
+
+def test_ids_sort_by_time():
+    assert id_at(1_000) < id_at(2_000)
+    assert id_timestamp(id_at(1_700_000_000_000)).timestamp() == 1_700_000_000
+
+
+@pytest.mark.parametrize("value, expected", [
+    (new_id(), True),
+    ("sam_tester", False),
+    ("3f2b8c1e-6a1d-4e6b-9a57-2c0f0b7d9e11", False),
+    ("8" * ID_LENGTH, False),         # past the 48-bit timestamp range
+    ("0" * (ID_LENGTH - 1) + "u", False),  # not in the alphabet
+])
+def test_is_id(value, expected):
+    assert is_id(value) is expected
+
+
+@pytest.fixture
+def legacy(db_path):
+    """Rows written before time-ordered ids: a name-based youth with a linked account, an activity, a goal"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "INSERT INTO youth_medical (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at, created_at) "
+        "VALUES ('sam_tester', '123456', ?, '{}', '{}', '{}', '{}', '2024-01-01', '2024-01-01 10:00:00')",
+        (json.dumps({"first_name": "Sam", "last_name": "Tester", "org_group": "deacons"}),),
+    )
+    conn.execute(
+        "INSERT INTO activities (activity_id, activity_name, description, location, date_start, date_end, participants_youth_ids, created_at) "
+        "VALUES ('3f2b8c1e-6a1d-4e6b-9a57-2c0f0b7d9e11', 'Campout', '', '', '2024-06-01', '2024-06-02', ?, '2024-02-01 10:00:00')",
+        (json.dumps(["sam_tester", "other_youth"]),),
+    )
+    conn.execute("INSERT INTO permission_given (youth_id, activity_id, permission_code) VALUES ('sam_tester', '3f2b8c1e-6a1d-4e6b-9a57-2c0f0b7d9e11', '123456')")
+    conn.execute(
+        "INSERT INTO personal_goals (youth_id, goal_area, goal_name, goal_description, target_date, visibility_level, org_group) "
+        "VALUES ('sam_tester', 'physical', 'Run', 'Run a 5k', '2024-09-01', 'private', 'deacons')"
+    )
+    conn.execute(
+        "INSERT INTO admin_users (username, password, role, org_group, user_id, youth_id) VALUES ('sam', 'pw', 'youth', 'deacons', 'u1', 'sam_tester')"
+    )
+    yield conn
+    conn.close()
+
+
+def test_migrate_rewrites_ids_and_references(legacy):
+    assert migrate_ids(legacy) == {"youth": 1, "activity": 1, "goal": 1}
+    youth_id = legacy.execute("SELECT youth_id FROM youth_medical").fetchone()[0]
+    activity_id, participants = legacy.execute("SELECT activity_id, participants_youth_ids FROM activities").fetchone()
+    assert is_id(youth_id) and is_id(activity_id)
+    assert legacy.execute("SELECT goal_id FROM personal_goals").fetchone()[0] is not None
+    # The new id keeps the row's creation time
+    assert id_timestamp(youth_id).isoformat() == "2024-01-01T10:00:00+00:00"
+
+    assert tuple(legacy.execute("SELECT youth_id, activity_id FROM permission_given").fetchone()) == (youth_id, activity_id)
+    assert legacy.execute("SELECT youth_id FROM personal_goals").fetchone()[0] == youth_id
+    # Unknown ids in a participant list are kept, in order
+    assert json.loads(participants) == [youth_id, "other_youth"]
+
+    assert resolve_id(legacy, "youth", "sam_tester") == youth_id
+    assert resolve_id(legacy, "activity", "3f2b8c1e-6a1d-4e6b-9a57-2c0f0b7d9e11") == activity_id
+    assert resolve_id(legacy, "youth", youth_id) == youth_id
+    assert resolve_id(legacy, "youth", "nobody") == "nobody"
+
+    # Running again finds nothing left to migrate
+    assert migrate_ids(legacy) == {"youth": 0, "activity": 0, "goal": 0}
+
+
+def test_migrate_keeps_youth_accounts_linked(legacy):
+    migrate_ids(legacy)
+    youth_id = legacy.execute("SELECT youth_id FROM youth_medical").fetchone()[0]
+    assert legacy.execute("SELECT youth_id FROM admin_users WHERE username = 'sam'").fetchone()[0] == youth_id
+    # The youth still sees their own private goal
+    view = GoalViewQuery(legacy).grouped({"sub": "sam", "role": "youth", "org_group": "deacons"})
+    assert list(view["deacons"]) == [youth_id]
@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from db import QueryStats, TimedCursor
+from metrics import LATENCY_BUCKETS, MetricsMiddleware, MetricsRegistry
+
+
+def stats(queries: int = 0, seconds: float = 0.0) -> QueryStats:
+    result = QueryStats()
+    result.queries, result.seconds = queries, seconds
+    return result
+
+
+def series_lines(text: str, name: str, route: str) -> dict[str, str]:
+    """Sample name (with le= for buckets) -> value for one route of one metric"""
+    lines = {}
+    for line in text.splitlines():
+        if line.startswith(name) and f'route="{route}"' in line:
+            sample, value = line.rsplit(" ", 1)
+            le = sample.split('le="')[1].rstrip('"}') if 'le="' in sample else None
+            lines[f"{sample.split('{')[0]}:{le}" if le else sample.split("{")[0]] = value
+    return lines
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    shard = registry.shard()
+    for seconds in (0.001, 0.02, 0.02, 3.0, 60.0):
+        registry.observe(shard, "GET", "/activities/{activity_id}", 200, seconds, stats(queries=3, seconds=0.5))
+    text = registry.render()
+    latency = series_lines(text, "http_request_duration_seconds", "/activities/{activity_id}")
+    assert latency["http_request_duration_seconds_bucket:0.005"] == "1"
+    assert latency["http_request_duration_seconds_bucket:0.025"] == "3"
+    assert latency["http_request_duration_seconds_bucket:2.5"] == "3"
+    assert latency["http_request_duration_seconds_bucket:5.0"] == "4"
+    assert latency["http_request_duration_seconds_bucket:+Inf"] == "5"
+    assert latency["http_request_duration_seconds_count"] == "5"
+    assert float(latency["http_request_duration_seconds_sum"]) == round(0.001 + 0.02 + 0.02 + 3.0 + 60.0, 6)
+    assert len([k for k in latency if "_bucket" in k]) == len(LATENCY_BUCKETS) + 1
+
+    queries = series_lines(text, "http_request_db_queries", "/activities/{activity_id}")
+    assert queries["http_request_db_queries_bucket:2"] == "0"
+    assert queries["http_request_db_queries_bucket:5"] == "5"
+    assert queries["http_request_db_queries_sum"] == "15"
+    assert 'http_requests_total{method="GET",route="/activities/{activity_id}",status="200"} 5' in text
+    assert 'http_request_db_seconds_total{method="GET",route="/activities/{activity_id}"} 2.500000' in text
+
+
+def test_shards_of_every_thread_are_merged():
+    registry = MetricsRegistry()
+
+    def record():
+        shard = registry.shard()
+        for _ in range(100):
+            registry.observe(shard, "POST", "/users", 201, 0.01, stats())
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 'http_requests_total{method="POST",route="/users",status="201"} 400' in registry.render()
+
+
+def test_collectors_and_label_escaping():
+    registry = MetricsRegistry()
+    registry.register_collector(lambda: ["sqlite_wal_bytes 42"])
+    registry.observe(registry.shard(), "GET", 'odd"route\\', 404, 0.0, stats())
+    text = registry.render()
+    assert 'route="odd\\"route\\\\"' in text
+    assert text.endswith("sqlite_wal_bytes 42\n")
+
+
+def test_middleware_records_route_templates_and_queries():
+    registry = MetricsRegistry()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        conn = sqlite3.connect(":memory:")
+        cursor = conn.cursor(TimedCursor)
+        cursor.execute("SELECT 1")
+        cursor.execute("SELECT 2")
+        conn.close()
+        return {"item_id": item_id}
+
+    client = TestClient(app)
+    client.get("/items/a")
+    client.get("/items/b")
+    client.get("/nowhere")
+    text = registry.render()
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert series_lines(text, "http_request_db_queries", "/items/{item_id}")["http_request_db_queries_sum"] == "4"
+    assert "http_requests_in_flight 0" in text
@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+
+from permission_codes import PermissionCodeAllocator, code_state, register_client_code
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def unseen_code(conn) -> str:
+    taken = {row[0] for row in conn.execute("SELECT code FROM permission_codes")}
+    return next(f"{n:06d}" for n in range(10**6) if f"{n:06d}" not in taken)
+
+
+def test_register_client_code_claims_new_and_unowned_codes(conn):
+    assert register_client_code(conn, "111111", "parent@example.com")
+    assert register_client_code(conn, "111111", "parent@example.com")
+    conn.execute("INSERT INTO permission_codes (code, household_id, source) VALUES ('222222', NULL, 'client')")
+    assert register_client_code(conn, "222222", "other@example.com")
+    owner = conn.execute("SELECT household_id FROM permission_codes WHERE code = '222222'").fetchone()[0]
+    assert owner == "other@example.com"
+
+
+def test_register_client_code_refuses_another_households_code(conn):
+    assert register_client_code(conn, "333333", "parent@example.com")
+    assert not register_client_code(conn, "333333", "other@example.com")
+    owner = conn.execute("SELECT household_id FROM permission_codes WHERE code = '333333'").fetchone()[0]
+    assert owner == "parent@example.com"
+
+
+def test_issued_codes_are_unique_six_digit_codes(conn):
+    codes = PermissionCodeAllocator(conn).issue(500)
+    assert len(set(codes)) == 500
+    assert all(len(code) == 6 and code.isdigit() for code in codes)
+
+
+def test_issue_skips_client_codes(conn):
+    allocator = PermissionCodeAllocator(conn)
+    first = allocator.issue(1)[0]
+    conn.execute("DELETE FROM permission_codes WHERE code = ?", (first,))
+    register_client_code(conn, first, "parent@example.com")
+    conn.execute("UPDATE permission_code_allocator SET next_index = 0")
+    assert first not in allocator.issue(1)
+
+
+def test_for_household_reuses_the_active_code(conn):
+    allocator = PermissionCodeAllocator(conn)
+    code = allocator.for_household("parent@example.com")
+    assert allocator.for_household("parent@example.com") == code
+    assert allocator.for_household("other@example.com") != code
+
+
+def test_rotate_moves_youth_and_grants_to_the_new_code(conn):
+    allocator = PermissionCodeAllocator(conn)
+    old = allocator.for_household("parent@example.com")
+    conn.execute(
+        "INSERT INTO youth_medical (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at) "
+        "VALUES ('y1', ?, '{}', '{}', '{}', '{}', '{}', '2025-01-01')",
+        (old,),
+    )
+    conn.execute("INSERT INTO permission_given (youth_id, activity_id, permission_code) VALUES ('y1', 'a1', ?)", (old,))
+
+    new = allocator.rotate(old)
+    assert new != old
+    assert code_state(conn, old) == "retired"
+    assert code_state(conn, new) == "active"
+    assert conn.execute("SELECT replaced_by FROM permission_codes WHERE code = ?", (old,)).fetchone()[0] == new
+    assert conn.execute("SELECT permission_code FROM youth_medical").fetchone()[0] == new
+    assert conn.execute("SELECT permission_code FROM permission_given").fetchone()[0] == new
+    assert allocator.for_household("parent@example.com") == new
+
+    with pytest.raises(KeyError):
+        allocator.rotate(old)
+    with pytest.raises(KeyError):
+        allocator.rotate(unseen_code(conn))
+
+
+def test_code_state(conn):
+    allocator = PermissionCodeAllocator(conn)
+    code = allocator.issue(1, expires_at="2000-01-01 00:00:00")[0]
+    assert code_state(conn, code) == "expired"
+    assert code_state(conn, unseen_code(conn)) is None
+
+
+def test_for_household_rotates_an_expired_code(conn):
+    allocator = PermissionCodeAllocator(conn)
+    older, old = allocator.issue(2, ["parent@example.com"] * 2, expires_at="2000-01-01 00:00:00")
+    for youth_id, code in (("y1", old), ("y2", older)):
+        conn.execute(
+            "INSERT INTO youth_medical (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at) "
+            "VALUES (?, ?, '{}', '{}', '{}', '{}', '{}', '2025-01-01')",
+            (youth_id, code),
+        )
+        conn.execute("INSERT INTO permission_given (youth_id, activity_id, permission_code) VALUES (?, 'a1', ?)", (youth_id, code))
+
+    new = allocator.for_household("parent@example.com", "2999-01-01 00:00:00")
+    assert new not in (old, older)
+    assert code_state(conn, new) == "active"
+    assert code_state(conn, old) == code_state(conn, older) == "retired"
+    assert {row[0] for row in conn.execute("SELECT permission_code FROM youth_medical")} == {new}
+    assert {row[0] for row in conn.execute("SELECT permission_code FROM permission_given")} == {new}
+    assert conn.execute("SELECT expires_at FROM permission_codes WHERE code = ?", (new,)).fetchone()[0] == "2999-01-01 00:00:00"
+    assert allocator.for_household("parent@example.com") == new
@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+from checkpoint import WalCheckpointer, checkpoint_settings_from_env
+from db import PRAGMA_PROFILES, DatabaseEngine, pragma_profile_from_env
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("DB_PROFILE", "DB_PRAGMAS", "DB_BUSY_TIMEOUT_MS", "DB_CHECKPOINT_INTERVAL", "DB_CHECKPOINT_TRUNCATE_MB"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_profile_selection(monkeypatch):
+    assert pragma_profile_from_env() == PRAGMA_PROFILES["default"]
+    monkeypatch.setenv("DB_PROFILE", "large")
+    assert pragma_profile_from_env() == PRAGMA_PROFILES["large"]
+    monkeypatch.setenv("DB_PRAGMAS", "cache_size_kib=32768, mmap_size=0,temp_store=file")
+    monkeypatch.setenv("DB_BUSY_TIMEOUT_MS", "250")
+    profile = pragma_profile_from_env()
+    assert (profile.cache_size_kib, profile.mmap_size, profile.temp_store, profile.busy_timeout_ms) == (32768, 0, "file", 250)
+    assert profile.wal_autocheckpoint == PRAGMA_PROFILES["large"].wal_autocheckpoint
+
+
+@pytest.mark.parametrize("name, value, message", [
+    ("DB_PROFILE", "huge", "Unknown DB_PROFILE"),
+    ("DB_PRAGMAS", "page_size=4096", "Unknown DB_PRAGMAS setting"),
+    ("DB_PRAGMAS", "cache_size_kib=0", "must be positive"),
+    ("DB_PRAGMAS", "temp_store=disk", "temp_store must be"),
+    ("DB_PRAGMAS", "synchronous=sometimes", "synchronous must be"),
+    ("DB_PRAGMAS", "busy_timeout_ms=-1", "cannot be negative"),
+])
+def test_invalid_settings_are_rejected(monkeypatch, name, value, message):
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValueError, match=message):
+        pragma_profile_from_env()
+
+
+def test_connections_apply_the_profile(monkeypatch, db_path):
+    monkeypatch.setenv("DB_PROFILE", "minimal")
+    monkeypatch.setenv("DB_PRAGMAS", "wal_autocheckpoint=0,synchronous=FULL")
+    conn = DatabaseEngine(db_path).connect(db_path)
+    pragma = lambda name: conn.execute(f"PRAGMA {name}").fetchone()[0]  # noqa: E731
+    assert pragma("cache_size") == -2000
+    assert pragma("mmap_size") == 0
+    assert pragma("busy_timeout") == 5000
+    assert pragma("wal_autocheckpoint") == 0
+    assert pragma("synchronous") == 2
+    conn.close()
+
+
+def test_checkpointer_run(tmp_path, db_path):
+    writer = sqlite3.connect(db_path)
+    writer.execute("PRAGMA wal_autocheckpoint = 0")
+    writer.execute("CREATE TABLE filler (value BLOB)")
+    for _ in range(50):
+        writer.execute("INSERT INTO filler VALUES (randomblob(4096))")
+        writer.commit()
+
+    checkpointer = WalCheckpointer(db_path, truncate_bytes=1 << 40)
+    result = checkpointer.checkpoint()
+    assert result["mode"] == "PASSIVE" and not result["busy"]
+    assert result["checkpointed"] == result["wal_frames"] > 50
+    assert checkpointer.wal_bytes() > 0
+
+    # Over the size limit a TRUNCATE empties the WAL, unless a reader still holds it
+    checkpointer.truncate_bytes = 0
+    reader = sqlite3.connect(db_path)
+    reader.execute("BEGIN")
+    reader.execute("SELECT COUNT(*) FROM filler").fetchone()
+    writer.execute("INSERT INTO filler VALUES (randomblob(4096))")
+    writer.commit()
+    assert checkpointer.checkpoint()["busy"]
+    reader.rollback()
+    reader.close()
+    assert checkpointer.checkpoint() == {"mode": "TRUNCATE", "busy": False, "wal_frames": 0, "checkpointed": 0}
+    assert checkpointer.wal_bytes() == 0
+
+    checkpointer.optimize()
+    assert writer.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = 'admin_users'").fetchone()[0] > 0
+    lines = "\n".join(checkpointer.metric_lines())
+    assert 'sqlite_wal_checkpoints_total{mode="PASSIVE",result="ok"} 1' in lines
+    assert 'sqlite_wal_checkpoints_total{mode="TRUNCATE",result="busy"} 1' in lines
+    # ANALYZE wrote sqlite_stat1 through the WAL again
+    assert f"sqlite_wal_bytes {checkpointer.wal_bytes()}" in lines
+    checkpointer.stop()
+    writer.close()
+
+
+def test_only_one_process_checkpoints(db_path):
+    first, second = WalCheckpointer(db_path, interval=60), WalCheckpointer(db_path, interval=60)
+    assert first.start()
+    assert not second.start()
+    first.stop()
+    assert second.start()
+    second.stop()
+
+
+def test_checkpoint_settings_from_env(monkeypatch):
+    assert checkpoint_settings_from_env() == {"interval": 5.0, "truncate_bytes": 64 * 1024 * 1024}
+    monkeypatch.setenv("DB_CHECKPOINT_TRUNCATE_MB", "0.5")
+    assert checkpoint_settings_from_env()["truncate_bytes"] == 512 * 1024
+    monkeypatch.setenv("DB_CHECKPOINT_INTERVAL", "0")
+    assert checkpoint_settings_from_env() is None
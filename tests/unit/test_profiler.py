@@ -0,0 +1,83 @@
+import sqlite3
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from db import TimedCursor
+from profiler import ProfileReport, QueryProfileMiddleware, full_scans, normalize_sql, profile_settings_from_env
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE youth (youth_id TEXT PRIMARY KEY, org_group TEXT, name TEXT)")
+    conn.executemany("INSERT INTO youth VALUES (?, ?, ?)", [(f"y{n}", "deacons", f"Youth {n}") for n in range(20)])
+    yield conn
+    conn.close()
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT * FROM youth WHERE youth_id = 'y1'") == "SELECT * FROM youth WHERE youth_id = ?"
+    assert normalize_sql("SELECT * FROM youth WHERE name = 'O''Brien' AND age > 12.5") == "SELECT * FROM youth WHERE name = ? AND age > ?"
+    assert normalize_sql("SELECT *\n  FROM youth\tWHERE youth_id IN (?, ?,?)") == "SELECT * FROM youth WHERE youth_id IN (?...)"
+    assert normalize_sql("SELECT * FROM youth WHERE youth_id IN (?)") == normalize_sql("SELECT * FROM youth WHERE youth_id IN (?, ?)")
+    # Digits inside identifiers are not literals
+    assert normalize_sql("SELECT col2 FROM t1") == "SELECT col2 FROM t1"
+
+
+def test_full_scans():
+    plan = ["SCAN youth", "SEARCH activities USING INDEX idx_activities_activity_id (activity_id=?)", "SCAN goals USING COVERING INDEX g"]
+    assert full_scans(plan) == ["SCAN youth"]
+
+
+def profiled_app(conn, report: ProfileReport, **settings) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(QueryProfileMiddleware, report=report, **settings)
+
+    @app.get("/youth")
+    def youth_one_by_one():
+        cursor = conn.cursor(TimedCursor)
+        ids = [row[0] for row in cursor.execute("SELECT youth_id FROM youth WHERE org_group = 'deacons'").fetchall()]
+        return [conn.cursor(TimedCursor).execute("SELECT name FROM youth WHERE youth_id = ?", (y,)).fetchone()[0] for y in ids]
+
+    @app.get("/youth/{youth_id}")
+    def one_youth(youth_id: str):
+        return conn.cursor(TimedCursor).execute("SELECT name FROM youth WHERE youth_id = ?", (youth_id,)).fetchone()[0]
+
+    return TestClient(app)
+
+
+def test_repeated_statements_are_flagged_as_n_plus_one(conn):
+    report = ProfileReport()
+    client = profiled_app(conn, report, repeat_threshold=5, slow_ms=10_000)
+    response = client.get("/youth")
+    assert response.headers["x-query-profile"].startswith("queries=21;")
+    assert "repeated=1" in response.headers["x-query-profile"]
+    assert "repeated=0" in client.get("/youth/y1").headers["x-query-profile"]
+
+    summary = report.summary()
+    assert summary["flagged_routes"] == {"/youth": {"n_plus_one": 1, "full_scan": 0}}
+    by_sql = {t["sql"]: t for t in summary["templates"]}
+    assert by_sql["SELECT name FROM youth WHERE youth_id = ?"]["count"] == 21
+    assert by_sql["SELECT name FROM youth WHERE youth_id = ?"]["routes"] == ["/youth", "/youth/{youth_id}"]
+    report.reset()
+    assert report.summary() == {"flagged_routes": {}, "templates": []}
+
+
+def test_slow_statements_are_explained(conn):
+    report = ProfileReport()
+    client = profiled_app(conn, report, repeat_threshold=100, slow_ms=0, header=False)
+    response = client.get("/youth")
+    assert "x-query-profile" not in response.headers
+    # With slow_ms=0 every statement is explained; org_group has no index
+    assert report.summary()["flagged_routes"] == {"/youth": {"n_plus_one": 0, "full_scan": 1}}
+
+
+def test_profile_settings_from_env(monkeypatch):
+    monkeypatch.delenv("QUERY_PROFILE", raising=False)
+    assert profile_settings_from_env() is None
+    monkeypatch.setenv("QUERY_PROFILE", "1")
+    monkeypatch.setenv("QUERY_PROFILE_REPEAT", "3")
+    monkeypatch.setenv("QUERY_PROFILE_HEADER", "0")
+    assert profile_settings_from_env() == {"repeat_threshold": 3, "slow_ms": 25.0, "header": False}
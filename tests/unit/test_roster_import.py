@@ -0,0 +1,111 @@
+import base64
+import io
+import json
+import sqlite3
+
+import pytest
+
+from blob_store import LocalBlobStore
+from field_crypto import FieldCipher
+from permission_codes import PermissionCodeAllocator
+from roster_import import RosterImporter, format_from_name, read_records
+
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32).decode()
+
+
+def record(email: str, first_name: str = "Sam", **overrides) -> dict:
+    body = {
+        "youth": {"first_name": first_name, "last_name": "Tester", "org_group": "deacons", "birth_date": "2012-03-04"},
+        "parent_guardian": {"name": "Pat Tester", "phone": "555-0100", "email": email},
+        "medical": {"allergies": "peanuts"},
+        "emergency_contact": {"name": "Lee Tester", "phone": "555-0101"},
+        "signature": {"signed_by": "Pat Tester", "signature_image_base64": PNG},
+        "signed_at": "2026-01-05T10:00:00Z",
+    }
+    body.update(overrides)
+    return body
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def importer(conn, tmp_path) -> RosterImporter:
+    return RosterImporter(conn, FieldCipher({"t": "secret"}, "t"), LocalBlobStore(str(tmp_path / "blobs")), chunk_size=2)
+
+
+def youth_count(conn) -> int:
+    return conn.execute("SELECT COUNT(*) FROM youth_medical").fetchone()[0]
+
+
+def test_reimport_reports_existing_youth(importer, conn):
+    records = [record("a@example.com"), record("a@example.com", "Alex"), record("b@example.com")]
+    report, codes = importer.run(records)
+    assert [row["status"] for row in report.rows] == ["imported"] * 3
+    assert report.rows[0]["permission_code"] == report.rows[1]["permission_code"] != report.rows[2]["permission_code"]
+    assert codes == {report.rows[0]["permission_code"], report.rows[2]["permission_code"]}
+
+    again, codes = importer.run(records)
+    assert [row["status"] for row in again.rows] == ["exists"] * 3
+    assert [row["youth_id"] for row in again.rows] == [row["youth_id"] for row in report.rows]
+    assert codes == set()
+    assert youth_count(conn) == 3
+
+
+def test_duplicates_inside_one_file_are_imported_once(importer, conn):
+    report, _ = importer.run([record("a@example.com"), record("a@example.com"), record("a@example.com", "Alex")])
+    assert [row["status"] for row in report.rows] == ["imported", "exists", "imported"]
+    assert report.rows[1]["youth_id"] == report.rows[0]["youth_id"]
+    assert youth_count(conn) == 2
+
+
+def test_dry_run_writes_nothing(importer, conn):
+    report, _ = importer.run([record("a@example.com"), record("b@example.com"), record("c@example.com")], dry_run=True)
+    assert report.summary()["counts"] == {"imported": 3}
+    assert report.dry_run
+    assert youth_count(conn) == 0
+    # Codes handed out while resolving the rows were rolled back with everything else
+    assert conn.execute("SELECT COUNT(*) FROM permission_codes").fetchone()[0] == 0
+    assert not conn.in_transaction
+
+
+def test_per_row_errors(importer, conn):
+    expired = PermissionCodeAllocator(conn).issue(1, expires_at="2000-01-01 00:00:00")[0]
+    taken = importer.run([record("owner@example.com")])[0].rows[0]["permission_code"]
+    records = [
+        record("a@example.com"),
+        record("b@example.com", youth={"first_name": "No last name"}),
+        record("c@example.com", signature={"signed_by": "Pat", "signature_image_base64": base64.b64encode(b"<svg/>").decode()}),
+        record("d@example.com", permission_code=expired),
+        record("e@example.com", permission_code=taken),
+        record("f@example.com"),
+    ]
+    report = importer.run(records)[0].summary()
+    assert report["counts"] == {"imported": 2, "invalid": 4}
+    rows = report["rows"]
+    assert [row["row"] for row in rows] == [1, 2, 3, 4, 5, 6]
+    assert {"field": "youth.last_name", "message": "Field required"} in rows[1]["errors"]
+    assert rows[2]["errors"][0]["field"] == "signature"
+    assert rows[3]["errors"] == [{"field": "permission_code", "message": "permission_code is expired"}]
+    assert rows[4]["errors"] == [{"field": "permission_code", "message": "permission_code belongs to another household"}]
+    assert youth_count(conn) == 3
+
+
+def test_malformed_input_ends_the_stream_but_keeps_earlier_rows(importer, conn):
+    stream = io.StringIO(json.dumps(record("a@example.com")) + "\n{broken\n" + json.dumps(record("b@example.com")) + "\n")
+    rows = importer.run(read_records(stream, "ndjson"))[0].rows
+    assert [row["status"] for row in rows] == ["imported", "invalid"]
+    assert rows[1]["row"] == 2
+    assert youth_count(conn) == 1
+
+
+def test_csv_records_are_nested():
+    stream = io.StringIO("youth.first_name,youth.last_name,medical.allergies,medical.medications\nAnn,Lee,,none\n")
+    assert list(read_records(stream, "csv")) == [{"youth": {"first_name": "Ann", "last_name": "Lee"}, "medical": {"medications": "none"}}]
+    assert format_from_name("roster.jsonl") == "ndjson"
+    assert format_from_name(None, "application/json") == "json"
+    assert format_from_name("roster.csv") == "csv"
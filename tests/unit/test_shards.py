@@ -0,0 +1,166 @@
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from shards import DirectoryCodeAllocator, ShardDirectory, ShardedDatabaseEngine, split_database
+
+
+@pytest.fixture
+def directory(tmp_path) -> ShardDirectory:
+    directory = ShardDirectory(tmp_path / "directory.sqlite3")
+    directory.create()
+    directory.register_unit("ward1", "stake1", "ward1.sqlite3")
+    directory.register_unit("ward2", "stake1", "ward2.sqlite3")
+    directory.register_unit("ward3", "stake2", "ward3.sqlite3")
+    return directory
+
+
+@pytest.fixture
+def engine(tmp_path, directory) -> ShardedDatabaseEngine:
+    # Tokens in these tests are the claims as JSON; anything else is an invalid token
+    return ShardedDatabaseEngine(str(tmp_path), json.loads, default_unit=None)
+
+
+@pytest.fixture
+def client(engine, directory) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/unit")
+    async def unit(request: Request):
+        return {"unit": await engine.resolve_unit(request)}
+
+    @app.get("/codes/{permission_code}")
+    async def code_unit(request: Request, permission_code: str):
+        return {"unit": await engine.resolve_unit(request)}
+
+    @app.post("/users")
+    async def create_user(request: Request):
+        return {"unit": await engine.resolve_unit(request)}
+
+    @app.post("/feedback")
+    async def feedback(request: Request):
+        return {"unit": await engine.resolve_unit(request)}
+
+    directory.assign_codes("ward2", ["222222"])
+    directory.assign_codes("ward3", ["333333"])
+    return TestClient(app)
+
+
+def bearer(**claims) -> dict[str, str]:
+    return {"Authorization": f"Bearer {json.dumps(claims)}"}
+
+
+def test_assign_codes_never_moves_a_code_to_another_unit(directory):
+    assert directory.assign_codes("ward1", ["111111", "123456"]) == []
+    assert directory.assign_codes("ward2", ["123456", "222222"]) == ["123456"]
+    assert directory.unit_for_code("123456") == "ward1"
+    assert directory.unit_for_code("222222") == "ward2"
+
+
+def test_claim_code(directory):
+    assert directory.claim_code("ward1", "444444")
+    assert directory.claim_code("ward1", "444444")
+    assert not directory.claim_code("ward2", "444444")
+    assert directory.unit_for_code("444444") == "ward1"
+
+
+def test_directory_allocator_skips_codes_of_other_units(tmp_path, directory, db_path):
+    conn = sqlite3.connect(db_path)
+    first = DirectoryCodeAllocator(conn, directory, "ward1").issue(1)[0]
+    assert directory.unit_for_code(first) == "ward1"
+    # A client code another unit holds is refused, however this shard's own table looks
+    assert not DirectoryCodeAllocator(conn, directory, "ward2").claim_client_code(first)
+    with directory._connect() as dconn:
+        dconn.execute("UPDATE permission_code_allocator SET next_index = 0")
+    assert first not in DirectoryCodeAllocator(conn, directory, "ward2").issue(1)
+    conn.close()
+
+
+def test_units_and_db_files(directory):
+    assert directory.units() == {"ward1": "stake1", "ward2": "stake1", "ward3": "stake2"}
+    assert directory.db_file("ward2") == "ward2.sqlite3"
+    assert directory.db_file("unregistered") == "unregistered.sqlite3"
+    directory.assign_users("ward1", ["deacon_admin"])
+    assert directory.unit_for_user("deacon_admin") == "ward1"
+    assert directory.unit_for_user("nobody") is None
+
+
+def test_resolve_unit_prefers_the_token_unit(client):
+    assert client.get("/unit", headers=bearer(unit="ward1", stake="stake1", role="advisor")).json() == {"unit": "ward1"}
+    # The token wins over a permission code that belongs to another unit
+    response = client.get("/codes/333333", headers=bearer(unit="ward1", stake="stake1", role="advisor"))
+    assert response.json() == {"unit": "ward1"}
+
+
+def test_stake_roles_switch_units_inside_their_stake_only(client):
+    president = bearer(unit="ward1", stake="stake1", role="president")
+    assert client.get("/unit", headers={**president, "X-Unit": "ward2"}).json() == {"unit": "ward2"}
+    assert client.get("/unit", headers={**president, "X-Unit": "ward3"}).status_code == 403
+    advisor = bearer(unit="ward1", stake="stake1", role="advisor")
+    assert client.get("/unit", headers={**advisor, "X-Unit": "ward2"}).status_code == 403
+    assert client.get("/unit", params={"unit": "ward2"}, headers=advisor).status_code == 403
+
+
+def test_anonymous_requests_use_the_permission_code_before_x_unit(client):
+    assert client.get("/codes/333333", headers={"X-Unit": "ward1"}).json() == {"unit": "ward3"}
+    assert client.get("/unit", params={"permission_code": "222222"}).json() == {"unit": "ward2"}
+    assert client.post("/users", json={"permission_code": "222222"}, headers={"X-Unit": "ward1"}).json() == {"unit": "ward2"}
+    # Bodies of other routes are never read for a unit
+    assert client.post("/feedback", json={"permission_code": "222222"}, headers={"X-Unit": "ward1"}).json() == {"unit": "ward1"}
+    assert client.get("/unit", headers={"X-Unit": "ward3", "Authorization": "Bearer not-a-token"}).json() == {"unit": "ward3"}
+
+
+def test_missing_and_unknown_units(client, engine):
+    assert client.get("/unit").status_code == 400
+    assert client.get("/unit", headers={"X-Unit": "nowhere"}).status_code == 404
+    engine.default_unit = "ward1"
+    assert client.get("/unit").json() == {"unit": "ward1"}
+    assert client.get("/codes/999999").json() == {"unit": "ward1"}
+
+
+def test_split_database(tmp_path, db_path):
+    conn = sqlite3.connect(db_path)
+    for youth_id, group, code in (("y1", "deacons", "100001"), ("y2", "teachers", "100002"), ("y3", "priest", "100003")):
+        conn.execute(
+            "INSERT INTO youth_medical (youth_id, permission_code, youth, parent_guardian, medical, emergency_contact, signature, signed_at) "
+            "VALUES (?, ?, ?, '{}', '{}', '{}', '{}', '2025-01-01')",
+            (youth_id, code, json.dumps({"org_group": group})),
+        )
+        conn.execute("INSERT INTO permission_given (youth_id, activity_id, permission_code) VALUES (?, 'a1', ?)", (youth_id, code))
+    conn.execute(
+        "INSERT INTO activities (activity_id, activity_name, description, location, groups, date_start, date_end) "
+        "VALUES ('a1', 'Hike', '', '', '[\"deacons\", \"teachers\"]', '2025-01-01', '2025-01-01')"
+    )
+    conn.commit()
+    conn.close()
+
+    root = tmp_path / "shards"
+    unit_map = {
+        "units": {"ward1": {"stake": "stake1", "groups": ["deacons"]}, "ward2": {"stake": "stake1", "groups": ["teachers", "priest"]}},
+        "users": {"bishop_admin": "ward2"},
+    }
+    report = split_database(db_path, str(root), unit_map)
+    assert report["ward1"]["youth_medical"] == 1
+    assert report["ward2"]["youth_medical"] == 2
+    assert report["ward1"]["activities"] == report["ward2"]["activities"] == 1
+    assert report["ward2"]["permission_given"] == 2
+
+    directory = ShardDirectory(root / "directory.sqlite3")
+    assert directory.units() == {"ward1": "stake1", "ward2": "stake1"}
+    assert directory.unit_for_code("100001") == "ward1"
+    assert directory.unit_for_code("100003") == "ward2"
+    assert directory.unit_for_user("deacon_admin") == "ward1"
+    assert directory.unit_for_user("priest_admin") == "ward2"
+    # Stake-level accounts are copied to every shard and log in to the unit the map names (or the first unit)
+    assert directory.unit_for_user("bishop_admin") == "ward2"
+    assert directory.unit_for_user("admin") == "ward1"
+    for unit in ("ward1", "ward2"):
+        with sqlite3.connect(Path(root) / f"{unit}.sqlite3") as shard:
+            assert shard.execute("SELECT 1 FROM admin_users WHERE username = 'admin'").fetchone()
+    with sqlite3.connect(Path(root) / "ward1.sqlite3") as shard:
+        assert [row[0] for row in shard.execute("SELECT youth_id FROM youth_medical")] == ["y1"]
+        assert not shard.execute("SELECT 1 FROM admin_users WHERE username = 'teacher_admin'").fetchone()
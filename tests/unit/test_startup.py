@@ -0,0 +1,73 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from db import HAS_FCNTL, DatabaseEngine
+from db_setup import DBSetup
+
+
+@pytest.fixture
+def engine(tmp_path) -> DatabaseEngine:
+    return DatabaseEngine(str(tmp_path / "data.sqlite3"))
+
+
+def test_prepare_database_skips_setup_when_current(engine, monkeypatch):
+    path = Path(engine.DB_PATH)
+    calls = []
+    create_tables = DBSetup.create_tables
+    monkeypatch.setattr(DBSetup, "create_tables", lambda self: calls.append("create") or create_tables(self))
+    monkeypatch.setattr(DBSetup, "load_admins", lambda self: calls.append("seed"))
+
+    engine.prepare_database(path).close()
+    assert calls == ["create", "seed"]
+    conn = engine.prepare_database(path)
+    assert DBSetup(conn).is_current()
+    conn.close()
+    assert calls == ["create", "seed"]
+
+    # A schema bump runs setup once more on the next start
+    monkeypatch.setattr(DBSetup, "SCHEMA_VERSION", DBSetup.SCHEMA_VERSION + 1)
+    engine.prepare_database(path).close()
+    engine.prepare_database(path).close()
+    assert calls == ["create", "seed", "create", "seed"]
+
+
+def test_prepare_database_rejects_paths_without_a_file_name(tmp_path, engine):
+    with pytest.raises(RuntimeError, match="must point to a SQLite file"):
+        engine.prepare_database(tmp_path / "data")
+
+
+needs_fcntl = pytest.mark.skipif(not HAS_FCNTL, reason="startup_lock is a no-op without fcntl")
+
+
+@needs_fcntl
+def test_startup_lock_blocks_other_workers(engine):
+    path = Path(engine.DB_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    other = DatabaseEngine(engine.DB_PATH)
+    other.startup_lock_timeout = 5
+    entered = threading.Event()
+
+    def second_worker():
+        with other.startup_lock(path):
+            entered.set()
+
+    with engine.startup_lock(path):
+        worker = threading.Thread(target=second_worker)
+        worker.start()
+        assert not entered.wait(0.3)
+    worker.join(5)
+    assert entered.is_set()
+
+
+@needs_fcntl
+def test_startup_lock_times_out(engine):
+    path = Path(engine.DB_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    other = DatabaseEngine(engine.DB_PATH)
+    other.startup_lock_timeout = 0.1
+    with engine.startup_lock(path):
+        with pytest.raises(RuntimeError, match="Timed out"):
+            with other.startup_lock(path):
+                pass